@@ -0,0 +1,316 @@
+import os
+
+import numpy as np
+
+from scoring import IntentScorer, normalize_rows, rank_scores
+
+# "exact" = brute-force IntentScorer, "ivf" = approximate IVFIntentScorer,
+# "prototype" = PrototypeIntentScorer (bounded prototypes per intent)
+INDEX_MODE = os.getenv('INTENT_INDEX', 'exact')
+IVF_NLIST = int(os.getenv('IVF_NLIST', 0))  # 0 = sqrt(N)
+IVF_NPROBE = int(os.getenv('IVF_NPROBE', 8))
+PROTOTYPES_PER_INTENT = int(os.getenv('PROTOTYPES_PER_INTENT', 32))
+PROTOTYPE_METHOD = os.getenv('PROTOTYPE_METHOD', 'medoid')  # or "centroid"
+PROTOTYPE_NOVELTY = float(os.getenv('PROTOTYPE_NOVELTY', 0.75))
+
+
+def create_intent_scorer(labels, embeddings, mode=None, normalized=False, scales=None, **kwargs):
+    """
+    Build the configured index; all kinds expose add/remove/score/top_intents.
+    scales: per-row scales of int8 quantized embeddings. The exact scorer
+    scores the quantized rows directly; the approximate ones only need the
+    row directions, which normalising the int8 rows already gives.
+    """
+    mode = mode or INDEX_MODE
+    if mode == 'exact':
+        return IntentScorer(labels, embeddings, normalized=normalized, scales=scales, **kwargs)
+    if mode == 'ivf':
+        kwargs.setdefault('nlist', IVF_NLIST or None)
+        kwargs.setdefault('nprobe', IVF_NPROBE)
+        return IVFIntentScorer(labels, embeddings, **kwargs)
+    if mode == 'prototype':
+        kwargs.setdefault('k', PROTOTYPES_PER_INTENT)
+        kwargs.setdefault('method', PROTOTYPE_METHOD)
+        kwargs.setdefault('novelty', PROTOTYPE_NOVELTY)
+        return PrototypeIntentScorer(labels, embeddings, **kwargs)
+    raise ValueError(f"unknown intent index mode '{mode}' (expected 'exact', 'ivf' or 'prototype')")
+
+
+def spherical_kmeans(x, k, n_iter=10, seed=0):
+    """k-means on unit vectors (cosine distance); returns normalised centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(n_iter):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters with random points
+        sums[empty] = x[rng.choice(len(x), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIntentScorer:
+    """
+    Approximate multi-intent scorer (inverted file index, pure NumPy).
+
+    Example embeddings are clustered into nlist cells around k-means
+    centroids; a query only scans the nprobe closest cells and takes the max
+    similarity per intent over those candidates. Intents with no candidate in
+    the probed cells score -inf. New examples are assigned to their closest
+    cell, the centroids themselves are not retrained.
+    """
+
+    train_sample = 256  # k-means training points per cell
+
+    def __init__(self, labels, embeddings, nlist=None, nprobe=8, seed=0):
+        self.intents = list(dict.fromkeys(labels))
+        self._intent_ids = {intent: i for i, intent in enumerate(self.intents)}
+        self.nprobe = nprobe
+        self._size = 0
+        self.centroids = None
+        self._cells = []
+
+        if not len(labels):
+            return
+        x = normalize_rows(embeddings)
+        ids = np.array([self._intent_ids[l] for l in labels], dtype=np.int32)
+
+        nlist = nlist or max(1, int(np.sqrt(len(x))))
+        nlist = min(nlist, len(x))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(x), nlist * self.train_sample)
+        sample = x[rng.choice(len(x), size=sample_size, replace=False)]
+        self.centroids = spherical_kmeans(sample, nlist, seed=seed)
+
+        assign = np.argmax(x @ self.centroids.T, axis=1)
+        for cell in range(nlist):
+            rows = np.flatnonzero(assign == cell)
+            self._cells.append([x[rows], ids[rows], len(rows)])
+        self._size = len(x)
+
+    def __len__(self):
+        return self._size
+
+    def add(self, label, embedding):
+        vec = normalize_rows(embedding)[0]
+        if label not in self._intent_ids:
+            self._intent_ids[label] = len(self.intents)
+            self.intents.append(label)
+        if self.centroids is None:
+            self.centroids = vec[None, :].copy()
+            self._cells = [[np.zeros((0, vec.shape[0]), dtype=np.float32), np.zeros(0, dtype=np.int32), 0]]
+
+        cell = self._cells[int(np.argmax(self.centroids @ vec))]
+        vecs, ids, n = cell
+        if n == len(vecs):
+            capacity = max(16, 2 * len(vecs))
+            grown = np.zeros((capacity, vec.shape[0]), dtype=np.float32)
+            grown[:n] = vecs[:n]
+            grown_ids = np.zeros(capacity, dtype=np.int32)
+            grown_ids[:n] = ids[:n]
+            cell[0], cell[1] = grown, grown_ids
+            vecs, ids = grown, grown_ids
+        vecs[n] = vec
+        ids[n] = self._intent_ids[label]
+        cell[2] = n + 1
+        self._size += 1
+
+    def remove(self, label, embedding):
+        """Remove the example of `label` closest to `embedding`; False if there is none."""
+        i = self._intent_ids.get(label)
+        if i is None or self.centroids is None:
+            return False
+        vec = normalize_rows(embedding)[0]
+        best = None
+        for cell in self._cells:
+            vecs, ids, n = cell
+            rows = np.flatnonzero(ids[:n] == i)
+            if len(rows):
+                sims = vecs[rows] @ vec
+                if best is None or sims.max() > best[0]:
+                    best = (sims.max(), cell, rows[np.argmax(sims)])
+        if best is None:
+            return False
+        _, cell, row = best
+        vecs, ids, n = cell
+        vecs[row], ids[row] = vecs[n - 1], ids[n - 1]
+        cell[2] = n - 1
+        self._size -= 1
+        return True
+
+    def score(self, query_embeddings):
+        """(B, n_intents) approximate max similarity per intent (-inf if not probed)."""
+        queries = normalize_rows(query_embeddings)
+        scores = np.full((queries.shape[0], len(self.intents)), -np.inf, dtype=np.float32)
+        if self.centroids is None:
+            return scores
+
+        nprobe = min(self.nprobe, len(self.centroids))
+        cell_sims = queries @ self.centroids.T
+        probes = np.argpartition(-cell_sims, nprobe - 1, axis=1)[:, :nprobe]
+        for b, cells in enumerate(probes):
+            vecs = [self._cells[c][0][:self._cells[c][2]] for c in cells]
+            ids = [self._cells[c][1][:self._cells[c][2]] for c in cells]
+            sims = np.concatenate(vecs) @ queries[b]
+            np.maximum.at(scores[b], np.concatenate(ids), sims)
+        return scores
+
+    def top_intents(self, query_embeddings, similarity_threshold=0.6, top_k=3):
+        return rank_scores(self.intents, self.score(query_embeddings), similarity_threshold, top_k)
+
+
+class PrototypeIntentScorer:
+    """
+    Compressed multi-intent scorer: each intent is summarised by at most k
+    prototype vectors, so scoring costs n_intents * k dot products per query
+    whatever the number of examples.
+
+    An intent with up to k examples keeps them all (exact). Larger intents are
+    clustered with spherical k-means; method="medoid" keeps the member closest
+    to each cluster mean (a real example, which suits max-similarity scoring),
+    method="centroid" keeps the normalised mean itself.
+
+    add() updates incrementally: the example joins its nearest prototype's
+    cluster (running sum; the medoid moves to the new example if that is now
+    closer to the mean). An example less similar than `novelty` to every
+    prototype of a full intent gets its own prototype, and the two closest
+    prototypes are merged to stay within k. remove() takes the example out of
+    its nearest prototype's running sum; members aren't kept, so a removed
+    medoid is replaced by its cluster's mean.
+    """
+
+    def __init__(self, labels, embeddings, k=32, method='medoid', novelty=0.75, seed=0):
+        if method not in ('medoid', 'centroid'):
+            raise ValueError(f"unknown prototype method '{method}' (expected 'medoid' or 'centroid')")
+        self.k = k
+        self.method = method
+        self.novelty = novelty
+        self.intents = list(dict.fromkeys(labels))
+        self._intent_ids = {intent: i for i, intent in enumerate(self.intents)}
+        self._size = len(labels)
+
+        dim = np.shape(embeddings)[1] if len(labels) else 0
+        self.prototypes = np.zeros((len(self.intents), k, dim), dtype=np.float32)
+        self.sums = np.zeros_like(self.prototypes)
+        self.counts = np.zeros((len(self.intents), k), dtype=np.int64)
+        if not len(labels):
+            return
+
+        x = normalize_rows(embeddings)
+        ids = np.array([self._intent_ids[l] for l in labels], dtype=np.int32)
+        for i in range(len(self.intents)):
+            self._build_intent(i, x[ids == i], seed)
+
+    def __len__(self):
+        return self._size
+
+    def _build_intent(self, i, x, seed):
+        if len(x) <= self.k:
+            n = len(x)
+            self.prototypes[i, :n] = x
+            self.sums[i, :n] = x
+            self.counts[i, :n] = 1
+            return
+        assign = np.argmax(x @ spherical_kmeans(x, self.k, seed=seed).T, axis=1)
+        np.add.at(self.sums[i], assign, x)
+        self.counts[i] = np.bincount(assign, minlength=self.k)
+        means = normalize_rows(self.sums[i])
+        for j in np.flatnonzero(self.counts[i]):
+            if self.method == 'centroid':
+                self.prototypes[i, j] = means[j]
+            else:
+                members = x[assign == j]
+                self.prototypes[i, j] = members[np.argmax(members @ means[j])]
+
+    def _add_intent(self, label, dim):
+        if self.prototypes.shape[2] == 0:
+            self.prototypes = np.zeros((len(self.intents), self.k, dim), dtype=np.float32)
+            self.sums = np.zeros_like(self.prototypes)
+        self._intent_ids[label] = len(self.intents)
+        self.intents.append(label)
+        self.prototypes = np.concatenate([self.prototypes, np.zeros((1, self.k, dim), dtype=np.float32)])
+        self.sums = np.concatenate([self.sums, np.zeros((1, self.k, dim), dtype=np.float32)])
+        self.counts = np.concatenate([self.counts, np.zeros((1, self.k), dtype=np.int64)])
+
+    def add(self, label, embedding):
+        """Fold one example into its intent's prototypes."""
+        vec = normalize_rows(embedding)[0]
+        if label not in self._intent_ids:
+            self._add_intent(label, vec.shape[0])
+        i = self._intent_ids[label]
+        self._size += 1
+
+        free = np.flatnonzero(self.counts[i] == 0)
+        if len(free):
+            j = free[0]
+            self.prototypes[i, j] = self.sums[i, j] = vec
+            self.counts[i, j] = 1
+            return
+
+        sims = self.prototypes[i] @ vec
+        j = int(np.argmax(sims))
+        if sims[j] < self.novelty:
+            j = self._merge_closest(i)
+            self.prototypes[i, j] = self.sums[i, j] = vec
+            self.counts[i, j] = 1
+            return
+
+        self.sums[i, j] += vec
+        self.counts[i, j] += 1
+        mean = normalize_rows(self.sums[i, j])[0]
+        if self.method == 'centroid':
+            self.prototypes[i, j] = mean
+        elif vec @ mean > self.prototypes[i, j] @ mean:
+            self.prototypes[i, j] = vec
+
+    def _merge_closest(self, i):
+        """Merge intent i's two most similar prototypes; returns the freed slot."""
+        gram = self.prototypes[i] @ self.prototypes[i].T
+        np.fill_diagonal(gram, -np.inf)
+        a, b = np.unravel_index(np.argmax(gram), gram.shape)
+        self.sums[i, a] += self.sums[i, b]
+        self.counts[i, a] += self.counts[i, b]
+        mean = normalize_rows(self.sums[i, a])[0]
+        if self.method == 'centroid':
+            self.prototypes[i, a] = mean
+        elif self.prototypes[i, b] @ mean > self.prototypes[i, a] @ mean:
+            self.prototypes[i, a] = self.prototypes[i, b]
+        self.counts[i, b] = 0
+        self.sums[i, b] = 0
+        return b
+
+    def remove(self, label, embedding):
+        """Take one example out of its intent's prototypes; False if the intent has none."""
+        i = self._intent_ids.get(label)
+        if i is None or not self.counts[i].any():
+            return False
+        vec = normalize_rows(embedding)[0]
+        sims = self.prototypes[i] @ vec
+        sims[self.counts[i] == 0] = -np.inf
+        j = int(np.argmax(sims))
+        self._size -= 1
+        self.counts[i, j] -= 1
+        if self.counts[i, j] == 0:
+            self.sums[i, j] = 0
+            self.prototypes[i, j] = 0
+            return True
+        self.sums[i, j] -= vec
+        if self.method == 'centroid' or sims[j] > 0.999:
+            self.prototypes[i, j] = normalize_rows(self.sums[i, j])[0]
+        return True
+
+    def score(self, query_embeddings):
+        """(B, n_intents) max similarity per intent over its prototypes."""
+        queries = normalize_rows(query_embeddings)
+        n, k, dim = self.prototypes.shape
+        if n == 0:
+            return np.full((queries.shape[0], 0), -np.inf, dtype=np.float32)
+        sims = (queries @ self.prototypes.reshape(n * k, dim).T).reshape(-1, n, k)
+        sims[:, self.counts == 0] = -np.inf
+        return sims.max(axis=2)
+
+    def top_intents(self, query_embeddings, similarity_threshold=0.6, top_k=3):
+        return rank_scores(self.intents, self.score(query_embeddings), similarity_threshold, top_k)
@@ -1,21 +1,192 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from pymongo import MongoClient
+import atexit
 import datetime
+import hmac
+import multiprocessing
 import os
+import threading
+import time
+
+from cascade import CascadeClassifier
+from metrics import REGISTRY, SIZE_BUCKETS, SampledProfiler, timed
+from pagination import (
+    BadQuery, build_query, encode_cursor, parse_bool, parse_limit, parse_projection,
+    serialize_doc, stream_ndjson
+)
+from query_cache import QueryCache
+from train_jobs import SharedTrainingJobs
+from write_buffer import WriteBehindBuffer
 
 app = Flask(__name__)
 
 # MongoDB connection
-client = MongoClient("mongodb://localhost:27017/")
-db = client['airline_bot']
+MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
+DB_NAME = os.getenv('DB_NAME', 'airline_bot')
+client = MongoClient(MONGO_URI)
+db = client[DB_NAME]
 FEEDBACK_COLL = db['feedback']
 DATA_COLL = db['data']
 METRICS_COLL = db['metrics']
 
+# Indexes behind the keyset-paginated /api/classified and /api/metrics
+DATA_COLL.create_index([('ts', -1), ('_id', -1)])
+DATA_COLL.create_index([('label', 1), ('ts', -1), ('_id', -1)])
+DATA_COLL.create_index([('synthetic', 1), ('ts', -1), ('_id', -1)])
+METRICS_COLL.create_index([('ts', -1), ('_id', -1)])
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+EVAL_CHUNK_SIZE = int(os.getenv('EVAL_CHUNK_SIZE', 5000))
+
+# Classification and feedback logs are written behind the response
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', 500))
+WRITE_FLUSH_INTERVAL = float(os.getenv('WRITE_FLUSH_INTERVAL', 1.0))
+WRITE_BUFFER_MAX = int(os.getenv('WRITE_BUFFER_MAX', 10000))
+DATA_WRITER = WriteBehindBuffer(DATA_COLL, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX)
+FEEDBACK_WRITER = WriteBehindBuffer(FEEDBACK_COLL, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX)
+atexit.register(DATA_WRITER.close)
+atexit.register(FEEDBACK_WRITER.close)
+
 # Load model
-from model import IntentModel
-model = IntentModel()
-model.load()  # load model if exists
+# "full" refits TF-IDF + LogisticRegression, "incremental" streams new documents
+# into the hashing + SGD model (see IncrementalIntentModel)
+TRAIN_MODE = os.getenv('TRAIN_MODE', 'full')
+# MODEL_RUNTIME=compiled serves the full model from its sklearn-free export
+# (model.compiled, see compiled_model.py); sklearn is then only imported when
+# a training run starts
+MODEL_RUNTIME = os.getenv('MODEL_RUNTIME', 'sklearn')
+if TRAIN_MODE == 'incremental':
+    from model import IncrementalIntentModel as MODEL_CLASS
+elif MODEL_RUNTIME == 'compiled':
+    from compiled_model import CompiledIntentModel as MODEL_CLASS
+else:
+    from model import IntentModel as MODEL_CLASS
+# MODEL_MMAP=1 maps the saved model's arrays read-only, so every pre-forked
+# worker (see gunicorn.conf.py) shares them instead of holding its own copy
+MODEL_MMAP = os.getenv('MODEL_MMAP', '1') != '0'
+model = MODEL_CLASS()
+model_loaded = model.load(mmap=MODEL_MMAP)  # load model if exists
+
+# Shared across forked workers: bumped when a training run saves a new model;
+# each worker reloads the file when its own generation falls behind
+MODEL_GENERATION = multiprocessing.RawValue('q', 0)
+model_generation = 0
+model_reload_lock = threading.Lock()
+
+# Upper bound on the number of texts accepted by /api/classify/batch
+MAX_BATCH_SIZE = int(os.getenv('CLASSIFY_MAX_BATCH', 512))
+
+# Predictions for repeated utterances; invalidated by /api/train
+PREDICTION_CACHE = QueryCache(
+    int(os.getenv('QUERY_CACHE_SIZE', 10000)), float(os.getenv('QUERY_CACHE_TTL', 3600))
+)
+
+# Live metrics, scraped from /metrics in the Prometheus text format. Stage
+# timers (normalize, vectorize, score, mongo_write, serialize) are recorded
+# under asapp_stage_seconds by the modules that run them.
+REQUEST_SECONDS = REGISTRY.histogram('asapp_request_seconds', 'Request latency by route', labelnames=['route'])
+REQUESTS = REGISTRY.counter('asapp_requests', 'Requests by route and status code', ['route', 'status'])
+BATCH_SIZE = REGISTRY.histogram('asapp_classify_batch_size', 'Texts per classify request', SIZE_BUCKETS)
+MODEL_VERSION = REGISTRY.gauge('asapp_model_version', 'Models served since start (0 = no trained model yet)')
+MODEL_VERSION.set(1 if model_loaded else 0)
+PROFILER = SampledProfiler()  # PROFILE_SAMPLE_RATE, adjustable through /api/profile
+
+
+def collect_runtime_metrics():
+    """Cache and write-buffer counters, read at scrape time."""
+    cache = PREDICTION_CACHE.stats()
+    yield 'asapp_cache_requests_total', 'counter', 'Prediction cache lookups by result', [
+        ({'cache': 'prediction', 'result': 'hit'}, cache['hits']),
+        ({'cache': 'prediction', 'result': 'miss'}, cache['misses'])
+    ]
+    yield 'asapp_cache_entries', 'gauge', 'Entries in the prediction cache', [({'cache': 'prediction'}, cache['size'])]
+    writers = {'data': DATA_WRITER, 'feedback': FEEDBACK_WRITER}
+    yield 'asapp_write_buffer_pending', 'gauge', 'Documents waiting in the write-behind buffer', [
+        ({'buffer': name}, w.pending()) for name, w in writers.items()
+    ]
+    yield 'asapp_write_buffer_written_total', 'counter', 'Documents written by the write-behind buffer', [
+        ({'buffer': name}, w.written) for name, w in writers.items()
+    ]
+    yield 'asapp_write_buffer_failed_total', 'counter', 'Documents the write-behind buffer failed to write', [
+        ({'buffer': name}, w.failed) for name, w in writers.items()
+    ]
+
+
+REGISTRY.add_collector(collect_runtime_metrics)
+
+
+# CASCADE=1: answer from IntentModel when it is confident and fall back to
+# SBERT multi-intent scoring (model1) otherwise; responses then also carry
+# 'intents' and the 'tier' that answered
+CASCADE = os.getenv('CASCADE', '0') == '1'
+cascade = None
+if CASCADE:
+    import model1  # loads the sentence encoder and the example index
+    cascade = CascadeClassifier(lambda: model, model1.score_multiple_intents_batch)
+
+
+def classify_texts(texts):
+    """(label, confidence, extra response fields) per text, without caching."""
+    if cascade is not None:
+        return [
+            (r['intent'], r['confidence'], {'intents': r['intents'], 'tier': r['tier']})
+            for r in cascade.predict(texts)
+        ]
+    return [(str(label), float(conf), {}) for label, conf in model.predict(texts)]
+
+
+def predict_cached(texts):
+    """(label, confidence, extra fields) per text; repeats are served from PREDICTION_CACHE."""
+    version = PREDICTION_CACHE.version
+    results = [PREDICTION_CACHE.get(t) for t in texts]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        preds = classify_texts([texts[i] for i in missing])
+        for i, pred in zip(missing, preds):
+            results[i] = pred
+            PREDICTION_CACHE.put(texts[i], pred, version=version)
+    return results
+
+
+def sync_model():
+    """Reload the saved model if another worker (or this one) published a newer one."""
+    global model, model_generation
+    if MODEL_GENERATION.value == model_generation:
+        return
+    with model_reload_lock:
+        generation = MODEL_GENERATION.value
+        if generation == model_generation:
+            return
+        new_model = MODEL_CLASS(model.model_path)
+        model_generation = generation
+        if not new_model.load(mmap=MODEL_MMAP):
+            print(f"⚠ Model generation {generation} could not be loaded, still serving the previous model")
+            return
+        model = new_model  # atomic rebind; in-flight requests finish on the old model
+        PREDICTION_CACHE.invalidate()
+        MODEL_VERSION.set(MODEL_VERSION.value + 1)
+
+
+@app.before_request
+def start_request():
+    g.request_start = time.perf_counter()
+    g.profiler = PROFILER.start()
+    sync_model()
+
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.labels(route).observe(time.perf_counter() - g.request_start)
+    REQUESTS.labels(route, str(response.status_code)).inc()
+    return response
+
+
+@app.teardown_request
+def stop_profiler(exc):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        PROFILER.stop(profiler)
+
 
 @app.route('/')
 def index():
@@ -30,19 +201,62 @@ def classify():
     if not text:
         return jsonify({'error': 'text required'}), 400
 
-    pred = model.predict([text])
-    confidence = 1.0  # optional
-    result = {'text': text, 'intent': pred[0], 'confidence': confidence, 'ts': datetime.datetime.utcnow()}
+    BATCH_SIZE.observe(1)
+    label, confidence, extra = predict_cached([text])[0]
+    result = {'text': text, 'intent': label, 'confidence': confidence, **extra, 'ts': datetime.datetime.utcnow()}
     
     # Save classified data to database
-    DATA_COLL.insert_one({
+    DATA_WRITER.put({
         'text': text,
-        'label': pred[0],
+        'label': label,
         'synthetic': False,
         'ts': datetime.datetime.utcnow()
     })
 
-    return jsonify(result)
+    with timed('serialize'):
+        return jsonify(result)
+
+
+# --- BATCH CLASSIFY ---
+@app.route('/api/classify/batch', methods=['POST'])
+def classify_batch():
+    body = request.json or {}
+    texts = body.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return jsonify({'error': 'texts must be a non-empty list'}), 400
+    if len(texts) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'at most {MAX_BATCH_SIZE} texts per batch'}), 413
+
+    texts = [t.strip() if isinstance(t, str) else '' for t in texts]
+    empty = [i for i, t in enumerate(texts) if not t]
+    if empty:
+        return jsonify({'error': 'texts must be non-empty strings', 'invalid_indices': empty}), 400
+
+    BATCH_SIZE.observe(len(texts))
+    start = time.perf_counter()
+    preds = predict_cached(texts)  # one vectorized pass for all cache misses
+    predict_ms = (time.perf_counter() - start) * 1000
+
+    ts = datetime.datetime.utcnow()
+    results = [
+        {'text': text, 'intent': label, 'confidence': conf, **extra}
+        for text, (label, conf, extra) in zip(texts, preds)
+    ]
+
+    # Save all classified rows (written behind in bulk)
+    DATA_WRITER.put_many(
+        {'text': r['text'], 'label': r['intent'], 'synthetic': False, 'ts': ts}
+        for r in results
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+
+    with timed('serialize'):
+        return jsonify({
+            'results': results,
+            'count': len(results),
+            'ts': ts,
+            'latency_ms': {'predict': round(predict_ms, 3), 'total': round(total_ms, 3)}
+        })
 
 
 # --- FEEDBACK ---
@@ -64,10 +278,10 @@ def feedback():
         'true_label': true_label,
         'ts': datetime.datetime.utcnow()
     }
-    FEEDBACK_COLL.insert_one(doc)
+    FEEDBACK_WRITER.put(doc)
 
     if not correct and true_label:
-        DATA_COLL.insert_one({
+        DATA_WRITER.put({
             'text': text,
             'label': true_label,
             'synthetic': False,
@@ -78,17 +292,41 @@ def feedback():
 
 
 # --- TRAIN MODEL ---
-@app.route('/api/train', methods=['POST'])
-def train():
-    docs = list(DATA_COLL.find())
-    if len(docs) < 10:
-        return jsonify({'error': 'need at least 10 training examples in data collection'}), 400
+def run_training():
+    """
+    Fit a fresh IntentModel off the request path, save it and publish it to
+    every worker; requests keep using the old model until then. Runs on the
+    TRAINING_JOBS thread, whose file lock keeps workers from training
+    concurrently.
+    """
+    DATA_WRITER.flush()  # train on everything logged so far
+    if TRAIN_MODE == 'incremental':
+        return run_incremental_training()
+    return run_full_training()
+
+
+def publish_model():
+    """Called with the training lock held, after the new model file is in place."""
+    if not MODEL_CLASS(model.model_path).load(mmap=MODEL_MMAP):
+        raise RuntimeError(f'the new {MODEL_RUNTIME} model could not be loaded, keeping the current one')
+    MODEL_GENERATION.value += 1
+    sync_model()
+
+
+def run_full_training():
+    from model import IntentModel
 
-    texts = [d['text'] for d in docs]
-    labels = [d['label'] for d in docs]
+    texts, labels = [], []
+    for d in DATA_COLL.find({}, {'text': 1, 'label': 1, '_id': 0}):
+        texts.append(d['text'])
+        labels.append(d['label'])
+    if len(texts) < 10:
+        raise ValueError('need at least 10 training examples in data collection')
 
-    acc, report = model.train(texts, labels)
-    model.save()
+    new_model = IntentModel(model.model_path)
+    acc, report = new_model.train(texts, labels)
+    new_model.save(require_compiled=MODEL_RUNTIME == 'compiled')
+    publish_model()
 
     METRICS_COLL.insert_one({
         'ts': datetime.datetime.utcnow(),
@@ -96,51 +334,230 @@ def train():
         'accuracy': acc,
         'report': report
     })
+    return {'accuracy': acc, 'report': report}
 
-    return jsonify({'status': 'trained', 'accuracy': acc, 'report': report})
+
+def run_incremental_training():
+    from model import IncrementalIntentModel
+
+    new_model = IncrementalIntentModel(model.model_path)
+    new_model.load()  # continue from the saved checkpoint, not the serving instance
+    acc, report, n_docs = new_model.train_from_collection(DATA_COLL)
+    if n_docs == 0:
+        return {'accuracy': acc, 'report': report, 'new_documents': 0}
+    new_model.save()
+    publish_model()
+
+    METRICS_COLL.insert_one({
+        'ts': datetime.datetime.utcnow(),
+        'type': 'train_incremental',
+        'accuracy': acc,
+        'report': report,
+        'new_documents': n_docs
+    })
+    return {'accuracy': acc, 'report': report, 'new_documents': n_docs}
+
+
+# Job state lives in Mongo, so GET /api/train/<job_id> works on any worker
+# and requests to all workers join the same queued job
+def create_training_jobs():
+    return SharedTrainingJobs(db['training_jobs'], run_training, model.model_path + '.lock')
+
+
+TRAINING_JOBS = create_training_jobs()
+
+
+def init_worker():
+    """
+    Re-create the state that doesn't survive fork() in a pre-forked worker:
+    the MongoClient and the background threads of the write-behind buffers
+    and training jobs. The model itself is inherited (or memory-mapped).
+    """
+    global client, db, FEEDBACK_COLL, DATA_COLL, METRICS_COLL, DATA_WRITER, FEEDBACK_WRITER, TRAINING_JOBS
+    client = MongoClient(MONGO_URI)
+    db = client[DB_NAME]
+    FEEDBACK_COLL = db['feedback']
+    DATA_COLL = db['data']
+    METRICS_COLL = db['metrics']
+    DATA_WRITER = WriteBehindBuffer(DATA_COLL, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX)
+    FEEDBACK_WRITER = WriteBehindBuffer(FEEDBACK_COLL, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX)
+    atexit.register(DATA_WRITER.close)
+    atexit.register(FEEDBACK_WRITER.close)
+    TRAINING_JOBS = create_training_jobs()
+    if cascade is not None:
+        model1.index_sync.start()  # follows the intents collection for the SBERT tier
+
+
+@app.route('/api/train', methods=['POST'])
+def train():
+    """
+    Starts (or joins) a background training job and returns its id.
+    Pass {"wait": true} to block until it finishes and get the old response.
+    """
+    body = request.get_json(silent=True) or {}
+    job = TRAINING_JOBS.submit()
+
+    if not body.get('wait'):
+        return jsonify({'job_id': job['job_id'], 'status': job['status']}), 202
+
+    job = TRAINING_JOBS.wait(job['job_id'])
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'job_id': job['job_id']}), 400
+    return jsonify({'status': 'trained', 'job_id': job['job_id'], 'accuracy': job['accuracy'], 'report': job['report']})
+
+
+@app.route('/api/train/<job_id>', methods=['GET'])
+def train_status(job_id):
+    job = TRAINING_JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job id'}), 404
+    return jsonify(job)
+
+
+def paginated(coll, key, filter_fields, default_limit, extra=None):
+    """
+    Newest-first listing of coll with keyset pagination.
+
+    Query args: limit, cursor (next_cursor of the previous page), fields
+    (comma-separated projection), since/until (ISO 8601 on ts), the equality
+    filters in filter_fields, and format=ndjson to stream every matching
+    document (up to limit, if given) instead of returning one page.
+    """
+    try:
+        query = build_query(request.args, filter_fields)
+        limit = parse_limit(request.args.get('limit'), default_limit, MAX_PAGE_SIZE)
+        projection = parse_projection(request.args.get('fields'))
+    except BadQuery as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    cursor = coll.find(query, projection).sort([('ts', -1), ('_id', -1)])
+    if request.args.get('format') == 'ndjson':
+        if request.args.get('limit'):
+            cursor = cursor.limit(limit)
+        return Response(stream_with_context(stream_ndjson(cursor)), mimetype='application/x-ndjson')
+
+    docs = list(cursor.limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return jsonify({key: [serialize_doc(d) for d in docs[:limit]], 'next_cursor': next_cursor, **(extra or {})})
 
 
 # --- METRICS ---
 @app.route('/api/metrics', methods=['GET'])
 def metrics():
-    q = list(METRICS_COLL.find().sort('ts', -1).limit(200))
-    for d in q:
-        d['_id'] = str(d['_id'])
-        if 'ts' in d:
-            d['ts'] = d['ts'].isoformat()
-    return jsonify({'metrics': q})
+    return paginated(
+        METRICS_COLL, 'metrics', {'type': lambda v, _: v}, 200,
+        extra={
+            'prediction_cache': PREDICTION_CACHE.stats(),
+            **({'cascade': cascade.stats(), 'intent_index': model1.index_sync.stats()} if cascade is not None else {})
+        }
+    )
+
+
+# --- LIVE METRICS ---
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Stage timings, request/batch histograms, cache and buffer counters (Prometheus text format)."""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# /api/profile can make every request pay for cProfile: with ADMIN_TOKEN set it
+# needs a matching X-Admin-Token header, otherwise it only answers localhost
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+
+def admin_allowed():
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN)
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+
+@app.route('/api/profile', methods=['GET', 'POST'])
+def profile():
+    """
+    GET: cProfile stats accumulated over sampled requests (?sort=cumulative&limit=40).
+    POST {"rate": 0.01, "reset": true}: change the sampling rate / drop collected stats.
+    """
+    if not admin_allowed():
+        return jsonify({'error': 'forbidden'}), 403
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        if 'rate' in body:
+            try:
+                rate = float(body['rate'])
+            except (TypeError, ValueError):
+                return jsonify({'error': 'rate must be a number'}), 400
+            if not 0.0 <= rate <= 1.0:
+                return jsonify({'error': 'rate must be between 0 and 1'}), 400
+            PROFILER.rate = rate
+        if body.get('reset'):
+            PROFILER.reset()
+        return jsonify({'rate': PROFILER.rate, 'samples': PROFILER.samples})
+
+    try:
+        limit = parse_limit(request.args.get('limit'), 40, 500)
+    except BadQuery as exc:
+        return jsonify({'error': str(exc)}), 400
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'calls'):
+        return jsonify({'error': 'sort must be cumulative, tottime or calls'}), 400
+    return Response(PROFILER.report(sort, limit), mimetype='text/plain')
 
 
 # --- NEW: GET CLASSIFIED DATA ---
 @app.route('/api/classified', methods=['GET'])
 def get_classified_data():
-    """Return all classified data from MongoDB"""
-    data = list(DATA_COLL.find().sort('ts', -1))
-    for d in data:
-        d['_id'] = str(d['_id'])
-        if 'ts' in d:
-            d['ts'] = d['ts'].isoformat()
-    return jsonify({'classified_data': data})
+    """Return classified data from MongoDB, newest first, one page at a time"""
+    DATA_WRITER.flush()
+    return paginated(DATA_COLL, 'classified_data', {'label': lambda v, _: v, 'synthetic': parse_bool}, 100)
 
 @app.route('/api/synthetic/correct', methods=['GET'])
 def get_correct_synthetic():
-    """Fetch only correctly classified synthetic samples"""
-    data = list(DATA_COLL.find({'synthetic': True}))
-    
+    """
+    Fetch only correctly classified synthetic samples, plus per-intent
+    accuracy and a confusion summary. Documents are streamed in chunks and
+    each chunk is classified with one vectorized predict call.
+    """
+    try:
+        chunk_size = parse_limit(request.args.get('chunk_size'), EVAL_CHUNK_SIZE, 100000)
+    except BadQuery as exc:
+        return jsonify({'error': str(exc)}), 400
+
+    current_model = model  # evaluate against one model even if a training job swaps it
     correct = []
-    for d in data:
-        text = d['text']
-        true_label = d['label']
-        pred = model.predict([text])[0]
-
-        if pred == true_label:  # correct classification
-            d['_id'] = str(d['_id'])
-            if 'ts' in d:
-                d['ts'] = d['ts'].isoformat()
-            d['pred'] = pred
-            correct.append(d)
-
-    return jsonify({'correct_synthetic_data': correct})
+    totals, hits, confusion = {}, {}, {}
+    for chunk in iter_chunks(DATA_COLL.find({'synthetic': True}, {'text': 1, 'label': 1, 'synthetic': 1, 'ts': 1}), chunk_size):
+        preds = current_model.predict([d['text'] for d in chunk])
+        for d, (pred, _) in zip(chunk, preds):
+            true_label, pred = d['label'], str(pred)
+            totals[true_label] = totals.get(true_label, 0) + 1
+            if pred == true_label:  # correct classification
+                hits[true_label] = hits.get(true_label, 0) + 1
+                d['pred'] = pred
+                correct.append(serialize_doc(d))
+            else:
+                row = confusion.setdefault(true_label, {})
+                row[pred] = row.get(pred, 0) + 1
+
+    total = sum(totals.values())
+    return jsonify({
+        'correct_synthetic_data': correct,
+        'total': total,
+        'accuracy': len(correct) / total if total else None,
+        'per_intent_accuracy': {label: hits.get(label, 0) / n for label, n in totals.items()},
+        # true label -> {predicted label: count}, misclassifications only
+        'confusion': confusion
+    })
+
+
+def iter_chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 
@@ -0,0 +1,471 @@
+# async_app.py - asyncio (FastAPI) version of the app.py API
+#
+# Usage (from backend/): uvicorn async_app:app --host 0.0.0.0 --port 5000
+#
+# Same /api/classify(/batch), /api/feedback, /api/train, /api/metrics and
+# /api/classified contract as app.py, but a single event loop serves every
+# connection: Mongo is accessed through Motor (pooled, non-blocking), and
+# IntentModel inference and training run in bounded executors so slow clients
+# and slow queries don't tie up a thread each.
+
+import asyncio
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from email.utils import format_datetime
+from multiprocessing import get_context
+
+from bson import ObjectId
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from metrics import REGISTRY, SIZE_BUCKETS, timed
+from pagination import (
+    BadQuery, build_query, encode_cursor, parse_bool, parse_limit, parse_projection, serialize_doc
+)
+from query_cache import QueryCache
+from train_jobs import TrainingJobs
+from write_buffer import AsyncWriteBehindBuffer
+
+MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DB_NAME = os.getenv('DB_NAME', 'airline_bot')
+MONGO_POOL_SIZE = int(os.getenv('MONGO_POOL_SIZE', 100))
+
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 1000))
+MAX_BATCH_SIZE = int(os.getenv('CLASSIFY_MAX_BATCH', 512))
+WRITE_BATCH_SIZE = int(os.getenv('WRITE_BATCH_SIZE', 500))
+WRITE_FLUSH_INTERVAL = float(os.getenv('WRITE_FLUSH_INTERVAL', 1.0))
+WRITE_BUFFER_MAX = int(os.getenv('WRITE_BUFFER_MAX', 10000))
+
+# "thread" shares the model with the event loop's process; "process" runs
+# inference in INFERENCE_WORKERS separate processes (no GIL contention), each
+# with its own memory-mapped copy of the saved model
+INFERENCE_EXECUTOR = os.getenv('INFERENCE_EXECUTOR', 'thread')
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 0)) or os.cpu_count() or 1
+# Requests waiting for an inference slot beyond this get a 503
+INFERENCE_QUEUE_MAX = int(os.getenv('INFERENCE_QUEUE_MAX', 1000))
+
+TRAIN_MODE = os.getenv('TRAIN_MODE', 'full')
+# "compiled" serves the full model from its sklearn-free export (see
+# compiled_model.py), which also keeps sklearn out of spawned inference processes
+MODEL_RUNTIME = os.getenv('MODEL_RUNTIME', 'sklearn')
+if TRAIN_MODE == 'incremental':
+    from model import IncrementalIntentModel as MODEL_CLASS
+elif MODEL_RUNTIME == 'compiled':
+    from compiled_model import CompiledIntentModel as MODEL_CLASS
+else:
+    from model import IntentModel as MODEL_CLASS
+MODEL_MMAP = os.getenv('MODEL_MMAP', '1') != '0'
+
+PREDICTION_CACHE = QueryCache(
+    int(os.getenv('QUERY_CACHE_SIZE', 10000)), float(os.getenv('QUERY_CACHE_TTL', 3600))
+)
+BATCH_SIZE = REGISTRY.histogram('asapp_classify_batch_size', 'Texts per classify request', SIZE_BUCKETS)
+REQUEST_SECONDS = REGISTRY.histogram('asapp_request_seconds', 'Request latency by route', labelnames=['route'])
+REQUESTS = REGISTRY.counter('asapp_requests', 'Requests by route and status code', ['route', 'status'])
+
+
+class State:
+    """Per-process service state, created in lifespan() on the running loop."""
+    client = None
+    data = feedback = metrics = None
+    data_writer = feedback_writer = None
+    executor = None
+    inference_slots = None
+    training_jobs = None
+    loop = None
+    model = None
+    generation = 0  # bumped on every model swap; process workers reload when it changes
+
+
+state = State()
+
+
+# --- JSON like Flask's jsonify (datetimes as HTTP dates, ObjectIds as strings) ---
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return format_datetime(value.astimezone(datetime.timezone.utc), usegmt=True)
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class FlaskJSONResponse(JSONResponse):
+    def render(self, content):
+        with timed('serialize'):
+            return json.dumps(content, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+
+def jsonify(content, status_code=200):
+    return FlaskJSONResponse(content, status_code=status_code)
+
+
+async def json_body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+
+# --- inference ---
+_worker_model = None
+_worker_generation = None
+
+
+def _process_predict(texts, generation, model_path):
+    """Runs in an inference process: (re)load the saved model when the generation moved on."""
+    global _worker_model, _worker_generation
+    if _worker_generation != generation:
+        _worker_model = MODEL_CLASS(model_path)
+        _worker_model.load(mmap=MODEL_MMAP)
+        _worker_generation = generation
+    return [(str(label), float(conf)) for label, conf in _worker_model.predict(texts)]
+
+
+def _thread_predict(model, texts):
+    return [(str(label), float(conf)) for label, conf in model.predict(texts)]
+
+
+class Overloaded(Exception):
+    pass
+
+
+async def predict_cached(texts):
+    """(label, confidence) per text; cache misses go to the inference executor in one call."""
+    version = PREDICTION_CACHE.version
+    results = [PREDICTION_CACHE.get(t) for t in texts]
+    missing = [i for i, r in enumerate(results) if r is None]
+    if missing:
+        if state.inference_slots.locked():
+            raise Overloaded()
+        async with state.inference_slots:
+            batch = [texts[i] for i in missing]
+            if INFERENCE_EXECUTOR == 'process':
+                call = (_process_predict, batch, state.generation, state.model.model_path)
+            else:
+                call = (_thread_predict, state.model, batch)
+            preds = await state.loop.run_in_executor(state.executor, *call)
+        for i, pred in zip(missing, preds):
+            results[i] = pred
+            PREDICTION_CACHE.put(texts[i], pred, version=version)
+    return results
+
+
+# --- training (blocking parts run on the TrainingJobs thread) ---
+def run_on_loop(coro):
+    return asyncio.run_coroutine_threadsafe(coro, state.loop).result()
+
+
+async def load_training_data():
+    await state.data_writer.flush()  # train on everything logged so far
+    texts, labels = [], []
+    async for d in state.data.find({}, {'text': 1, 'label': 1, '_id': 0}):
+        texts.append(d['text'])
+        labels.append(d['label'])
+    return texts, labels
+
+
+def swap_model(new_model):
+    # mmap shares pages with the inference processes
+    if not new_model.load(mmap=MODEL_MMAP):
+        raise RuntimeError(f'the new {MODEL_RUNTIME} model could not be loaded, keeping the current one')
+    state.model = new_model
+    state.generation += 1
+    PREDICTION_CACHE.invalidate()
+
+
+def run_training():
+    if TRAIN_MODE == 'incremental':
+        return run_incremental_training()
+    from model import IntentModel
+
+    texts, labels = run_on_loop(load_training_data())
+    if len(texts) < 10:
+        raise ValueError('need at least 10 training examples in data collection')
+
+    new_model = IntentModel(state.model.model_path)
+    acc, report = new_model.train(texts, labels)
+    new_model.save(require_compiled=MODEL_RUNTIME == 'compiled')
+    swap_model(MODEL_CLASS(new_model.model_path))
+
+    run_on_loop(state.metrics.insert_one({
+        'ts': datetime.datetime.utcnow(), 'type': 'train', 'accuracy': acc, 'report': report
+    }))
+    return {'accuracy': acc, 'report': report}
+
+
+class _SyncCollection:
+    """Blocking view of a Motor collection for IncrementalIntentModel.train_from_collection."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def distinct(self, key):
+        return run_on_loop(self.collection.distinct(key))
+
+    def find_one(self, *args, **kwargs):
+        return run_on_loop(self.collection.find_one(*args, **kwargs))
+
+    def find(self, *args, **kwargs):
+        return _SyncCursor(self.collection.find(*args, **kwargs))
+
+
+class _SyncCursor:
+    """Blocking iteration over a Motor cursor, pulling one batch at a time through the event loop."""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self._batch_size = 1000
+
+    def sort(self, *args, **kwargs):
+        self.cursor.sort(*args, **kwargs)
+        return self
+
+    def batch_size(self, batch_size):
+        self.cursor.batch_size(batch_size)
+        self._batch_size = batch_size
+        return self
+
+    def __iter__(self):
+        while True:
+            docs = run_on_loop(self.cursor.to_list(self._batch_size))
+            if not docs:
+                return
+            yield from docs
+
+
+def run_incremental_training():
+    from model import IncrementalIntentModel
+
+    run_on_loop(state.data_writer.flush())
+    new_model = IncrementalIntentModel(state.model.model_path)
+    new_model.load()
+    acc, report, n_docs = new_model.train_from_collection(_SyncCollection(state.data))
+    if n_docs == 0:
+        return {'accuracy': acc, 'report': report, 'new_documents': 0}
+    new_model.save()
+    swap_model(IncrementalIntentModel(new_model.model_path))
+
+    run_on_loop(state.metrics.insert_one({
+        'ts': datetime.datetime.utcnow(), 'type': 'train_incremental',
+        'accuracy': acc, 'report': report, 'new_documents': n_docs
+    }))
+    return {'accuracy': acc, 'report': report, 'new_documents': n_docs}
+
+
+# --- lifecycle ---
+@asynccontextmanager
+async def lifespan(app):
+    state.loop = asyncio.get_running_loop()
+    state.client = AsyncIOMotorClient(MONGO_URI, maxPoolSize=MONGO_POOL_SIZE)
+    db = state.client[DB_NAME]
+    state.data, state.feedback, state.metrics = db['data'], db['feedback'], db['metrics']
+    await state.data.create_index([('ts', -1), ('_id', -1)])
+    await state.data.create_index([('label', 1), ('ts', -1), ('_id', -1)])
+    await state.data.create_index([('synthetic', 1), ('ts', -1), ('_id', -1)])
+    await state.metrics.create_index([('ts', -1), ('_id', -1)])
+
+    state.data_writer = AsyncWriteBehindBuffer(state.data, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX)
+    state.feedback_writer = AsyncWriteBehindBuffer(
+        state.feedback, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_BUFFER_MAX
+    )
+    state.data_writer.start()
+    state.feedback_writer.start()
+
+    state.model = MODEL_CLASS()
+    state.model.load(mmap=MODEL_MMAP)  # load model if exists
+    if INFERENCE_EXECUTOR == 'process':
+        state.executor = ProcessPoolExecutor(INFERENCE_WORKERS, mp_context=get_context('spawn'))
+    else:
+        state.executor = ThreadPoolExecutor(INFERENCE_WORKERS, thread_name_prefix='inference')
+    state.inference_slots = asyncio.Semaphore(INFERENCE_WORKERS + INFERENCE_QUEUE_MAX)
+    state.training_jobs = TrainingJobs(run_training)
+    try:
+        yield
+    finally:
+        await state.data_writer.close()
+        await state.feedback_writer.close()
+        state.executor.shutdown(wait=True)
+        state.client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware('http')
+async def record_request(request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get('route')
+    route = route.path if route is not None else 'unmatched'
+    REQUEST_SECONDS.labels(route).observe(time.perf_counter() - start)
+    REQUESTS.labels(route, str(response.status_code)).inc()
+    return response
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request, exc):
+    return jsonify({'error': 'inference queue is full, retry later'}, 503)
+
+
+@app.get('/')
+async def index():
+    return PlainTextResponse("Async server is running. Use /api/... endpoints.")
+
+
+# --- CLASSIFY ---
+@app.post('/api/classify')
+async def classify(request: Request):
+    body = await json_body(request)
+    text = body.get('text', '')
+    text = text.strip() if isinstance(text, str) else ''
+    if not text:
+        return jsonify({'error': 'text required'}, 400)
+
+    BATCH_SIZE.observe(1)
+    label, confidence = (await predict_cached([text]))[0]
+    ts = datetime.datetime.utcnow()
+    await state.data_writer.put({'text': text, 'label': label, 'synthetic': False, 'ts': ts})
+    return jsonify({'text': text, 'intent': label, 'confidence': confidence, 'ts': ts})
+
+
+@app.post('/api/classify/batch')
+async def classify_batch(request: Request):
+    body = await json_body(request)
+    texts = body.get('texts')
+    if not isinstance(texts, list) or not texts:
+        return jsonify({'error': 'texts must be a non-empty list'}, 400)
+    if len(texts) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'at most {MAX_BATCH_SIZE} texts per batch'}, 413)
+
+    texts = [t.strip() if isinstance(t, str) else '' for t in texts]
+    empty = [i for i, t in enumerate(texts) if not t]
+    if empty:
+        return jsonify({'error': 'texts must be non-empty strings', 'invalid_indices': empty}, 400)
+
+    BATCH_SIZE.observe(len(texts))
+    start = time.perf_counter()
+    preds = await predict_cached(texts)
+    predict_ms = (time.perf_counter() - start) * 1000
+
+    ts = datetime.datetime.utcnow()
+    results = [{'text': text, 'intent': label, 'confidence': conf} for text, (label, conf) in zip(texts, preds)]
+    await state.data_writer.put_many(
+        {'text': r['text'], 'label': r['intent'], 'synthetic': False, 'ts': ts} for r in results
+    )
+    total_ms = (time.perf_counter() - start) * 1000
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'ts': ts,
+        'latency_ms': {'predict': round(predict_ms, 3), 'total': round(total_ms, 3)}
+    })
+
+
+# --- FEEDBACK ---
+@app.post('/api/feedback')
+async def feedback(request: Request):
+    body = await json_body(request)
+    text = body.get('text', '')
+    text = text.strip() if isinstance(text, str) else ''
+    pred = body.get('pred')
+    correct = body.get('correct')
+    true_label = body.get('true_label')
+
+    if not text or pred is None or correct is None:
+        return jsonify({'error': 'text, pred and correct required'}, 400)
+
+    ts = datetime.datetime.utcnow()
+    await state.feedback_writer.put({
+        'text': text, 'pred': pred, 'correct': bool(correct), 'true_label': true_label, 'ts': ts
+    })
+    if not correct and true_label:
+        await state.data_writer.put({'text': text, 'label': true_label, 'synthetic': False, 'ts': ts})
+    return jsonify({'status': 'ok'})
+
+
+# --- TRAIN MODEL ---
+@app.post('/api/train')
+async def train(request: Request):
+    """
+    Starts (or joins) a background training job and returns its id.
+    Pass {"wait": true} to wait until it finishes and get the old response.
+    """
+    body = await json_body(request)
+    job = state.training_jobs.submit()
+    if not body.get('wait'):
+        return jsonify({'job_id': job['job_id'], 'status': job['status']}, 202)
+
+    job = await asyncio.to_thread(state.training_jobs.wait, job['job_id'])
+    if job['status'] == 'failed':
+        return jsonify({'error': job['error'], 'job_id': job['job_id']}, 400)
+    return jsonify({'status': 'trained', 'job_id': job['job_id'], 'accuracy': job['accuracy'], 'report': job['report']})
+
+
+@app.get('/api/train/{job_id}')
+async def train_status(job_id: str):
+    job = state.training_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'unknown job id'}, 404)
+    return jsonify(job)
+
+
+async def paginated(request, coll, key, filter_fields, default_limit, extra=None):
+    """Same query args and response shape as app.paginated."""
+    args = request.query_params
+    try:
+        query = build_query(args, filter_fields)
+        limit = parse_limit(args.get('limit'), default_limit, MAX_PAGE_SIZE)
+        projection = parse_projection(args.get('fields'))
+    except BadQuery as exc:
+        return jsonify({'error': str(exc)}, 400)
+
+    cursor = coll.find(query, projection).sort([('ts', -1), ('_id', -1)])
+    if args.get('format') == 'ndjson':
+        if args.get('limit'):
+            cursor = cursor.limit(limit)
+
+        async def lines():
+            async for doc in cursor:
+                yield json.dumps(serialize_doc(doc), default=str) + '\n'
+        return StreamingResponse(lines(), media_type='application/x-ndjson')
+
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return jsonify({key: [serialize_doc(d) for d in docs[:limit]], 'next_cursor': next_cursor, **(extra or {})})
+
+
+# --- METRICS ---
+@app.get('/api/metrics')
+async def metrics(request: Request):
+    return await paginated(
+        request, state.metrics, 'metrics', {'type': lambda v, _: v}, 200,
+        extra={'prediction_cache': PREDICTION_CACHE.stats()}
+    )
+
+
+@app.get('/metrics')
+async def prometheus_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# --- CLASSIFIED DATA ---
+@app.get('/api/classified')
+async def get_classified_data(request: Request):
+    """Return classified data from MongoDB, newest first, one page at a time"""
+    await state.data_writer.flush()
+    return await paginated(
+        request, state.data, 'classified_data', {'label': lambda v, _: v, 'synthetic': parse_bool}, 100
+    )
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', 5000)))
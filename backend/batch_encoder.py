@@ -0,0 +1,114 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import LATENCY_BUCKETS, REGISTRY, SIZE_BUCKETS
+
+BATCH_SIZE = REGISTRY.histogram(
+    'asapp_encoder_batch_size', 'Texts per batched encode call', SIZE_BUCKETS, labelnames=['encoder']
+)
+QUEUE_WAIT_SECONDS = REGISTRY.histogram(
+    'asapp_encoder_queue_wait_seconds', 'Time a text waited for its encode call', LATENCY_BUCKETS,
+    labelnames=['encoder']
+)
+
+
+class BatchEncoder:
+    """
+    Micro-batching front end for SentenceTransformer.encode.
+
+    Concurrent callers submit single texts; a background thread collects them
+    into one batched encode call. A text that is alone in the queue is encoded
+    at once; when others are already queued behind it, the batch is flushed
+    once max_batch_size texts are queued or the oldest one has waited
+    max_wait_ms. Texts that arrive while a batch is encoding queue up and go
+    out together in the next one. Each caller gets its row back through a
+    Future. Batch sizes and queue waits are exported as
+    asapp_encoder_* histograms labelled with `name`.
+    """
+
+    def __init__(self, model, max_batch_size=32, max_wait_ms=5.0, name='sbert'):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batch_sizes = BATCH_SIZE.labels(name)
+        self.queue_wait = QUEUE_WAIT_SECONDS.labels(name)
+        self._queue = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name='batch-encoder', daemon=True)
+        self._worker.start()
+
+    def submit(self, text):
+        """Queue one text for encoding; returns a Future resolving to a 1-D numpy array."""
+        if self._closed:
+            raise RuntimeError('BatchEncoder is closed')
+        future = Future()
+        self._queue.put((text, future, time.perf_counter()))
+        return future
+
+    def encode(self, text, timeout=None):
+        """Blocking single-text encode that shares a batch with concurrent callers."""
+        return self.submit(text).result(timeout)
+
+    def stats(self):
+        return {
+            'batch_size': self.batch_sizes.snapshot(),
+            'queue_wait_seconds': self.queue_wait.snapshot()
+        }
+
+    def close(self):
+        """Stop accepting work; texts already queued are still encoded."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = item[2] + self.max_wait
+            stop = False
+            while len(batch) < self.max_batch_size:
+                # Nothing else queued: flush the lone text without waiting
+                remaining = deadline - time.perf_counter() if len(batch) > 1 else 0
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._flush(batch)
+            except Exception as exc:  # keep serving later batches
+                print(f"⚠ batch encoder: batch of {len(batch)} failed: {exc}")
+            if stop:
+                return
+
+    def _flush(self, batch):
+        # Callers that gave up (cancelled their future) are dropped; the rest
+        # can no longer be cancelled
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait.observe(started - enqueued)
+
+        try:
+            vectors = self.model.encode([text for text, _, _ in batch], convert_to_numpy=True)
+        except Exception as exc:
+            for _, future, _ in batch:
+                future.set_exception(exc)
+            return
+        for (_, future, _), vec in zip(batch, vectors):
+            future.set_result(np.asarray(vec))
@@ -0,0 +1,80 @@
+# bench_ann.py - recall vs latency of the IVF index against exact scoring
+#
+# Usage: python bench_ann.py [--sizes 10000 100000] [--queries 200]
+# Uses clustered random embeddings (several sub-topics per intent), so no
+# Mongo or SBERT download is needed.
+
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import IVFIntentScorer
+from scoring import IntentScorer
+
+N_INTENTS = 19
+TOPICS_PER_INTENT = 8
+DIM = 384
+TOP_K = 3
+
+
+def make_corpus(n_examples, n_queries, noise=0.9, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((N_INTENTS * TOPICS_PER_INTENT, DIM)).astype(np.float32)
+
+    def sample(n):
+        topic = rng.integers(0, len(topics), size=n)
+        x = topics[topic] + noise * rng.standard_normal((n, DIM)).astype(np.float32)
+        return x, topic // TOPICS_PER_INTENT
+
+    embeddings, intent_ids = sample(n_examples)
+    queries, _ = sample(n_queries)
+    labels = [f"intent_{i}" for i in intent_ids]
+    return labels, embeddings, queries
+
+
+def per_query_ms(scorer, queries):
+    start = time.perf_counter()
+    for q in queries:
+        scorer.score(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def top_k_sets(scorer, queries):
+    scores = scorer.score(queries)
+    order = np.argsort(-scores, axis=1)[:, :TOP_K]
+    return [{scorer.intents[i] for i in row} for row in order], scores
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        labels, embeddings, queries = make_corpus(n, args.queries)
+        exact = IntentScorer(labels, embeddings)
+        exact_sets, exact_scores = top_k_sets(exact, queries)
+        exact_top1 = np.argmax(exact_scores, axis=1)
+        exact_ms = per_query_ms(exact, queries)
+
+        start = time.perf_counter()
+        ivf = IVFIntentScorer(labels, embeddings)
+        build_s = time.perf_counter() - start
+        assert ivf.intents == exact.intents
+
+        print(f"\n{n} examples, {len(ivf.centroids)} cells (build {build_s:.2f}s), exact {exact_ms:.3f} ms/query")
+        print(f"{'nprobe':>6} | {'ms/query':>8} | {'speedup':>7} | {'top-1 agree':>11} | {'recall@3':>8}")
+        for nprobe in args.nprobe:
+            ivf.nprobe = nprobe
+            ms = per_query_ms(ivf, queries)
+            sets, scores = top_k_sets(ivf, queries)
+            top1 = np.mean(np.argmax(scores, axis=1) == exact_top1)
+            recall = np.mean([len(a & e) / TOP_K for a, e in zip(sets, exact_sets)])
+            print(f"{nprobe:>6} | {ms:>8.3f} | {exact_ms / ms:>6.1f}x | {top1:>11.3f} | {recall:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
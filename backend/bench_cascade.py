@@ -0,0 +1,128 @@
+# bench_cascade.py - TF-IDF/SBERT cascade (cascade.py) vs either model alone
+#
+# Usage: python bench_cascade.py [--size 5000] [--queries 400] [--thresholds 0.2 0.35 0.5 0.7]
+#                                [--target-accuracy 0.95] [--encoder torch|onnx|stub]
+#
+# Runs offline like bench_suite.py (mongomock, generated corpora, temp working
+# directory). IntentModel is trained on the corpus and model1 indexes the same
+# examples; held-out texts are split into a calibration half (for
+# calibrate_threshold) and an evaluation half. Multi-intent queries join two
+# held-out texts of different intents ("X and also Y"). For every threshold it
+# reports the share of evaluation texts answered by TF-IDF, single-intent
+# accuracy, multi-intent recall (share of both intents returned) and
+# per-query latency.
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_suite import HashingEncoder, make_corpus, seed_databases, use_mongomock
+
+
+def per_query_ms(fn, queries, warmup=5):
+    for q in queries[:warmup]:
+        fn([q])
+    samples, outputs = [], []
+    for q in queries:
+        start = time.perf_counter()
+        outputs.append(fn([q])[0])
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.asarray(samples), outputs
+
+
+def multi_intent_queries(texts, labels, n, seed):
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < n:
+        i, j = rng.sample(range(len(texts)), 2)
+        if labels[i] != labels[j]:
+            queries.append((f"{texts[i].rstrip('.?!')} and also {texts[j]}", {labels[i], labels[j]}))
+    return queries
+
+
+def report(name, fn, eval_texts, eval_labels, multi, cascade=None):
+    ms, intents = per_query_ms(fn, eval_texts, warmup=0)
+    share = '' if cascade is None else f"{cascade.stats()['fractions']['tfidf']:.2f}"
+    _, multi_intents = per_query_ms(fn, [q for q, _ in multi])
+    accuracy = np.mean([bool(p) and p[0] == l for p, l in zip(intents, eval_labels)])
+    recall = np.mean([len(set(p) & want) / len(want) for p, (_, want) in zip(multi_intents, multi)])
+    print(f"{name:>18} | {share:>10} | {accuracy:>8.3f} | {recall:>12.3f} | "
+          f"{ms.mean():>7.2f} | {np.percentile(ms, 95):>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=5000, help='training / index examples')
+    parser.add_argument('--queries', type=int, default=400, help='held-out texts (half calibration, half evaluation)')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=[0.2, 0.35, 0.5, 0.7])
+    parser.add_argument('--multi-intent-p', type=float, default=0.25)
+    parser.add_argument('--target-accuracy', type=float, default=0.95)
+    parser.add_argument('--encoder', choices=['torch', 'onnx', 'stub'], default='stub')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_cascade_')
+    os.environ.update(
+        ENCODER_BACKEND=args.encoder if args.encoder != 'stub' else 'torch',
+        QUERY_CACHE_SIZE='0',
+        EMBEDDING_STORE_DIR=os.path.join(workdir, 'embedding_store'),
+        EMBEDDING_CACHE_PATH=os.path.join(workdir, 'embedding_cache.npz')
+    )
+    client = use_mongomock()
+    if args.encoder == 'stub':
+        import onnx_encoder
+        onnx_encoder.load_encoder = lambda *a, **kw: HashingEncoder()
+
+    texts, labels = make_corpus(args.size, args.seed)
+    held_texts, held_labels = make_corpus(args.queries, args.seed + 1)
+    half = args.queries // 2
+    calib_texts, calib_labels = held_texts[:half], held_labels[:half]
+    eval_texts, eval_labels = held_texts[half:], held_labels[half:]
+    multi = multi_intent_queries(eval_texts, eval_labels, len(eval_texts), args.seed)
+    seed_databases(client, texts, labels)
+
+    from cascade import CascadeClassifier, calibrate_threshold
+    from model import IntentModel
+    import model1
+
+    model = IntentModel(os.path.join(workdir, 'model.joblib'))
+    model.train(texts, labels)
+    calibrated, answered = calibrate_threshold(model, calib_texts, calib_labels, args.target_accuracy)
+    print(f"\n{args.size} examples, {len(eval_texts)} evaluation queries, {args.encoder} encoder")
+    if calibrated is None:
+        print(f"calibrate_threshold: TF-IDF never reaches {args.target_accuracy:.2f} accuracy")
+    else:
+        print(f"calibrate_threshold: {calibrated:.3f} for {args.target_accuracy:.2f} accuracy "
+              f"({answered:.0%} of calibration texts answered by TF-IDF)")
+
+    print(f"{'':>18} | {'TF-IDF share':>10} | {'accuracy':>8} | {'multi recall':>12} | {'mean ms':>7} | {'p95 ms':>7}")
+
+    def tfidf_only(batch):
+        return [[str(label)] for label, _ in model.predict(batch)]
+
+    def sbert_only(batch):
+        return [[intent for intent, _ in ranked] for ranked in model1.score_multiple_intents_batch(batch)]
+
+    report('TF-IDF only', tfidf_only, eval_texts, eval_labels, multi)
+    report('SBERT only', sbert_only, eval_texts, eval_labels, multi)
+
+    thresholds = sorted(set(args.thresholds) | ({calibrated} if calibrated is not None else set()))
+    for threshold in thresholds:
+        cascade = CascadeClassifier(model, model1.score_multiple_intents_batch, threshold, args.multi_intent_p)
+
+        def run(batch):
+            return [r['intents'] for r in cascade.predict(batch)]
+
+        name = f"cascade @ {threshold:.3f}" + (' *' if threshold == calibrated else '')
+        report(name, run, eval_texts, eval_labels, multi, cascade)
+    if calibrated is not None:
+        print("* calibrated threshold")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# bench_compiled.py - sklearn pipeline vs the compiled runtime (compiled_model.py)
+#
+# Usage: python bench_compiled.py [--size 20000] [--queries 2000] [--cold-runs 5]
+#
+# Trains IntentModel on a generated corpus (bench_suite.make_corpus) in a temp
+# directory, which also writes model.compiled, then reports:
+#   - agreement: labels and probabilities of both runtimes on held-out texts
+#     (bit-identical is expected)
+#   - cold start: a fresh interpreter importing the runtime, loading the model
+#     and answering one text, median of --cold-runs (and its peak RSS; Linux)
+#   - per-call latency for single texts and batches of 64
+#   - artifact sizes
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from bench_suite import make_corpus
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+BATCH = 64
+
+# Peak RSS from VmHWM: ru_maxrss carries the forking parent's peak across exec
+COLD_START = """
+import sys, time
+start = time.perf_counter()
+{imports}
+model = {cls}({path!r})
+model.load(mmap=True)
+model.predict('i want to change my flight')
+elapsed = (time.perf_counter() - start) * 1000
+with open('/proc/self/status') as f:
+    peak_kb = next(int(line.split()[1]) for line in f if line.startswith('VmHWM:'))
+print(elapsed, peak_kb / 1024, 'sklearn' in sys.modules)
+"""
+
+RUNTIMES = {
+    'sklearn': ('from model import IntentModel', 'IntentModel'),
+    'compiled': ('from compiled_model import CompiledIntentModel', 'CompiledIntentModel')
+}
+
+
+def cold_start(runtime, model_path, runs):
+    imports, cls = RUNTIMES[runtime]
+    code = COLD_START.format(imports=imports, cls=cls, path=model_path)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, stdout=subprocess.PIPE,
+                             text=True, check=True).stdout.split()
+        samples.append((float(out[0]), float(out[1]), out[2] == 'True'))
+    ms, rss, sklearn_loaded = zip(*samples)
+    return float(np.median(ms)), max(rss), sklearn_loaded[0]
+
+
+def latency(predict, inputs, warmup=20):
+    for x in inputs[:warmup]:
+        predict(x)
+    samples = []
+    for x in inputs:
+        start = time.perf_counter()
+        predict(x)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=20000, help='training examples')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--cold-runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from compiled_model import CompiledIntentModel, compiled_path
+    from model import IntentModel
+
+    workdir = tempfile.mkdtemp(prefix='bench_compiled_')
+    model_path = os.path.join(workdir, 'model.joblib')
+    texts, labels = make_corpus(args.size, args.seed)
+    queries, _ = make_corpus(args.queries, args.seed + 1)
+    sklearn_model = IntentModel(model_path)
+    sklearn_model.train(texts, labels)
+    sklearn_model.save()
+    compiled = CompiledIntentModel(model_path)
+    compiled.load(mmap=True)
+
+    classes_a, proba_a = sklearn_model.predict_proba(queries)
+    classes_b, proba_b = compiled.predict_proba(queries)
+    assert np.array_equal(classes_a, classes_b)
+    print(f"\n{args.size} training examples, {len(sklearn_model.pipeline[0].vocabulary_)} features, "
+          f"{len(classes_a)} intents")
+    print(f"agreement on {len(queries)} texts: labels {np.mean(proba_a.argmax(1) == proba_b.argmax(1)):.4f}, "
+          f"bit-identical probabilities {np.mean(proba_a == proba_b):.4f}, "
+          f"max abs diff {np.abs(proba_a - proba_b).max():.3g}")
+
+    print(f"\n{'':>9} | {'cold start':>10} | {'peak RSS':>8} | {'sklearn':>7} | {'1 text p50':>10} | "
+          f"{'p95':>6} | {f'{BATCH} texts p50':>13} | {'p95':>6} | {'file':>8}")
+    batches = [queries[i:i + BATCH] for i in range(0, len(queries) - BATCH + 1, BATCH)]
+    sizes = {'sklearn': os.path.getsize(model_path), 'compiled': os.path.getsize(compiled_path(model_path))}
+    for name, model in (('sklearn', sklearn_model), ('compiled', compiled)):
+        cold_ms, rss, sklearn_loaded = cold_start(name, model_path, args.cold_runs)
+        single = latency(model.predict, queries)
+        batch = latency(model.predict, batches, warmup=2)
+        print(f"{name:>9} | {cold_ms:>7.0f} ms | {rss:>5.0f} MB | {str(sklearn_loaded):>7} | "
+              f"{single[0]:>7.3f} ms | {single[1]:>6.3f} | {batch[0]:>10.3f} ms | {batch[1]:>6.3f} | "
+              f"{sizes[name] / 1e6:>5.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+# bench_encoders.py - PyTorch vs int8 ONNX Runtime sentence encoding
+#
+# Usage: python bench_encoders.py [--model all-MiniLM-L6-v2] [--queries 200] [--batch 32 128]
+# Exports the ONNX model on first use (see onnx_encoder.py).
+
+import argparse
+import time
+
+import numpy as np
+
+from generate_synthetic import intents
+from onnx_encoder import load_encoder
+
+
+def corpus(n):
+    base = [ex for examples in intents.values() for ex in examples]
+    suffixes = ['', ' please', ' ASAP', ' and also my bag is missing', ' for my trip to Paris next week']
+    return [base[i % len(base)] + suffixes[(i // len(base)) % len(suffixes)] for i in range(n)]
+
+
+def single_query_ms(encoder, sentences):
+    encoder.encode(sentences[0])  # warm-up
+    samples = []
+    for s in sentences:
+        start = time.perf_counter()
+        encoder.encode(s)
+        samples.append((time.perf_counter() - start) * 1000)
+    return np.percentile(samples, 50), np.percentile(samples, 95)
+
+
+def throughput(encoder, sentences, batch_size):
+    encoder.encode(sentences[:batch_size], batch_size=batch_size)  # warm-up
+    start = time.perf_counter()
+    encoder.encode(sentences, batch_size=batch_size)
+    return len(sentences) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='all-MiniLM-L6-v2')
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--batch', type=int, nargs='+', default=[32, 128])
+    parser.add_argument('--sentences', type=int, default=2048, help='sentences per throughput run')
+    args = parser.parse_args()
+
+    encoders = {backend: load_encoder(args.model, backend) for backend in ('torch', 'onnx')}
+    queries = corpus(args.queries)
+    sentences = corpus(args.sentences)
+
+    ref = encoders['torch'].encode(sentences[:256], normalize_embeddings=True)
+    got = encoders['onnx'].encode(sentences[:256], normalize_embeddings=True)
+    cos = np.sum(ref * got, axis=1)
+    print(f"cosine(onnx, torch): min {cos.min():.4f}  mean {cos.mean():.4f}")
+
+    header = f"{'backend':>7} | {'p50 ms':>7} | {'p95 ms':>7}"
+    header += ''.join(f" | {'sent/s @' + str(b):>12}" for b in args.batch)
+    print(header)
+    for backend, encoder in encoders.items():
+        p50, p95 = single_query_ms(encoder, queries)
+        row = f"{backend:>7} | {p50:>7.2f} | {p95:>7.2f}"
+        row += ''.join(f" | {throughput(encoder, sentences, b):>12.0f}" for b in args.batch)
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# bench_index_sync.py - convergence of replicas following the intents collection (index_sync.py)
+#
+# Usage: python bench_index_sync.py [--replicas 3] [--writes 200] [--rate 20] [--interval 1]
+#                                   [--examples 5000] [--uri mongodb://host/?replicaSet=rs0]
+#
+# Without --uri everything runs in process on mongomock, which has no change
+# streams, so the replicas poll updated_at. With --uri (a replica set) they
+# use change streams. Each replica is an IntentIndexSync with its own
+# IntentScorer over a hashing stand-in encoder (bench_suite.HashingEncoder).
+# A writer adds and removes examples through one replica at --rate per
+# second. Reported per replica:
+#   - lag from each write to the moment the replica applied it ("folded":
+#     writes undone before the replica saw them, so never applied)
+#   - whether its index ends up identical to the collection
+#   - the time spent applying changes, next to what a full reload would cost
+
+import argparse
+import random
+import threading
+import time
+
+import numpy as np
+
+from bench_suite import HashingEncoder, make_corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--replicas', type=int, default=3)
+    parser.add_argument('--writes', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20.0, help='writes per second')
+    parser.add_argument('--interval', type=float, default=1.0, help='INDEX_SYNC_INTERVAL')
+    parser.add_argument('--examples', type=int, default=5000, help='initial examples')
+    parser.add_argument('--uri', default=None, help='MongoDB URI (default: in-process mongomock)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.uri:
+        from pymongo import MongoClient
+
+        def collection():
+            return MongoClient(args.uri)['bench_index_sync']['intents']
+    else:
+        import mongomock
+        shared = mongomock.MongoClient()
+
+        def collection():
+            return shared['bench_index_sync']['intents']
+
+    from index_sync import IntentIndexSync, touch
+    from scoring import IntentScorer
+
+    coll = collection()
+    coll.drop()
+    texts, labels = make_corpus(args.examples, args.seed)
+    by_intent = {}
+    for text, label in zip(texts, labels):
+        by_intent.setdefault(label, set()).add(text)
+    for intent, examples in by_intent.items():
+        coll.update_one({'intent': intent}, touch({'$set': {'examples': sorted(examples)}}), upsert=True)
+
+    encoder = HashingEncoder()
+    replicas = []
+    for r in range(args.replicas):
+        replica = {'seen': {}, 'apply_s': 0.0, 'lock': threading.Lock()}
+
+        def apply(added, removed, generation, replica=replica):
+            start = time.perf_counter()
+            embeddings = encoder.encode([t for _, t in added + removed])
+            for (intent, _), emb in zip(added, embeddings):
+                replica['scorer'].add(intent, emb)
+            for (intent, _), emb in zip(removed, embeddings[len(added):]):
+                replica['scorer'].remove(intent, emb)
+            now = time.perf_counter()
+            replica['apply_s'] += now - start
+            with replica['lock']:
+                for pair in added:
+                    replica['seen'][('add', pair)] = now
+                for pair in removed:
+                    replica['seen'][('remove', pair)] = now
+
+        sync = IntentIndexSync(collection(), apply, interval=args.interval)
+        start = time.perf_counter()
+        t, l = sync.load()
+        replica['scorer'] = IntentScorer(l, encoder.encode(t))
+        replica['load_s'] = time.perf_counter() - start
+        replica['sync'] = sync
+        sync.start()
+        replicas.append(replica)
+
+    # Writer: new examples are added, earlier ones removed again
+    rng = random.Random(args.seed)
+    extra, _ = make_corpus(args.writes, args.seed + 1)
+    intents = sorted(by_intent)
+    writes = []
+    added = []
+    for i in range(args.writes):
+        if added and rng.random() < 0.3:
+            pair = added.pop(rng.randrange(len(added)))
+            kind, update = 'remove', {'$pull': {'examples': pair[1]}}
+        else:
+            pair = (rng.choice(intents), f"{extra[i]} #{i}")
+            added.append(pair)
+            kind, update = 'add', {'$addToSet': {'examples': pair[1]}}
+        replicas[0]['sync'].update({'intent': pair[0]}, update)
+        writes.append((kind, pair, time.perf_counter()))
+        time.sleep(1.0 / args.rate)
+
+    # Wait for every replica to catch up
+    expected = {(doc['intent'], ex) for doc in coll.find() for ex in doc.get('examples', [])}
+    deadline = time.perf_counter() + 10 * args.interval + 10
+    while time.perf_counter() < deadline and any(r['sync'].indexed() != expected for r in replicas):
+        time.sleep(0.05)
+
+    print(f"\n{args.replicas} replicas, {args.examples} examples, {args.writes} writes at {args.rate:g}/s, "
+          f"{replicas[1 if args.replicas > 1 else 0]['sync'].source} every {args.interval:g}s")
+    print(f"{'replica':>7} | {'lag p50':>7} | {'lag p95':>7} | {'lag max':>7} | {'folded':>6} | "
+          f"{'consistent':>10} | {'versions':>8} | {'apply total':>11} | {'full reload':>11}")
+    for r, replica in enumerate(replicas):
+        lags, folded = [], 0
+        with replica['lock']:
+            for kind, pair, ts in writes:
+                # A pair added and removed again may be applied as one no-op change
+                applied = replica['seen'].get((kind, pair))
+                if applied is None:
+                    folded += 1
+                else:
+                    lags.append(max(applied - ts, 0.0) * 1000)
+        consistent = replica['sync'].indexed() == expected and len(replica['scorer']) == len(expected)
+        lags = np.asarray(lags) if lags else np.zeros(1)
+        print(f"{r:>7} | {np.percentile(lags, 50):>4.0f} ms | {np.percentile(lags, 95):>4.0f} ms | "
+              f"{lags.max():>4.0f} ms | {folded:>6} | {str(consistent):>10} | {replica['sync'].version:>8} | "
+              f"{replica['apply_s'] * 1000:>8.0f} ms | {replica['load_s'] * 1000:>8.0f} ms")
+        replica['sync'].stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+# bench_prototypes.py - prototype compression vs full-corpus scoring
+#
+# Usage: python bench_prototypes.py [--sizes 10000 100000] [--k 8 16 32 64] [--queries 500]
+# Uses clustered random embeddings (several sub-topics per intent, see
+# bench_ann.py), so no Mongo or SBERT download is needed. For each k the
+# prototypes are built once in bulk and once incrementally (bulk on the first
+# half, add() for the rest), and compared with exact scoring on agreement,
+# recall@3 and accuracy against the intent each query was drawn from.
+
+import argparse
+import time
+
+import numpy as np
+
+from ann_index import PrototypeIntentScorer
+from bench_ann import DIM, N_INTENTS, TOP_K, TOPICS_PER_INTENT, per_query_ms, top_k_sets
+from scoring import IntentScorer
+
+
+def make_corpus(n_examples, n_queries, noise=0.9, seed=0):
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((N_INTENTS * TOPICS_PER_INTENT, DIM)).astype(np.float32)
+
+    def sample(n):
+        topic = rng.integers(0, len(topics), size=n)
+        x = topics[topic] + noise * rng.standard_normal((n, DIM)).astype(np.float32)
+        return x, [f"intent_{i}" for i in topic // TOPICS_PER_INTENT]
+
+    embeddings, labels = sample(n_examples)
+    queries, query_labels = sample(n_queries)
+    return labels, embeddings, queries, query_labels
+
+
+def evaluate(scorer, exact, queries, query_labels):
+    assert sorted(scorer.intents) == sorted(exact.intents)
+    # Align columns with the exact scorer's intent order
+    sets, scores = top_k_sets(scorer, queries)
+    scores = scores[:, [scorer.intents.index(i) for i in exact.intents]]
+    exact_sets, exact_scores = top_k_sets(exact, queries)
+    top1 = np.argmax(scores, axis=1)
+    return {
+        'ms': per_query_ms(scorer, queries),
+        'agree': np.mean(top1 == np.argmax(exact_scores, axis=1)),
+        'recall': np.mean([len(a & e) / TOP_K for a, e in zip(sets, exact_sets)]),
+        'accuracy': np.mean([exact.intents[i] == l for i, l in zip(top1, query_labels)]),
+        'score_gap': float(np.mean(exact_scores.max(axis=1) - scores.max(axis=1)))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--k", type=int, nargs="+", default=[8, 16, 32, 64], help="prototypes per intent")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--novelty", type=float, default=0.75)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        labels, embeddings, queries, query_labels = make_corpus(n, args.queries)
+        exact = IntentScorer(labels, embeddings)
+        exact_ms = per_query_ms(exact, queries)
+        exact_acc = np.mean([exact.intents[i] == l for i, l in zip(np.argmax(exact.score(queries), axis=1), query_labels)])
+        half = n // 2
+
+        print(f"\n{n} examples, exact {exact_ms:.3f} ms/query, accuracy {exact_acc:.3f}")
+        print(f"{'k':>4} | {'method':>8} | {'build':>11} | {'ms/query':>8} | {'speedup':>7} | "
+              f"{'top-1 agree':>11} | {'recall@3':>8} | {'accuracy':>8} | {'score gap':>9}")
+        for k in args.k:
+            for method in ('medoid', 'centroid'):
+                for build in ('bulk', 'incremental'):
+                    start = time.perf_counter()
+                    if build == 'bulk':
+                        scorer = PrototypeIntentScorer(labels, embeddings, k=k, method=method, novelty=args.novelty)
+                    else:
+                        scorer = PrototypeIntentScorer(labels[:half], embeddings[:half], k=k, method=method,
+                                                       novelty=args.novelty)
+                        for label, emb in zip(labels[half:], embeddings[half:]):
+                            scorer.add(label, emb)
+                    build_s = time.perf_counter() - start
+                    r = evaluate(scorer, exact, queries, query_labels)
+                    print(f"{k:>4} | {method:>8} | {build:>11} | {r['ms']:>8.3f} | {exact_ms / r['ms']:>6.1f}x | "
+                          f"{r['agree']:>11.3f} | {r['recall']:>8.3f} | {r['accuracy']:>8.3f} | {r['score_gap']:>9.4f}"
+                          f"   ({build_s:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# bench_quantization.py - float32 vs float16 vs int8 example embedding storage
+#
+# Usage: python bench_quantization.py [--sizes 10000 100000] [--queries 500] [--noise 2.5]
+# Uses the clustered random embeddings of bench_prototypes.py (no Mongo or
+# SBERT download needed), noisier than there so accuracy is not saturated.
+# The same examples are scored by IntentScorer stored as float32, float16 and
+# int8 (per-row scales, see scoring.quantize_rows) and compared on:
+#   - memory of the example vectors, scaled to 100k examples
+#   - ms/query, one query at a time and in batches of 64 (a batch upcasts
+#     each chunk of compact rows once)
+#   - top-1 agreement and recall@3 against float32
+#   - accuracy against the intent each query was drawn from, and its delta
+#     against float32
+#   - the largest absolute error of an intent score
+
+import argparse
+import time
+
+import numpy as np
+
+from bench_ann import TOP_K, per_query_ms, top_k_sets
+from bench_prototypes import make_corpus
+from scoring import IntentScorer, normalize_rows
+
+DTYPES = ('float32', 'float16', 'int8')
+BATCH = 64
+
+
+def batched_ms(scorer, queries):
+    start = time.perf_counter()
+    for i in range(0, len(queries), BATCH):
+        scorer.score(queries[i:i + BATCH])
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=2.5)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        labels, embeddings, queries, query_labels = make_corpus(n, args.queries, noise=args.noise)
+        embeddings = normalize_rows(embeddings)
+
+        print(f"\n{n} examples, dim {embeddings.shape[1]}")
+        print(f"{'dtype':>8} | {'MB / 100k':>9} | {'ms/query':>8} | {f'batch {BATCH}':>8} | "
+              f"{'top-1 agree':>11} | {'recall@3':>8} | {'accuracy':>8} | {'Δ accuracy':>10} | {'max score err':>13}")
+        reference = None
+        for dtype in DTYPES:
+            scorer = IntentScorer(labels, embeddings, normalized=True, dtype=dtype)
+            sets, scores = top_k_sets(scorer, queries)
+            top1 = np.argmax(scores, axis=1)
+            accuracy = np.mean([scorer.intents[i] == l for i, l in zip(top1, query_labels)])
+            if reference is None:
+                reference = sets, scores, top1, accuracy
+            ref_sets, ref_scores, ref_top1, ref_accuracy = reference
+            recall = np.mean([len(a & e) / TOP_K for a, e in zip(sets, ref_sets)])
+            print(f"{dtype:>8} | {scorer.nbytes() / n * 100_000 / 1e6:>9.1f} | "
+                  f"{per_query_ms(scorer, queries):>8.3f} | {batched_ms(scorer, queries):>8.3f} | "
+                  f"{np.mean(top1 == ref_top1):>11.4f} | {recall:>8.4f} | {accuracy:>8.4f} | {accuracy - ref_accuracy:>+10.4f} | "
+                  f"{np.abs(scores - ref_scores).max():>13.5f}")
+
+
+if __name__ == "__main__":
+    main()
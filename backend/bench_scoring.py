@@ -0,0 +1,77 @@
+# bench_scoring.py - compare the per-intent Python loop against IntentScorer
+#
+# Usage: python bench_scoring.py [--queries 32] [--repeat 20]
+# Uses random embeddings, so no Mongo or SBERT download is needed.
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from sentence_transformers import util
+
+from scoring import IntentScorer
+
+N_INTENTS = 19
+DIM = 384
+
+
+def make_corpus(n_examples, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n_examples, DIM)).astype(np.float32)
+    labels = [f"intent_{i % N_INTENTS}" for i in range(n_examples)]
+    return labels, embeddings
+
+
+def legacy_scores(user_emb, intent_embeddings):
+    """The original predict_multiple_intents loop: one cos_sim + .item() per intent."""
+    intent_scores = {}
+    for intent, example_embs in intent_embeddings.items():
+        scores = util.cos_sim(user_emb, example_embs)
+        intent_scores[intent] = torch.max(scores).item()
+    return intent_scores
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return np.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    queries = rng.standard_normal((args.queries, DIM)).astype(np.float32)
+
+    print(f"{'examples':>9} | {'loop ms/q':>10} | {'scorer ms/q':>11} | {'scorer batch ms/q':>17} | {'max |diff|':>10}")
+    for n in (1_000, 10_000, 100_000):
+        labels, embeddings = make_corpus(n)
+        scorer = IntentScorer(labels, embeddings)
+
+        intent_embeddings = {}
+        for intent in scorer.intents:
+            rows = [i for i, l in enumerate(labels) if l == intent]
+            intent_embeddings[intent] = torch.from_numpy(embeddings[rows])
+        q_tensor = torch.from_numpy(queries[0])
+
+        loop_ms = timed(lambda: legacy_scores(q_tensor, intent_embeddings), args.repeat)
+        single_ms = timed(lambda: scorer.score(queries[0]), args.repeat)
+        batch_ms = timed(lambda: scorer.score(queries), args.repeat) / args.queries
+
+        expected = legacy_scores(q_tensor, intent_embeddings)
+        got = dict(zip(scorer.intents, scorer.score(queries[0])[0]))
+        diff = max(abs(expected[i] - got[i]) for i in scorer.intents)
+
+        print(f"{n:>9} | {loop_ms:>10.3f} | {single_ms:>11.3f} | {batch_ms:>17.3f} | {diff:>10.2e}")
+
+
+if __name__ == "__main__":
+    main()
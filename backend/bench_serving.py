@@ -0,0 +1,139 @@
+# bench_serving.py - throughput and memory of pre-forked serving (gunicorn.conf.py)
+#
+# Usage: python bench_serving.py [--workers 1 2 4] [--clients 8] [--duration 10] [--workdir .]
+#
+# Needs what app.py needs (MongoDB, a trained model.joblib in --workdir) plus
+# gunicorn, and Linux for /proc. For each worker count it starts gunicorn,
+# drives /api/classify from --clients client processes over keep-alive
+# connections (prediction cache disabled) and reports requests/s, latency and
+# memory: PSS summed over master + workers counts shared pages once, USS is
+# what each worker holds privately.
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from generate_synthetic import intents
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+TEXTS = [ex for examples in intents.values() for ex in examples]
+
+
+def client_loop(task):
+    port, duration, seed = task
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    latencies = []
+    i = seed
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        body = json.dumps({'text': f"{TEXTS[i % len(TEXTS)]} #{i}"})
+        start = time.perf_counter()
+        conn.request('POST', '/api/classify', body, {'Content-Type': 'application/json'})
+        response = conn.getresponse()
+        response.read()
+        if response.status != 200:
+            raise RuntimeError(f"/api/classify -> {response.status}")
+        latencies.append((time.perf_counter() - start) * 1000)
+        i += 1
+    conn.close()
+    return latencies
+
+
+def smaps_rollup(pid):
+    """{'Pss': kB, 'Rss': kB, 'Private': kB} for one process."""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(':'):
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        'Pss': fields.get('Pss', 0),
+        'Rss': fields.get('Rss', 0),
+        'Private': fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+    }
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(proc, port, n_workers, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            if conn.getresponse().status == 200 and len(children(proc.pid)) >= n_workers:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('gunicorn did not become ready')
+
+
+def run(n_workers, args):
+    env = dict(os.environ, WEB_WORKERS=str(n_workers), WEB_THREADS=str(args.threads),
+               PORT=str(args.port), HOST='127.0.0.1', QUERY_CACHE_SIZE='0')
+    cmd = [sys.executable, '-m', 'gunicorn', '-c', os.path.join(BACKEND_DIR, 'gunicorn.conf.py'),
+           '--pythonpath', BACKEND_DIR, 'app:app']
+    proc = subprocess.Popen(cmd, cwd=args.workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(proc, args.port, n_workers)
+        client_loop((args.port, 1.0, 0))  # warm-up
+        with Pool(args.clients) as pool:
+            start = time.perf_counter()
+            results = pool.map(client_loop, [(args.port, args.duration, c * 100000) for c in range(args.clients)])
+            elapsed = time.perf_counter() - start
+        workers = children(proc.pid)
+        master = smaps_rollup(proc.pid)
+        worker_mem = [smaps_rollup(pid) for pid in workers]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(30)
+
+    latencies = np.concatenate([np.asarray(r) for r in results])
+    return {
+        'workers': n_workers,
+        'rps': len(latencies) / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'pss_total_mb': (master['Pss'] + sum(m['Pss'] for m in worker_mem)) / 1024,
+        'rss_total_mb': (master['Rss'] + sum(m['Rss'] for m in worker_mem)) / 1024,
+        'uss_per_worker_mb': float(np.mean([m['Private'] for m in worker_mem])) / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load per worker count')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--workdir', default='.', help='directory with model.joblib')
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} | {'req/s':>8} | {'scaling':>7} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'PSS total':>9} | {'RSS total':>9} | {'USS/worker':>10}")
+    base = None
+    for n in args.workers:
+        r = run(n, args)
+        base = base or r['rps']
+        print(f"{n:>7} | {r['rps']:>8.0f} | {r['rps'] / base:>6.2f}x | {r['p50_ms']:>7.2f} | {r['p95_ms']:>7.2f} | "
+              f"{r['pss_total_mb']:>6.0f} MB | {r['rss_total_mb']:>6.0f} MB | {r['uss_per_worker_mb']:>7.1f} MB")
+
+
+if __name__ == '__main__':
+    main()
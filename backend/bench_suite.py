@@ -0,0 +1,342 @@
+# bench_suite.py - end-to-end latency / throughput / memory benchmarks
+#
+# Usage: python bench_suite.py [--sizes 1000 10000 50000] [--queries 300] [--encoder torch|onnx|stub]
+#                              [--output bench_results.json] [--baseline previous.json] [--threshold 0.1]
+#
+# Runs offline: MongoDB is replaced by an in-process mongomock client and the
+# corpora are generated with generate_synthetic's Augmenter. Each corpus size
+# runs in its own subprocess (fresh imports, separate peak RSS, temp working
+# directory for model.joblib / embedding stores). --encoder stub swaps the
+# SentenceTransformer for a hashing encoder so no model download is needed;
+# use torch or onnx to include real encoding cost.
+#
+# Covered: IntentModel.train/predict, model1.predict_multiple_intents,
+# frontend/app.py predict_intents (skipped if streamlit isn't installed) and
+# the Flask /api/train and /api/classify routes through the test client.
+# Query caches are disabled so every call measures the uncached path.
+#
+# With --baseline, p95 latency and QPS are compared against a previous
+# results file and the exit status is 1 if anything regressed by more than
+# --threshold.
+
+import argparse
+import datetime
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FRONTEND_APP = os.path.join(BACKEND_DIR, '..', 'frontend', 'app.py')
+
+AGGRESSIVE = dict(lower_p=0.3, strip_punct_p=0.3, typo_p=0.3, drop_word_p=0.15,
+                  suffixes=['please', 'ASAP', 'now', 'thanks', 'urgently', 'today'],
+                  greetings=['Hi, ', 'Hello, ', 'Hey ', 'Good morning, '])
+PREDICT_BATCH = 64
+
+
+# --- corpora and stand-ins ---
+def make_corpus(n, seed):
+    """n (text, label) pairs cycling over the seed examples, augmented like generate_synthetic --aggressive."""
+    from generate_synthetic import Augmenter, intents
+
+    augmenter = Augmenter(seed=seed, **AGGRESSIVE)
+    pairs = [(label, ex) for label, examples in intents.items() for ex in examples]
+    texts, labels = [], []
+    for i in range(n):
+        label, example = pairs[i % len(pairs)]
+        texts.append(augmenter.augment(example))
+        labels.append(label)
+    return texts, labels
+
+
+class HashingEncoder:
+    """Deterministic bag-of-words stand-in for SentenceTransformer (--encoder stub)."""
+
+    def __init__(self, dim=384):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        out = np.zeros((len(sentences), self.dim), dtype=np.float32)
+        for row, sentence in enumerate(sentences):
+            for token in sentence.lower().split():
+                h = int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=4).digest(), 'little')
+                out[row, h % self.dim] += 1.0 if h & 1 << 31 else -1.0
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out[0] if single else out
+
+
+def use_mongomock():
+    """Every MongoClient(...) returns one shared in-memory client, like a single local mongod."""
+    import mongomock
+    import pymongo
+
+    shared = mongomock.MongoClient()
+    pymongo.MongoClient = lambda *args, **kwargs: shared
+    return shared
+
+
+def seed_databases(client, texts, labels):
+    now = datetime.datetime.utcnow()
+    client['airline_bot']['data'].insert_many([
+        {'text': t, 'label': l, 'synthetic': True, 'ts': now} for t, l in zip(texts, labels)
+    ])
+    examples = defaultdict(list)
+    for t, l in zip(texts, labels):
+        examples[l].append(t)
+    docs = [{'intent': intent, 'examples': ex} for intent, ex in examples.items()]
+    client['cathychatbot']['intents'].insert_many([dict(d) for d in docs])
+    client['a_chatbot']['intents'].insert_many([dict(d) for d in docs])
+
+
+# --- measurement ---
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def summarize(samples_ms, items_per_call=1):
+    """Latency percentiles per call; qps counts items (texts, or training examples for train)."""
+    samples = np.asarray(samples_ms)
+    total_s = samples.sum() / 1000
+    return {
+        'calls': len(samples),
+        'p50_ms': float(np.percentile(samples, 50)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'p99_ms': float(np.percentile(samples, 99)),
+        'mean_ms': float(samples.mean()),
+        'qps': float(len(samples) * items_per_call / total_s) if total_s else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def run_calls(fn, inputs, warmup=5):
+    for x in inputs[:warmup]:
+        fn(x)
+    return [timed(fn, x)[0] for x in inputs]
+
+
+# --- components ---
+def bench_intent_model(texts, labels, queries, results):
+    from model import IntentModel
+
+    model = IntentModel(os.path.join(os.getcwd(), 'bench_model.joblib'))
+    ms, _ = timed(model.train, texts, labels)
+    results['intent_model.train'] = summarize([ms], items_per_call=len(texts))
+    results['intent_model.predict'] = summarize(run_calls(model.predict, queries))
+    batches = [queries[i:i + PREDICT_BATCH] for i in range(0, len(queries), PREDICT_BATCH)]
+    results[f'intent_model.predict_batch{PREDICT_BATCH}'] = summarize(
+        run_calls(model.predict, batches, warmup=1), items_per_call=PREDICT_BATCH
+    )
+
+
+def bench_model1(queries, results):
+    ms, model1 = timed(importlib.import_module, 'model1')  # loads examples and builds the index
+    results['model1.startup'] = summarize([ms])
+    results['model1.predict_multiple_intents'] = summarize(run_calls(model1.predict_multiple_intents, queries))
+
+
+def load_file(name, path):
+    # frontend/app.py and backend/app.py share a module name, so load both by path
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_frontend(queries, results):
+    if importlib.util.find_spec('streamlit') is None:
+        print("⚠ streamlit not installed, skipping frontend predict_intents", file=sys.stderr)
+        return
+    # Silence the bare-mode "missing ScriptRunContext" warning on every st.* call;
+    # parse the config first, it would reset the level on the first st.* call
+    from streamlit import config
+    from streamlit.logger import set_log_level
+    config.get_config_options()
+    set_log_level('error')
+    sys.path.append(os.path.dirname(FRONTEND_APP))  # for embedding_cache
+    ms, frontend = timed(load_file, 'frontend_app', FRONTEND_APP)
+    results['frontend.startup'] = summarize([ms])
+    results['frontend.predict_intents'] = summarize(run_calls(frontend.predict_intents, queries))
+
+
+def bench_flask(queries, results):
+    backend_app = load_file('backend_app', os.path.join(BACKEND_DIR, 'app.py'))
+    client = backend_app.app.test_client()
+
+    def post(path, body):
+        response = client.post(path, json=body)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{path} -> {response.status_code}: {response.get_data(as_text=True)}")
+        return response
+
+    ms, _ = timed(post, '/api/train', {'wait': True})
+    results['flask./api/train'] = summarize([ms])
+    results['flask./api/classify'] = summarize(run_calls(lambda q: post('/api/classify', {'text': q}), queries))
+    backend_app.DATA_WRITER.flush()
+
+
+COMPONENTS = ('intent_model', 'model1', 'frontend', 'flask')
+
+
+def worker(args):
+    """Runs in a subprocess per corpus size; prints a JSON result line."""
+    sys.path.insert(0, BACKEND_DIR)
+    client = use_mongomock()
+    if args.encoder == 'stub':
+        import onnx_encoder
+        onnx_encoder.load_encoder = lambda *a, **kw: HashingEncoder()
+
+    texts, labels = make_corpus(args.size, args.seed)
+    queries, _ = make_corpus(args.queries, args.seed + 1)
+    seed_databases(client, texts, labels)
+
+    results = {}
+    start = time.perf_counter()
+    if 'intent_model' in args.components:
+        bench_intent_model(texts, labels, queries, results)
+    if 'model1' in args.components:
+        bench_model1(queries, results)
+    if 'frontend' in args.components:
+        bench_frontend(queries, results)
+    if 'flask' in args.components:
+        bench_flask(queries, results)
+
+    print(json.dumps({
+        'size': args.size,
+        'elapsed_s': time.perf_counter() - start,
+        'peak_rss_mb': peak_rss_mb(),
+        'components': results
+    }))
+
+
+def run_size(args, size):
+    with tempfile.TemporaryDirectory(prefix='bench_suite_') as workdir:
+        env = dict(
+            os.environ,
+            ENCODER_BACKEND=args.encoder if args.encoder != 'stub' else 'torch',
+            QUERY_CACHE_SIZE='0',
+            EMBEDDING_STORE_DIR=os.path.join(workdir, 'embedding_store'),
+            EMBEDDING_CACHE_PATH=os.path.join(workdir, 'embedding_cache.npz'),
+            TRAIN_MODE='full',
+            PYTHONWARNINGS='ignore'
+        )
+        cmd = [sys.executable, os.path.abspath(__file__), '--worker', '--size', str(size),
+               '--queries', str(args.queries), '--seed', str(args.seed), '--encoder', args.encoder,
+               '--components', *args.components]
+        proc = subprocess.run(cmd, cwd=workdir, env=env, stdout=subprocess.PIPE, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"benchmark worker for size {size} failed (exit {proc.returncode})")
+    # Imported modules print their own progress; the result is the last line
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def git_commit():
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                             stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Print p95/QPS deltas against baseline; returns the number of regressions."""
+    regressions = 0
+    print(f"\n{'size':>7} | {'component':<36} | {'p95 Δ':>8} | {'qps Δ':>8}")
+    for size, run in report['results'].items():
+        old_run = baseline.get('results', {}).get(size)
+        if not old_run:
+            continue
+        for name, stats in run['components'].items():
+            old = old_run['components'].get(name)
+            if not old:
+                continue
+            p95_delta = stats['p95_ms'] / old['p95_ms'] - 1 if old['p95_ms'] else 0.0
+            qps_delta = stats['qps'] / old['qps'] - 1 if old.get('qps') and stats.get('qps') else 0.0
+            flag = ''
+            if p95_delta > threshold or qps_delta < -threshold:
+                regressions += 1
+                flag = '  ❌ regression'
+            print(f"{size:>7} | {name:<36} | {p95_delta:>+8.1%} | {qps_delta:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000], help='corpus sizes')
+    parser.add_argument('--queries', type=int, default=300, help='timed queries per component')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--encoder', choices=['torch', 'onnx', 'stub'], default='torch')
+    parser.add_argument('--components', nargs='+', choices=COMPONENTS, default=list(COMPONENTS))
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative change counted as a regression')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    report = {
+        'meta': {
+            'timestamp': datetime.datetime.utcnow().isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'encoder': args.encoder,
+            'queries': args.queries,
+            'seed': args.seed
+        },
+        'results': {}
+    }
+    print(f"{'size':>7} | {'component':<36} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8} | {'qps':>9}")
+    for size in args.sizes:
+        run = run_size(args, size)
+        report['results'][str(size)] = run
+        for name, s in run['components'].items():
+            print(f"{size:>7} | {name:<36} | {s['p50_ms']:>8.2f} | {s['p95_ms']:>8.2f} | "
+                  f"{s['p99_ms']:>8.2f} | {s['qps']:>9.1f}")
+        print(f"{size:>7} | {'peak RSS':<36} | {run['peak_rss_mb']:>8.0f} MB")
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"❌ {regressions} regression(s) beyond {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+# bulk_classify.py - offline bulk classification of historical chat lines
+#
+# Usage: python bulk_classify.py INPUT OUTPUT [--engine intent_model|sbert] [--text-field text]
+#                                [--workers N] [--chunk-size 10000] [--batch-size 256]
+#                                [--resume | --overwrite]
+#
+# INPUT is a .jsonl file (one JSON object, or plain JSON string, per line), a
+# .csv file with a header row, or mongodb:<collection> (MONGODB_URI / DB_NAME,
+# filtered with --query '{"label": {"$exists": false}}'). OUTPUT is .jsonl or
+# .csv: every input record with the prediction added, in input order.
+#
+# The input is streamed in chunks of --chunk-size records; each chunk is split
+# into batches classified across --workers processes (0 = in this process),
+# with IntentModel (MODEL_RUNTIME / TRAIN_MODE pick the class like app.py) or
+# the SBERT multi-intent matcher of model1.py. For sbert the intents are read
+# from Mongo once, here; each worker only loads the encoder and maps model1's
+# embedding store. At most two chunks are in flight, so memory stays flat
+# however large the input is.
+#
+# After every chunk the output is flushed and OUTPUT.checkpoint records how
+# far the input was read (byte offset for files, last _id for Mongo, which is
+# read in _id order). --resume drops any output written after the checkpoint
+# and continues from there.
+
+import argparse
+import csv
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import get_context
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DB_NAME = os.getenv('DB_NAME', 'airline_bot')
+# sbert engine: the intents database, encoder and embedding store of model1.py
+SBERT_MONGO_URI = 'mongodb://localhost:27017/'
+SBERT_DB_NAME = 'cathychatbot'
+SBERT_MODEL_NAME = 'all-MiniLM-L6-v2'
+MAX_PENDING_CHUNKS = 2  # one being classified, one queued behind it
+PROGRESS_INTERVAL = 5.0  # seconds between progress lines
+
+
+# =======================================================
+# Inputs: (record, text, position after the record)
+# =======================================================
+class FileSource:
+    """JSONL or CSV file read in binary, so the byte offset of every record is known."""
+
+    def __init__(self, path, text_field):
+        self.path = path
+        self.text_field = text_field
+        self.kind = 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+    def read(self, position=None):
+        with open(self.path, 'rb') as f:
+            lines = (line.decode('utf-8') for line in iter(f.readline, b''))
+            if self.kind == 'csv':
+                # The reader pulls one physical line at a time, so after each
+                # row f.tell() is exactly at the start of the next one
+                fieldnames = next(csv.reader(lines), None)
+                if position is not None:
+                    f.seek(position)
+                for row in csv.DictReader(lines, fieldnames=fieldnames):
+                    yield row, row.get(self.text_field), f.tell()
+            else:
+                if position is not None:
+                    f.seek(position)
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    if not isinstance(record, dict):
+                        record = {self.text_field: record}
+                    yield record, record.get(self.text_field), f.tell()
+
+    def progress(self, position, records):
+        """(done, total) in bytes"""
+        return position or 0, os.path.getsize(self.path)
+
+
+class MongoSource:
+    """Documents matching query, in _id order; the position is the last _id read (extended JSON)."""
+
+    def __init__(self, collection, query, text_field):
+        from pymongo import MongoClient
+        self.collection = MongoClient(MONGO_URI)[DB_NAME][collection]
+        self.query = query
+        self.text_field = text_field
+        self.total = None
+
+    def _filter(self, position):
+        if position is None:
+            return self.query
+        from bson import json_util
+        return {'$and': [self.query, {'_id': {'$gt': json_util.loads(position)}}]}
+
+    def read(self, position=None):
+        from bson import json_util
+        cursor = self.collection.find(self._filter(position)).sort('_id', 1)
+        for doc in cursor:
+            yield doc, doc.get(self.text_field), json_util.dumps(doc['_id'])
+
+    def progress(self, position, records):
+        """(done, total) in documents"""
+        if self.total is None:
+            self.total = self.collection.count_documents(self.query)
+        return records, self.total
+
+
+def open_source(spec, query, text_field):
+    if spec.startswith('mongodb:'):
+        from bson import json_util
+        return MongoSource(spec[len('mongodb:'):], json_util.loads(query), text_field)
+    return FileSource(spec, text_field)
+
+
+def iter_chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# =======================================================
+# Output
+# =======================================================
+class OutputWriter:
+    """Appends records to a .jsonl or .csv file (CSV columns fixed by the first record)."""
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.csv = path.lower().endswith('.csv')
+        self.f = open(path, 'a' if resume else 'w', encoding='utf-8', newline='')
+        self.writer = None
+        if self.csv and resume and self.f.tell():
+            with open(path, encoding='utf-8', newline='') as existing:
+                self.writer = csv.DictWriter(self.f, next(csv.reader(existing)), extrasaction='ignore')
+
+    def write(self, records):
+        if not self.csv:
+            self.f.writelines(json.dumps(r, ensure_ascii=False, default=str) + '\n' for r in records)
+            return
+        if self.writer is None:
+            self.writer = csv.DictWriter(self.f, list(records[0]), extrasaction='ignore')
+            self.writer.writeheader()
+        for r in records:
+            self.writer.writerow({k: json.dumps(v) if isinstance(v, list) else v for k, v in r.items()})
+
+    def commit(self):
+        """Flush to disk; returns the output size the next checkpoint refers to."""
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        return self.f.tell()
+
+    def close(self):
+        self.f.close()
+
+
+def checkpoint_path(output):
+    return output + '.checkpoint'
+
+
+def load_checkpoint(args):
+    try:
+        with open(checkpoint_path(args.output)) as f:
+            checkpoint = json.load(f)
+    except FileNotFoundError:
+        return None
+    if checkpoint['input'] != args.input or checkpoint['engine'] != args.engine:
+        raise SystemExit(f"❌ {checkpoint_path(args.output)} belongs to a run of {checkpoint['engine']} "
+                         f"over {checkpoint['input']}.")
+    return checkpoint
+
+
+def save_checkpoint(args, records, position, output_bytes, complete=False):
+    path = checkpoint_path(args.output)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({
+            'input': args.input,
+            'engine': args.engine,
+            'records': records,
+            'position': position,
+            'output_bytes': output_bytes,
+            'complete': complete
+        }, f)
+    os.replace(path + '.tmp', path)
+
+
+# =======================================================
+# Classification (runs in the worker processes)
+# =======================================================
+_classify = None
+
+
+def load_intent_examples():
+    """(texts, labels) of every intent example, in the order model1.py indexes them."""
+    from pymongo import MongoClient
+    from index_sync import IntentIndexSync
+    intents = MongoClient(SBERT_MONGO_URI)[SBERT_DB_NAME]['intents']
+    return IntentIndexSync(intents, None, mode='off').load()
+
+
+def open_embedding_store():
+    from embedding_store import EmbeddingStore
+    from onnx_encoder import ENCODER_BACKEND
+    return EmbeddingStore(
+        os.getenv('EMBEDDING_STORE_DIR', 'embedding_store'),
+        f"{SBERT_MODEL_NAME}:{ENCODER_BACKEND}",
+        os.getenv('EMBEDDING_STORE_DTYPE', 'float16')
+    )
+
+
+def load_sbert_encoder():
+    from onnx_encoder import load_encoder
+    return load_encoder(SBERT_MODEL_NAME)  # PyTorch or int8 ONNX, see ENCODER_BACKEND
+
+
+def prepare_sbert(examples):
+    """
+    Bring the embedding store up to date once, before the workers start, so
+    they only map it. The encoder is loaded here only if examples are missing.
+    """
+    encoder = None
+
+    def encode(texts):
+        nonlocal encoder
+        encoder = encoder or load_sbert_encoder()
+        return encoder.encode(texts, convert_to_numpy=True)
+
+    open_embedding_store().sync(*examples, encode)
+
+
+def init_worker(engine, model_path, similarity_threshold, top_k, examples=None):
+    """Load the engine once per process."""
+    global _classify
+    if engine == 'intent_model':
+        if os.getenv('TRAIN_MODE', 'full') == 'incremental':
+            from model import IncrementalIntentModel as model_class
+        elif os.getenv('MODEL_RUNTIME', 'sklearn') == 'compiled':
+            from compiled_model import CompiledIntentModel as model_class
+        else:
+            from model import IntentModel as model_class
+        model = model_class(model_path)
+        # Memory-mapped: every worker shares the model's pages
+        if not model.load(mmap=True):
+            raise RuntimeError(f"no trained model at {model_path} (run train.py first)")
+
+        def classify(texts):
+            return [{'intent': str(label), 'confidence': float(conf)} for label, conf in model.predict(texts)]
+    else:
+        # The snapshot of the intents taken by run(); no Mongo, no sync thread
+        from ann_index import create_intent_scorer
+        encoder = load_sbert_encoder()
+        sorted_labels, embeddings, scales = open_embedding_store().sync(
+            *examples, lambda batch: encoder.encode(batch, convert_to_numpy=True)
+        )
+        scorer = create_intent_scorer(sorted_labels, embeddings, normalized=True, scales=scales)
+
+        def classify(texts):
+            ranked = scorer.top_intents(encoder.encode(texts, convert_to_numpy=True), similarity_threshold, top_k)
+            return [{'intents': [intent for intent, _ in r] or ['Irrelevant'],
+                     'scores': [round(score, 4) for _, score in r]} for r in ranked]
+    _classify = classify
+
+
+def classify_batch(texts):
+    return _classify(texts)
+
+
+# =======================================================
+# Driver
+# =======================================================
+def format_eta(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}h{seconds // 60 % 60:02d}m{seconds % 60:02d}s"
+
+
+def run(args):
+    checkpoint = None
+    if os.path.exists(args.output) or os.path.exists(checkpoint_path(args.output)):
+        if args.resume:
+            checkpoint = load_checkpoint(args)
+            if checkpoint is None:
+                raise SystemExit(f"❌ {args.output} has no checkpoint to resume from: "
+                                 f"pass --overwrite to start over.")
+            if not os.path.exists(args.output):
+                raise SystemExit(f"❌ {args.output} is missing but has a checkpoint: pass --overwrite to start over.")
+        elif not args.overwrite:
+            raise SystemExit(f"❌ {args.output} exists: pass --resume to continue it or --overwrite to start over.")
+    if checkpoint and checkpoint['complete']:
+        print(f"ℹ {args.output} is already complete ({checkpoint['records']:,} records).")
+        return
+    if checkpoint:
+        # Drop whatever was written after the last checkpoint
+        with open(args.output, 'r+b') as f:
+            f.truncate(checkpoint['output_bytes'])
+        print(f"↻ Resuming after {checkpoint['records']:,} records.")
+    records, position = (checkpoint['records'], checkpoint['position']) if checkpoint else (0, None)
+
+    source = open_source(args.input, args.query, args.text_field)
+    examples = None
+    if args.engine == 'sbert':
+        examples = load_intent_examples()
+        prepare_sbert(examples)
+    out = OutputWriter(args.output, resume=checkpoint is not None)
+    initargs = (args.engine, args.model_path, args.similarity_threshold, args.top_k, examples)
+    if args.workers:
+        # Split the cores between the workers instead of every worker's BLAS /
+        # torch using all of them (inherited by the spawned processes)
+        threads = str(max(1, (os.cpu_count() or 1) // args.workers))
+        for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+            os.environ.setdefault(var, threads)
+        executor = ProcessPoolExecutor(args.workers, mp_context=get_context('spawn'),
+                                       initializer=init_worker, initargs=initargs)
+        submit = executor.submit
+    else:
+        executor = None
+        init_worker(*initargs)
+
+        def submit(fn, *fn_args):
+            future = Future()
+            future.set_result(fn(*fn_args))
+            return future
+
+    start = last_report = time.perf_counter()
+    start_records = records
+    start_done, _ = source.progress(position, records)
+
+    def drain(chunk, futures):
+        nonlocal records, position, last_report
+        predictions = [p for future in futures for p in future.result()]
+        out.write([{**record, **p} for (record, _, _), p in zip(chunk, predictions)])
+        records += len(chunk)
+        position = chunk[-1][2]
+        save_checkpoint(args, records, position, out.commit())
+
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            done, total = source.progress(position, records)
+            rate = (records - start_records) / (now - start)
+            unit_rate = (done - start_done) / (now - start)
+            eta = format_eta((total - done) / unit_rate) if unit_rate > 0 else '?'
+            print(f"⏳ {records:,} records | {rate:,.0f}/s | {done / max(total, 1):.1%} | ETA {eta}", flush=True)
+
+    try:
+        pending = deque()
+        for chunk in iter_chunks(source.read(position), args.chunk_size):
+            texts = ['' if text is None else str(text) for _, text, _ in chunk]
+            futures = [submit(classify_batch, texts[i:i + args.batch_size])
+                       for i in range(0, len(texts), args.batch_size)]
+            pending.append((chunk, futures))
+            if len(pending) >= MAX_PENDING_CHUNKS:
+                drain(*pending.popleft())
+        while pending:
+            drain(*pending.popleft())
+        save_checkpoint(args, records, position, out.commit(), complete=True)
+    finally:
+        out.close()
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Classified {records - start_records:,} records in {elapsed:.1f}s "
+          f"({(records - start_records) / max(elapsed, 1e-9):,.0f}/s) -> {args.output}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input', help='.jsonl / .csv file, or mongodb:<collection>')
+    parser.add_argument('output', help='.jsonl or .csv file')
+    parser.add_argument('--engine', choices=['intent_model', 'sbert'], default='intent_model')
+    parser.add_argument('--text-field', default='text')
+    parser.add_argument('--query', default='{}', help='Mongo filter (extended JSON) for mongodb: inputs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='0 = classify in this process')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='records read (and checkpointed) at a time')
+    parser.add_argument('--batch-size', type=int, default=256, help='texts per worker call')
+    parser.add_argument('--model-path', default='model.joblib', help='IntentModel file (intent_model engine)')
+    parser.add_argument('--similarity-threshold', type=float, default=0.6, help='sbert engine')
+    parser.add_argument('--top-k', type=int, default=3, help='sbert engine')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--resume', action='store_true', help='continue from OUTPUT.checkpoint')
+    group.add_argument('--overwrite', action='store_true', help='start over if OUTPUT exists')
+    run(parser.parse_args())
@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+
+from metrics import REGISTRY
+
+# Top TF-IDF probability needed to answer without SBERT (see calibrate_threshold)
+CASCADE_THRESHOLD = float(os.getenv('CASCADE_THRESHOLD', 0.35))
+# Second-best TF-IDF probability at which a text is treated as possibly multi-intent
+CASCADE_MULTI_INTENT_P = float(os.getenv('CASCADE_MULTI_INTENT_P', 0.25))
+
+TIER_REQUESTS = REGISTRY.counter('asapp_cascade_requests', 'Texts answered by each cascade tier', ['tier'])
+
+
+class CascadeClassifier:
+    """
+    Two-tier intent classifier: IntentModel (TF-IDF + LogisticRegression)
+    answers when its top probability clears `threshold` and no second intent
+    is likely; everything else goes to SBERT multi-intent scoring in one
+    batched call.
+
+    fast_model: IntentModel, or a callable returning the current one (so a
+        retrained model is picked up)
+    semantic_fn: texts -> [[(intent, similarity), ...], ...], e.g.
+        model1.score_multiple_intents_batch
+    """
+
+    def __init__(self, fast_model, semantic_fn, threshold=CASCADE_THRESHOLD,
+                 multi_intent_p=CASCADE_MULTI_INTENT_P, fallback_intent='Irrelevant'):
+        self._fast_model = fast_model if callable(fast_model) else (lambda: fast_model)
+        self.semantic_fn = semantic_fn
+        self.threshold = threshold
+        self.multi_intent_p = multi_intent_p
+        self.fallback_intent = fallback_intent
+        self.counts = {'tfidf': 0, 'sbert': 0}
+        self._tier_counters = {tier: TIER_REQUESTS.labels(tier) for tier in self.counts}
+
+    def predict(self, texts):
+        """
+        texts: list of str
+        returns: one dict per text with intent, confidence, intents (all
+        predicted intents, best first) and tier ('tfidf' or 'sbert')
+        """
+        classes, proba = self._fast_model().predict_proba(texts)
+        order = np.argsort(-proba, axis=1)[:, :2]
+        rows = np.arange(len(texts))
+        top = proba[rows, order[:, 0]]
+        second = proba[rows, order[:, 1]] if proba.shape[1] > 1 else np.zeros(len(texts))
+        escalate = (top < self.threshold) | (second >= self.multi_intent_p)
+
+        results = [None] * len(texts)
+        for i in np.flatnonzero(~escalate):
+            label = str(classes[order[i, 0]])
+            results[i] = {'intent': label, 'confidence': float(top[i]), 'intents': [label], 'tier': 'tfidf'}
+
+        slow = np.flatnonzero(escalate)
+        if len(slow):
+            for i, ranked in zip(slow, self.semantic_fn([texts[i] for i in slow])):
+                if ranked:
+                    intents = [intent for intent, _ in ranked]
+                    results[i] = {'intent': intents[0], 'confidence': float(ranked[0][1]),
+                                  'intents': intents, 'tier': 'sbert'}
+                else:
+                    results[i] = {'intent': self.fallback_intent, 'confidence': 0.0,
+                                  'intents': [self.fallback_intent], 'tier': 'sbert'}
+
+        n_slow = len(slow)
+        self.counts['tfidf'] += len(texts) - n_slow
+        self.counts['sbert'] += n_slow
+        self._tier_counters['tfidf'].inc(len(texts) - n_slow)
+        self._tier_counters['sbert'].inc(n_slow)
+        return results
+
+    def stats(self):
+        total = sum(self.counts.values())
+        return {
+            'threshold': self.threshold,
+            'multi_intent_p': self.multi_intent_p,
+            'requests': dict(self.counts),
+            'fractions': {tier: n / total if total else 0.0 for tier, n in self.counts.items()}
+        }
+
+
+def calibrate_threshold(model, texts, labels, target_accuracy=0.95):
+    """
+    Lowest top-probability threshold at which the texts IntentModel would
+    answer on its own are at least target_accuracy correct, measured on a
+    held-out labelled set. Returns (threshold, fraction of texts answered);
+    threshold is None if no threshold reaches the target.
+    """
+    classes, proba = model.predict_proba(list(texts))
+    top = proba.max(axis=1)
+    correct = classes[proba.argmax(axis=1)] == np.asarray(labels)
+
+    order = np.argsort(-top, kind='stable')
+    accuracy = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    ok = np.flatnonzero(accuracy >= target_accuracy)
+    if not len(ok):
+        return None, 0.0
+    # Largest accepted prefix whose accuracy still clears the target
+    n = ok[-1] + 1
+    return float(top[order[n - 1]]), n / len(order)
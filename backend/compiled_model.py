@@ -0,0 +1,278 @@
+# compiled_model.py - sklearn-free inference runtime for IntentModel
+#
+# Usage: python compiled_model.py [model.joblib] [--check-texts N]
+#        (exports an existing model; IntentModel.save() does this on every save)
+#
+# The fitted TfidfVectorizer + LogisticRegression pipeline is exported to one
+# compact file next to model.joblib (model.compiled): the vocabulary, IDF
+# weights, coefficients, intercepts and classes. CompiledIntentModel reads it
+# with NumPy only (arrays memory-mapped), so serving processes skip importing
+# sklearn/scipy and unpickling the pipeline, and it tokenizes, builds the
+# sparse TF-IDF rows and computes probabilities in one pass.
+
+import json
+import math
+import os
+import re
+
+import numpy as np
+
+from metrics import timed
+
+MAGIC = b'ASAPPIM\x01'
+FORMAT = 1
+ALIGN = 64
+
+
+def compiled_path(model_path):
+    """model.joblib -> model.compiled"""
+    return os.path.splitext(model_path)[0] + '.compiled'
+
+
+def export_pipeline(pipeline, path, check_texts=None):
+    """
+    Write the fitted TF-IDF + LogisticRegression pipeline to path. With
+    check_texts, the exported model is loaded back and must reproduce the
+    pipeline's labels and probabilities on them (ValueError otherwise, and
+    nothing is written).
+    """
+    vectorizer, clf = pipeline[0], pipeline[-1]
+    if len(pipeline) != 2 or not hasattr(vectorizer, 'vocabulary_') or not hasattr(clf, 'coef_'):
+        raise ValueError('only a fitted TfidfVectorizer + linear classifier pipeline can be exported')
+    if vectorizer.analyzer != 'word' or vectorizer.tokenizer or vectorizer.preprocessor \
+            or vectorizer.strip_accents or vectorizer.stop_words:
+        raise ValueError('only the default word analyzer (no custom tokenizer, accents or stop words) is supported')
+    if re.compile(vectorizer.token_pattern).groups > 1:
+        raise ValueError('token_pattern may have at most one capturing group')
+
+    n_classes = len(clf.classes_)
+    if n_classes <= 2:
+        mode = 'binary'
+    elif getattr(clf, 'multi_class', 'auto') == 'ovr' or getattr(clf, 'solver', None) == 'liblinear':
+        mode = 'ovr'
+    else:
+        mode = 'softmax'
+
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    arrays = {
+        'terms': np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8),
+        'idf': np.asarray(vectorizer.idf_ if vectorizer.use_idf else np.ones(len(terms)), dtype=np.float64),
+        # (n_features, n_outputs): the rows of the terms in a text are gathered per call
+        'coef': np.ascontiguousarray(np.asarray(clf.coef_, dtype=np.float64).T),
+        'intercept': np.asarray(clf.intercept_, dtype=np.float64)
+    }
+    header = {
+        'format': FORMAT,
+        'vectorizer': {
+            'lowercase': bool(vectorizer.lowercase),
+            'token_pattern': vectorizer.token_pattern,
+            'ngram_range': list(vectorizer.ngram_range),
+            'binary': bool(vectorizer.binary),
+            'sublinear_tf': bool(vectorizer.sublinear_tf),
+            'norm': vectorizer.norm
+        },
+        'mode': mode,
+        'classes': [c.item() if isinstance(c, np.generic) else c for c in clf.classes_],
+        'arrays': {}
+    }
+
+    # Array offsets are relative to the aligned end of the header
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    blob = json.dumps(header).encode('utf-8')
+    start = -(-(len(MAGIC) + 8 + len(blob)) // ALIGN) * ALIGN
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(blob).to_bytes(8, 'little'))
+        f.write(blob)
+        for name, array in arrays.items():
+            f.seek(start + header['arrays'][name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(start + offset)
+
+    if check_texts is not None and len(check_texts):
+        check_texts = list(check_texts)
+        compiled = CompiledIntentModel(path=tmp_path)
+        compiled.load()
+        classes, proba = compiled.predict_proba(check_texts)
+        expected = pipeline.predict_proba(check_texts)
+        if not (np.array_equal(classes, clf.classes_) and np.allclose(proba, expected, rtol=0, atol=1e-12)
+                and np.array_equal(proba.argmax(axis=1), expected.argmax(axis=1))):
+            os.remove(tmp_path)
+            raise ValueError(f'compiled model disagrees with the pipeline (max abs diff '
+                             f'{np.abs(proba - expected).max():.3g})')
+    os.replace(tmp_path, path)
+
+
+class CompiledIntentModel:
+    """
+    Inference-only IntentModel loaded from an exported .compiled file; same
+    predict / predict_proba interface, no sklearn needed.
+    """
+
+    def __init__(self, model_path='model.joblib', path=None):
+        self.model_path = model_path
+        self.path = path or compiled_path(model_path)
+        self.classes = None
+
+    def load(self, mmap=False):
+        """
+        mmap=True maps the arrays read-only from the file, so processes
+        serving the same file share its pages.
+        """
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{self.path} is not a compiled intent model')
+            blob = f.read(int.from_bytes(f.read(8), 'little'))
+        header = json.loads(blob)
+        if header['format'] != FORMAT:
+            raise ValueError(f"{self.path}: unsupported format {header['format']}")
+        start = -(-(len(MAGIC) + 8 + len(blob)) // ALIGN) * ALIGN
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+            if mmap and name != 'terms' and np.prod(shape):
+                # Plain ndarray view: indexing a np.memmap subclass is slower
+                arrays[name] = np.asarray(np.memmap(self.path, dtype=dtype, mode='r',
+                                                    offset=start + spec['offset'], shape=shape))
+            else:
+                arrays[name] = np.fromfile(self.path, dtype=dtype, count=int(np.prod(shape)),
+                                           offset=start + spec['offset']).reshape(shape)
+
+        config = header['vectorizer']
+        terms = arrays['terms'].tobytes().decode('utf-8').split('\n') if arrays['terms'].size else []
+        self.vocabulary = dict(zip(terms, range(len(terms))))
+        self.idf = arrays['idf']
+        self.coef = arrays['coef']
+        self.intercept = arrays['intercept']
+        self.classes = np.asarray(header['classes'])
+        self.mode = header['mode']
+        self.lowercase = config['lowercase']
+        self.token_pattern = re.compile(config['token_pattern'])
+        self.min_n, self.max_n = config['ngram_range']
+        self.binary = config['binary']
+        self.sublinear_tf = config['sublinear_tf']
+        self.norm = config['norm']
+        return True
+
+    def analyze(self, text):
+        """Terms of text, as TfidfVectorizer's word analyzer produces them."""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self.token_pattern.findall(text)
+        if self.max_n == 1:
+            return tokens
+        terms = list(tokens) if self.min_n == 1 else []
+        for n in range(max(self.min_n, 2), min(self.max_n, len(tokens)) + 1):
+            terms.extend(' '.join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+        return terms
+
+    def transform(self, texts):
+        """
+        CSR parts (indptr, indices, data) of the TF-IDF rows of texts, column
+        indices sorted within a row as in the sklearn output.
+        """
+        vocabulary = self.vocabulary
+        indptr, indices, counts = [0], [], []
+        for text in texts:
+            row = {}
+            for term in self.analyze(text):
+                j = vocabulary.get(term)
+                if j is not None:
+                    row[j] = row.get(j, 0) + 1
+            for j in sorted(row):
+                indices.append(j)
+                counts.append(row[j])
+            indptr.append(len(indices))
+        indptr = np.asarray(indptr, dtype=np.int64)
+        indices = np.asarray(indices, dtype=np.int64)
+        data = np.asarray(counts, dtype=np.float64)
+        if self.binary:
+            data[:] = 1.0
+        elif self.sublinear_tf:
+            data = np.log(data) + 1.0
+        data *= self.idf[indices]
+        if self.norm:
+            # Summed left to right like sklearn's normalize; numpy's pairwise
+            # sums round differently
+            weights = np.abs(data).tolist() if self.norm == 'l1' else (data * data).tolist()
+            norms = []
+            for a, b in zip(indptr[:-1].tolist(), indptr[1:].tolist()):
+                total = 0.0
+                for w in weights[a:b]:
+                    total += w
+                norms.append(total if self.norm == 'l1' else math.sqrt(total))
+            norms = np.asarray(norms)
+            norms[norms == 0] = 1.0
+            data /= np.repeat(norms, np.diff(indptr))
+        return indptr, indices, data
+
+    def decision_function(self, texts):
+        with timed('vectorize'):
+            indptr, indices, data = self.transform(texts)
+        with timed('score'):
+            # Add the p-th term of every row at step p: the same left-to-right
+            # order as scipy's sparse product, vectorised across rows
+            scores = np.zeros((len(texts), self.coef.shape[1]))
+            lengths = np.diff(indptr)
+            for p in range(lengths.max(initial=0)):
+                rows = np.flatnonzero(lengths > p)
+                k = indptr[rows] + p
+                scores[rows] += data[k, None] * self.coef[indices[k]]
+            return scores + self.intercept
+
+    def predict_proba(self, texts):
+        """
+        texts: list of str
+        returns: (classes, probabilities of shape (len(texts), len(classes)))
+        """
+        scores = self.decision_function(texts)
+        if self.mode in ('binary', 'ovr'):
+            # Logistic through libm's exp (math.exp), like scipy's expit;
+            # numpy's vectorised exp can differ in the last bit
+            p = np.array([1.0 / (1.0 + math.exp(-x)) for x in scores.ravel().tolist()]).reshape(scores.shape)
+            if self.mode == 'binary':
+                return self.classes, np.column_stack([1.0 - p[:, 0], p[:, 0]])
+            return self.classes, p / p.sum(axis=1, keepdims=True)
+        scores -= scores.max(axis=1, keepdims=True)
+        np.exp(scores, out=scores)
+        return self.classes, scores / scores.sum(axis=1, keepdims=True)
+
+    def predict(self, text):
+        """
+        text: str or list of str
+        returns: (pred_label, confidence)
+        """
+        single_input = isinstance(text, str)
+        classes, proba = self.predict_proba([text] if single_input else text)
+        best = proba.argmax(axis=1)
+        preds = classes[best]
+        confidence = proba[np.arange(len(best)), best]
+        if single_input:
+            return preds[0], float(confidence[0])
+        return list(zip(preds, confidence))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    import joblib
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('model_path', nargs='?', default='model.joblib')
+    parser.add_argument('--check-texts', default=None, help='file with one text per line to verify the export on')
+    args = parser.parse_args()
+
+    check_texts = None
+    if args.check_texts:
+        with open(args.check_texts, encoding='utf-8') as f:
+            check_texts = [line.rstrip('\n') for line in f if line.strip()]
+    export_pipeline(joblib.load(args.model_path), compiled_path(args.model_path), check_texts)
+    print(f"✅ Exported {args.model_path} -> {compiled_path(args.model_path)}")
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import shutil
+
+import numpy as np
+
+from scoring import normalize_rows, to_storage
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, last writer wins
+    fcntl = None
+
+STORE_FORMAT = 2  # 1: arrays next to manifest.json, 2: arrays in a version directory
+
+
+def row_key(intent, text):
+    digest = hashlib.blake2b(f"{intent}\x1f{text}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def keys_hash(keys):
+    return hashlib.blake2b(np.ascontiguousarray(keys).tobytes(), digest_size=16).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Versioned on-disk store of example embeddings.
+
+    Layout of the store directory:
+        manifest.json   format version, model name, dtype, dim, row count, corpus
+                        and keys hashes, intents, current version directory
+        v<n>/embeddings.npy  (N, dim) L2-normalised rows, sorted by intent
+        v<n>/scales.npy      (N,) float32 per-row scale, int8 stores only
+        v<n>/labels.npy      (N,) int32 intent id per row
+        v<n>/offsets.npy     (n_intents + 1,) int64, intent i owns rows offsets[i]:offsets[i+1]
+        v<n>/keys.npy        (N,) uint64 hash of (intent, text) per row
+
+    A rebuild writes a new version directory and switches manifest.json to it
+    last, so a crash part way leaves the previous version in place; the row
+    count and keys hash are checked again before a version is mapped.
+
+    dtype is float32, float16 or int8 (symmetric per-row quantization, see
+    scoring.quantize_rows). The arrays are opened with mmap_mode='r', so
+    worker processes mapping the same store share its pages. When the corpus
+    changes only rows whose key is not in the store yet are encoded.
+    """
+
+    def __init__(self, path, model_name, dtype="float16"):
+        self.path = path
+        self.model_name = model_name
+        self.dtype = np.dtype(dtype)
+
+    def _file(self, name, manifest=None):
+        if manifest is None or "version" not in manifest:  # format 1 kept the arrays here
+            return os.path.join(self.path, name)
+        return os.path.join(self.path, manifest["version"], name)
+
+    def manifest(self):
+        try:
+            with open(self._file("manifest.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def sync(self, texts, labels, encode):
+        """
+        Make the store match (texts, labels) and map it.
+
+        encode: callable(list of str) -> (n, dim) array, only called for missing rows
+        returns: (sorted_labels, embeddings, scales) with embeddings a read-only
+            memmap; scales is None unless the store is int8
+        """
+        keys = np.array([row_key(l, t) for t, l in zip(texts, labels)], dtype=np.uint64)
+        corpus_hash = hashlib.blake2b(keys.tobytes(), digest_size=16).hexdigest()
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(".lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            manifest = self.manifest()
+            if not (self._matches(manifest, corpus_hash) and self._intact(manifest)):
+                manifest = self._rebuild(texts, labels, keys, corpus_hash, encode)
+            return self._map(manifest)
+
+    def _matches(self, manifest, corpus_hash):
+        return (
+            manifest is not None
+            and manifest.get("format") == STORE_FORMAT
+            and manifest.get("model") == self.model_name
+            and manifest.get("dtype") == self.dtype.name
+            and manifest.get("corpus_hash") == corpus_hash
+        )
+
+    def _intact(self, manifest):
+        """The version's arrays are all there and hold the rows the manifest describes."""
+        try:
+            count = manifest["count"]
+            keys = np.load(self._file("keys.npy", manifest), mmap_mode="r")
+            embeddings = np.load(self._file("embeddings.npy", manifest), mmap_mode="r")
+            label_ids = np.load(self._file("labels.npy", manifest), mmap_mode="r")
+            if manifest["dtype"] == "int8" and len(np.load(self._file("scales.npy", manifest), mmap_mode="r")) != count:
+                return False
+        except (OSError, ValueError, KeyError):
+            return False
+        return (
+            len(keys) == len(label_ids) == count
+            and embeddings.shape == (count, manifest["dim"])
+            and keys_hash(keys) == manifest.get("keys_hash")
+        )
+
+    def _map(self, manifest):
+        embeddings = np.load(self._file("embeddings.npy", manifest), mmap_mode="r")
+        label_ids = np.load(self._file("labels.npy", manifest), mmap_mode="r")
+        scales = np.load(self._file("scales.npy", manifest)) if self.dtype == np.int8 else None
+        intents = manifest["intents"]
+        return [intents[i] for i in label_ids], embeddings, scales
+
+    def _rebuild(self, texts, labels, keys, corpus_hash, encode):
+        # Reuse every row that is already stored under the same model
+        old_rows = {}
+        manifest = self.manifest()
+        if (manifest and manifest.get("format") in (1, STORE_FORMAT) and manifest.get("model") == self.model_name
+                and (manifest["format"] == 1 or self._intact(manifest))):
+            try:
+                old_keys = np.load(self._file("keys.npy", manifest))
+                old_embeddings = np.load(self._file("embeddings.npy", manifest), mmap_mode="r")
+                old_scales = np.load(self._file("scales.npy", manifest)) if old_embeddings.dtype == np.int8 else None
+                if len(old_keys) != len(old_embeddings):
+                    raise ValueError("keys and embeddings differ in length")
+                old_rows = {int(k): i for i, k in enumerate(old_keys)}
+            except (OSError, ValueError):
+                old_rows = {}
+
+        intents = list(dict.fromkeys(labels))
+        intent_ids = {intent: i for i, intent in enumerate(intents)}
+        label_ids = np.array([intent_ids[l] for l in labels], dtype=np.int32)
+        order = np.argsort(label_ids, kind="stable")
+
+        # Source row in the old store for every new row (-1 = must be encoded)
+        src = np.array([old_rows.get(int(k), -1) for k in keys[order]], dtype=np.int64)
+        missing = np.flatnonzero(src < 0)
+        reused = np.flatnonzero(src >= 0)
+
+        encoded = None
+        if len(missing):
+            encoded = normalize_rows(encode([texts[order[row]] for row in missing]))
+        dim = encoded.shape[1] if encoded is not None else (old_embeddings.shape[1] if len(reused) else 0)
+
+        embeddings = np.zeros((len(order), dim), dtype=self.dtype)
+        scales = np.ones(len(order), dtype=np.float32) if self.dtype == np.int8 else None
+        if len(reused):
+            rows = old_embeddings[src[reused]]
+            row_scales = old_scales[src[reused]] if old_scales is not None else None
+            if rows.dtype != self.dtype:
+                # Store dtype changed: convert through float32 (no re-encoding)
+                rows = normalize_rows(rows * row_scales[:, None] if row_scales is not None else rows)
+                rows, row_scales = to_storage(rows, self.dtype)
+            embeddings[reused] = rows
+            if scales is not None:
+                scales[reused] = row_scales
+        if encoded is not None:
+            embeddings[missing], missing_scales = to_storage(encoded, self.dtype)
+            if scales is not None:
+                scales[missing] = missing_scales
+
+        # Everything goes to a fresh version directory; processes still
+        # mapping the current one are unaffected
+        version = f"v{(manifest or {}).get('serial', 0) + 1}"
+        new_manifest = {
+            "format": STORE_FORMAT,
+            "version": version,
+            "serial": (manifest or {}).get("serial", 0) + 1,
+            "model": self.model_name,
+            "dtype": self.dtype.name,
+            "dim": int(embeddings.shape[1]),
+            "count": int(len(order)),
+            "corpus_hash": corpus_hash,
+            "keys_hash": keys_hash(keys[order]),
+            "intents": intents
+        }
+        shutil.rmtree(os.path.join(self.path, version), ignore_errors=True)  # left by a crashed rebuild
+        os.makedirs(os.path.join(self.path, version))
+        counts = np.bincount(label_ids, minlength=len(intents))
+        self._write("embeddings.npy", new_manifest, embeddings)
+        if scales is not None:
+            self._write("scales.npy", new_manifest, scales)
+        self._write("labels.npy", new_manifest, label_ids[order])
+        self._write("offsets.npy", new_manifest, np.concatenate([[0], np.cumsum(counts)]).astype(np.int64))
+        self._write("keys.npy", new_manifest, keys[order])
+
+        # Switching the manifest publishes the new version
+        tmp = self._file("manifest.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(new_manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._file("manifest.json"))
+        self._remove_old_versions(version)
+        print(f"✅ Embedding store rebuilt: {len(missing)} encoded, {len(reused)} reused.")
+        return new_manifest
+
+    def _write(self, name, manifest, array):
+        with open(self._file(name, manifest), "wb") as f:
+            np.save(f, array)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _remove_old_versions(self, current):
+        # Unlinked files stay readable for processes that still map them
+        for entry in os.listdir(self.path):
+            path = os.path.join(self.path, entry)
+            if entry.startswith("v") and entry != current and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif entry.endswith(".npy") or entry.endswith(".npy.tmp"):  # format 1 arrays
+                os.remove(path)
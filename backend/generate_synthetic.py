@@ -1,10 +1,20 @@
 # generate_synthetic_all_intents.py
 # Generates synthetic examples for all airline intents and inserts into MongoDB
+#
+# Usage: python generate_synthetic.py [--variants 50] [--seed 42] [--workers 4] [--dry-run]
+# Variants are deduplicated in memory and written with unordered bulk upserts,
+# backed by a unique (text, label) index on synthetic documents. As before, a
+# variant is skipped if any document (synthetic or logged) has that text and label.
 
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from multiprocessing import Pool
+import argparse
+import hashlib
 import os
-from dotenv import load_dotenv
 import random
+import time
+from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
@@ -12,11 +22,6 @@ load_dotenv()
 MONGO_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
 DB_NAME = os.getenv('DB_NAME', 'air_bot')
 
-# Connect to MongoDB
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
-DATA_COLL = db['data']
-
 # Define all 18 intents with a few seed examples each
 intents = {
     'Cancel Trip': ["I want to cancel my flight", "Please cancel my booking", "I need to cancel my reservation"],
@@ -39,31 +44,206 @@ intents = {
     'Sports Music Gear': ["Can I bring my guitar on the plane?", "What about sports equipment?"]
 }
 
-if __name__ == '__main__':
-    entries = []
-
-    for label, examples in intents.items():
-        for ex in examples:
-            # Generate 50+ synthetic variants per example
-            for i in range(50):
-                text = ex
-                if random.random() < 0.4:
-                    text += ' ' + random.choice(['please', 'ASAP', 'now'])
-                if random.random() < 0.2:
-                    text = 'Hi, ' + text
-                
-                # Avoid duplicates
-                if DATA_COLL.find_one({'text': text, 'label': label}):
+
+class Augmenter:
+    """
+    Seeded text augmentation. Each op fires with its own probability; the
+    defaults reproduce the original generator (suffix 40%, greeting 20%).
+    """
+
+    def __init__(self, seed=42, suffix_p=0.4, greeting_p=0.2, lower_p=0.0,
+                 strip_punct_p=0.0, typo_p=0.0, drop_word_p=0.0,
+                 suffixes=('please', 'ASAP', 'now'), greetings=('Hi, ',)):
+        self.rng = random.Random(seed)
+        self.suffix_p = suffix_p
+        self.greeting_p = greeting_p
+        self.lower_p = lower_p
+        self.strip_punct_p = strip_punct_p
+        self.typo_p = typo_p
+        self.drop_word_p = drop_word_p
+        self.suffixes = list(suffixes)
+        self.greetings = list(greetings)
+
+    def augment(self, text):
+        rng = self.rng
+        if rng.random() < self.drop_word_p:
+            words = text.split()
+            if len(words) > 3:
+                del words[rng.randrange(len(words))]
+                text = ' '.join(words)
+        if rng.random() < self.typo_p and len(text) > 3:
+            i = rng.randrange(len(text) - 1)
+            text = text[:i] + text[i + 1] + text[i] + text[i + 2:]
+        if rng.random() < self.strip_punct_p:
+            text = text.rstrip('?.!')
+        if rng.random() < self.suffix_p:
+            text += ' ' + rng.choice(self.suffixes)
+        if rng.random() < self.greeting_p:
+            text = rng.choice(self.greetings) + text
+        if rng.random() < self.lower_p:
+            text = text.lower()
+        return text
+
+
+def variant_key(text, label):
+    """64-bit hash of (text, label) for the in-memory dedupe set."""
+    digest = hashlib.blake2b(f"{label}\x1f{text}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+TASK_VARIANTS = 100000  # max augmentation attempts per worker task
+
+
+def generate_task(task):
+    """
+    Worker: generate `variants` attempts for one (label, example) pair.
+    The seed is derived from (seed, example index, chunk index), so the output
+    doesn't depend on the number of workers. Returns locally deduplicated
+    (text, label) pairs.
+    """
+    example_index, chunk_index, label, example, variants, seed, options = task
+    augmenter = Augmenter(seed=f"{seed}:{example_index}:{chunk_index}", **options)
+    seen, out = set(), []
+    for _ in range(variants):
+        text = augmenter.augment(example)
+        key = variant_key(text, label)
+        if key not in seen:
+            seen.add(key)
+            out.append((text, label))
+    return out
+
+
+def make_tasks(variants, seed, options):
+    pairs = [(label, ex) for label, examples in intents.items() for ex in examples]
+    tasks = []
+    for i, (label, example) in enumerate(pairs):
+        for chunk, start in enumerate(range(0, variants, TASK_VARIANTS)):
+            n = min(TASK_VARIANTS, variants - start)
+            tasks.append((i, chunk, label, example, n, seed, options))
+    return tasks
+
+
+def write_batch(coll, batch):
+    # Matched against every document, so a variant that repeats a logged
+    # classification isn't added; returns the number of inserted documents
+    ops = [
+        UpdateOne(
+            {'text': text, 'label': label},
+            {'$setOnInsert': {'text': text, 'label': label, 'synthetic': True}},
+            upsert=True
+        )
+        for text, label in batch
+    ]
+    try:
+        return coll.bulk_write(ops, ordered=False).upserted_count
+    except BulkWriteError as exc:
+        # Duplicate keys: another generator inserted the same variant first
+        if any(error['code'] != 11000 for error in exc.details['writeErrors']):
+            raise
+        return exc.details['nUpserted']
+
+
+def dedupe_synthetic(coll):
+    """
+    Delete repeated synthetic (text, label) documents, keeping the oldest of
+    each, so the unique index can be built on data written by older
+    versions of this script (which inserted without deduplication).
+    returns: number of documents deleted
+    """
+    duplicates = coll.aggregate([
+        {'$match': {'synthetic': True}},
+        {'$group': {'_id': {'text': '$text', 'label': '$label'}, 'ids': {'$push': '$_id'}, 'n': {'$sum': 1}}},
+        {'$match': {'n': {'$gt': 1}}}
+    ], allowDiskUse=True)
+    deleted, extra = 0, []
+    for group in duplicates:
+        extra.extend(sorted(group['ids'])[1:])
+        if len(extra) >= 10000:
+            deleted += coll.delete_many({'_id': {'$in': extra}}).deleted_count
+            extra = []
+    if extra:
+        deleted += coll.delete_many({'_id': {'$in': extra}}).deleted_count
+    return deleted
+
+
+def ensure_unique_index(coll):
+    # (text, label) lookups for the upserts in write_batch
+    coll.create_index([('text', 1), ('label', 1)], name='text_label')
+    if 'synthetic_text_label_unique' in coll.index_information():
+        return
+    # Duplicates are rejected by the DB too (synthetic docs only; logged
+    # classifications may legitimately repeat). Built once, after removing
+    # duplicates left by older versions of this script
+    removed = dedupe_synthetic(coll)
+    if removed:
+        print(f"ℹ Removed {removed} duplicate synthetic examples left by an earlier run.")
+    try:
+        coll.create_index(
+            [('text', 1), ('label', 1)], unique=True,
+            partialFilterExpression={'synthetic': True}, name='synthetic_text_label_unique'
+        )
+    except DuplicateKeyError as exc:
+        raise SystemExit(f"❌ Could not build the unique (text, label) index on synthetic examples: {exc}\n"
+                         f"   Duplicates were written while deduplicating (another generator running?); "
+                         f"run it again.")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--variants', type=int, default=50, help='augmentation attempts per seed example')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--batch-size', type=int, default=10000, help='upserts per bulk_write')
+    parser.add_argument('--aggressive', action='store_true',
+                        help='enable typos, lowercasing, punctuation and word dropout for larger variant spaces')
+    parser.add_argument('--dry-run', action='store_true', help='generate and count, do not write')
+    args = parser.parse_args()
+
+    options = {}
+    if args.aggressive:
+        options = dict(lower_p=0.3, strip_punct_p=0.3, typo_p=0.3, drop_word_p=0.15,
+                       suffixes=['please', 'ASAP', 'now', 'thanks', 'urgently', 'today'],
+                       greetings=['Hi, ', 'Hello, ', 'Hey ', 'Good morning, '])
+
+    coll = None
+    if not args.dry_run:
+        client = MongoClient(MONGO_URI)
+        coll = client[DB_NAME]['data']
+        ensure_unique_index(coll)
+
+    seen, batch = set(), []
+    generated = inserted = 0
+    start = time.perf_counter()
+    last_report = 0.0
+    tasks = make_tasks(args.variants, args.seed, options)
+    with Pool(args.workers) as pool:
+        for pairs in pool.imap(generate_task, tasks):
+            for text, label in pairs:
+                key = variant_key(text, label)
+                if key in seen:
                     continue
-                
-                entries.append({
-                    'text': text,
-                    'label': label,
-                    'synthetic': True
-                })
-
-    if entries:
-        DATA_COLL.insert_many(entries)
-        print(f'✅ Inserted {len(entries)} synthetic examples for all intents.')
+                seen.add(key)
+                batch.append((text, label))
+                generated += 1
+                if len(batch) >= args.batch_size:
+                    inserted += write_batch(coll, batch) if coll is not None else 0
+                    batch = []
+            elapsed = time.perf_counter() - start
+            if elapsed - last_report >= 1.0:
+                print(f"… {generated} unique variants ({generated / elapsed:,.0f}/s)")
+                last_report = elapsed
+    if batch and coll is not None:
+        inserted += write_batch(coll, batch)
+
+    elapsed = time.perf_counter() - start
+    print(f"Generated {generated} unique variants in {elapsed:.2f}s ({generated / elapsed:,.0f}/s)")
+    if args.dry_run:
+        return
+    if inserted:
+        print(f'✅ Inserted {inserted} synthetic examples for all intents.')
     else:
         print("No new entries were generated (all already exist).")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+# gunicorn.conf.py - pre-forked production serving of app.py
+#
+# Usage (from backend/): gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported once in the master (preload_app): the model is loaded
+# there, memory-mapped read-only (MODEL_MMAP=1), and the workers are forked
+# from it, so adding a worker costs its own interpreter state but not another
+# copy of the model arrays. Each worker re-opens its MongoClient and restarts
+# the write-behind/training threads after the fork (app.init_worker). A
+# training run in any worker publishes the new model through a shared
+# generation counter and every worker reloads it on its next request.
+#
+# Metrics at /metrics are per worker.
+
+import gc
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_WORKERS', 0)) or multiprocessing.cpu_count()
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 4))
+preload_app = True
+timeout = int(os.getenv('WEB_TIMEOUT', 120))  # /api/train with {"wait": true} blocks a worker thread
+
+
+def when_ready(server):
+    # Objects allocated while loading stay out of the garbage collector's
+    # reach, so collections in the workers don't dirty (and copy) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.init_worker()
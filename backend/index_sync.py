@@ -0,0 +1,261 @@
+import datetime
+import os
+import threading
+from collections import Counter, deque
+
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+# "auto" = change streams when the server supports them (replica set or
+# sharded cluster), otherwise polling on updated_at; "change_stream", "poll"
+# or "off" to force one
+INDEX_SYNC = os.getenv('INDEX_SYNC', 'auto')
+INDEX_SYNC_INTERVAL = float(os.getenv('INDEX_SYNC_INTERVAL', 2.0))
+# Polls re-read documents this far behind the newest updated_at seen, so a
+# write that commits late (or a clock step on the server) isn't missed
+INDEX_SYNC_OVERLAP = float(os.getenv('INDEX_SYNC_OVERLAP', 5.0))
+
+
+def touch(update):
+    """
+    Add the bookkeeping every write to an intents document carries: a
+    per-document version and a server-side updated_at for the polling
+    fallback.
+    """
+    update = dict(update)
+    update['$inc'] = {**update.get('$inc', {}), 'version': 1}
+    update['$currentDate'] = {**update.get('$currentDate', {}), 'updated_at': True}
+    return update
+
+
+class IntentIndexSync:
+    """
+    Keeps one replica's in-memory example index in step with an intents
+    collection ({intent, examples, version, updated_at} documents) written by
+    every replica.
+
+    A background thread follows the collection with a change stream, or polls
+    documents whose updated_at moved when change streams aren't available.
+    Changed documents are diffed against the examples this replica has
+    indexed and apply(added, removed, generation) is called with just the
+    (intent, text) pairs that appeared or disappeared. Each applied change
+    bumps `version`, the local index version.
+
+    apply runs outside `lock` (it usually encodes), one change at a time and
+    in the order the changes were seen. `generation` counts load() snapshots:
+    a change tagged with an older generation than the index was rebuilt from
+    is already part of that snapshot and must be dropped by apply.
+    """
+
+    def __init__(self, collection, apply, mode=INDEX_SYNC, interval=INDEX_SYNC_INTERVAL,
+                 overlap=INDEX_SYNC_OVERLAP):
+        self.collection = collection
+        self.apply = apply
+        self.mode = mode
+        self.interval = interval
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.version = 0
+        self.generation = 0  # bumped by every load()
+        self.source = None  # "change_stream" or "poll" once the thread runs
+        self.lock = threading.Lock()
+        self._docs = {}  # _id -> (doc version, intent, examples)
+        self._pairs = Counter()  # (intent, text) -> number of documents holding it
+        self._watermark = None  # newest updated_at seen
+        self._resume_token = None
+        self._pending = deque()  # (generation, added, removed) not applied yet
+        self._apply_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def load(self):
+        """
+        Snapshot the whole collection as the indexed state.
+        returns: (texts, labels) to build the index from
+        """
+        docs = list(self.collection.find({}, {'intent': 1, 'examples': 1, 'version': 1, 'updated_at': 1}))
+        with self.lock:
+            self._docs, self._pairs = {}, Counter()
+            for doc in docs:
+                self._track(doc)
+            self._watermark = max((d['updated_at'] for d in docs if d.get('updated_at')), default=None)
+            self.generation += 1
+            self._pending.clear()  # the snapshot already holds them
+            pairs = list(self._pairs)
+        return [text for _, text in pairs], [intent for intent, _ in pairs]
+
+    def _track(self, doc, touched=None):
+        examples = tuple(dict.fromkeys(doc.get('examples') or ()))
+        self._docs[doc['_id']] = (doc.get('version', 0), doc['intent'], examples)
+        self._count(((doc['intent'], ex) for ex in examples), 1, touched)
+
+    def _untrack(self, doc_id, touched=None):
+        _, intent, examples = self._docs.pop(doc_id)
+        self._count(((intent, ex) for ex in examples), -1, touched)
+
+    def _count(self, pairs, step, touched):
+        """Adjust the document count of pairs; touched records each pair's count before the first change."""
+        for pair in pairs:
+            n = self._pairs.get(pair, 0)
+            if touched is not None and pair not in touched:
+                touched[pair] = n
+            if n + step:
+                self._pairs[pair] = n + step
+            else:
+                del self._pairs[pair]
+
+    def refresh(self, docs, deleted_ids=()):
+        """
+        Apply the current state of changed documents (and deleted ones) to the
+        index. Documents older than the version already applied are skipped.
+        Only the pairs of the changed documents are compared, so the cost is
+        independent of the corpus size.
+        returns: (added, removed) pairs
+        """
+        with self.lock:
+            touched = {}  # pair -> number of documents holding it before this refresh
+            for doc_id in deleted_ids:
+                if doc_id in self._docs:
+                    self._untrack(doc_id, touched)
+            for doc in docs:
+                known = self._docs.get(doc['_id'])
+                if known is not None:
+                    if doc.get('version', 0) < known[0]:
+                        continue
+                    self._untrack(doc['_id'], touched)
+                self._track(doc, touched)
+                if doc.get('updated_at') and (self._watermark is None or doc['updated_at'] > self._watermark):
+                    self._watermark = doc['updated_at']
+
+            added = [p for p, n in touched.items() if not n and p in self._pairs]
+            removed = [p for p, n in touched.items() if n and p not in self._pairs]
+            if added or removed:
+                self._pending.append((self.generation, added, removed))
+        self._apply_pending()
+        return added, removed
+
+    def _apply_pending(self):
+        """Apply queued changes in order; returns once this thread's change is applied."""
+        with self._apply_lock:
+            while True:
+                with self.lock:
+                    if not self._pending:
+                        return
+                    generation, added, removed = self._pending.popleft()
+                self.apply(added, removed, generation)
+                with self.lock:
+                    self.version += 1
+
+    def update(self, query, update, upsert=False):
+        """
+        update_one on the collection with touch() bookkeeping, applied to the
+        local index right away (read-your-writes; the other replicas follow
+        through the sync thread). Returns (added, removed).
+        """
+        doc = self.collection.find_one_and_update(
+            query, touch(update), upsert=upsert, return_document=ReturnDocument.AFTER,
+            projection={'intent': 1, 'examples': 1, 'version': 1, 'updated_at': 1}
+        )
+        return self.refresh([doc]) if doc is not None else ([], [])
+
+    def resync(self):
+        """Diff the whole collection against the index (after a gap in the change feed)."""
+        docs = list(self.collection.find({}, {'intent': 1, 'examples': 1, 'version': 1, 'updated_at': 1}))
+        with self.lock:
+            deleted = set(self._docs) - {d['_id'] for d in docs}
+        return self.refresh(docs, deleted)
+
+    def poll(self):
+        """One polling round: documents touched since the watermark, and deleted documents."""
+        query = {}
+        if self._watermark is not None:
+            query = {'updated_at': {'$gte': self._watermark - self.overlap}}
+        docs = list(self.collection.find(query, {'intent': 1, 'examples': 1, 'version': 1, 'updated_at': 1}))
+        # Deletes leave no updated_at behind; compare the _id sets instead
+        with self.lock:
+            deleted = set(self._docs) - set(self.collection.distinct('_id'))
+        return self.refresh(docs, deleted)
+
+    # --- background thread ---
+    def start(self):
+        """Start following the collection (again in a forked child; idempotent otherwise)."""
+        if self.mode == 'off':
+            return
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._stop.clear()
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='intent-index-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        if self.mode in ('auto', 'change_stream') and hasattr(type(self.collection), 'watch'):
+            try:
+                self.source = 'change_stream'
+                self._follow_stream()
+                return
+            except PyMongoError as exc:
+                if self.mode == 'change_stream':
+                    raise
+                print(f"ℹ Change streams unavailable ({exc}); polling intents every {self.interval:g}s.")
+        self.source = 'poll'
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except PyMongoError as exc:
+                print(f"⚠ Intent index poll failed: {exc}")
+
+    def _follow_stream(self):
+        first = True
+        while not self._stop.is_set():
+            try:
+                with self.collection.watch(full_document='updateLookup', resume_after=self._resume_token,
+                                           max_await_time_ms=int(self.interval * 1000)) as stream:
+                    # Changes between the snapshot (or a lost stream) and now
+                    self.resync()
+                    first = False
+                    while not self._stop.is_set() and stream.alive:
+                        change = stream.try_next()
+                        if change is not None:
+                            self._on_change(change)
+                        self._resume_token = stream.resume_token
+            except PyMongoError as exc:
+                if first:
+                    raise  # change streams not supported: let _run fall back to polling
+                print(f"⚠ Intent change stream interrupted ({exc}); reconnecting.")
+                self._resume_token = None
+                self._stop.wait(self.interval)
+
+    def _on_change(self, change):
+        op = change['operationType']
+        if op in ('insert', 'update', 'replace'):
+            doc = change.get('fullDocument')
+            if doc is None:  # deleted before the lookup
+                self.refresh([], [change['documentKey']['_id']])
+            else:
+                self.refresh([doc])
+        elif op == 'delete':
+            self.refresh([], [change['documentKey']['_id']])
+        elif op in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            self._resume_token = None
+            self.resync()
+
+    def indexed(self):
+        """Set of (intent, text) pairs currently applied to the index."""
+        with self.lock:
+            return set(self._pairs)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'index_version': self.version,
+                'source': self.source,
+                'documents': len(self._docs),
+                'examples': len(self._pairs),
+                'watermark': self._watermark
+            }
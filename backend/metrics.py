@@ -0,0 +1,271 @@
+import bisect
+import cProfile
+import io
+import math
+import numbers
+import os
+import pstats
+import random
+import threading
+import time
+from collections import OrderedDict
+
+# Set METRICS_ENABLED=0 to turn stage timers into no-ops
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') != '0'
+# Fraction of requests run under cProfile (0 = off); can be changed at runtime
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0.0))
+
+# Seconds; 50µs .. 10s
+LATENCY_BUCKETS = [0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0]
+SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+
+
+class Histogram:
+    """Fixed-bucket histogram (bucket i counts values <= bounds[i], last bucket is +inf)."""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.total += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {str(b): c for b, c in zip(self.bounds, self.counts)}
+            buckets['+inf'] = self.counts[-1]
+            return {
+                'buckets': buckets,
+                'count': self.total,
+                'mean': self.sum / self.total if self.total else 0.0
+            }
+
+    def samples(self, name, labels):
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.total, self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + ['+Inf'], counts):
+            cumulative += count
+            yield f'{name}_bucket', {**labels, 'le': str(bound)}, cumulative
+        yield f'{name}_sum', labels, value_sum
+        yield f'{name}_count', labels, total
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name, labels):
+        yield f'{name}_total', labels, self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class MetricFamily:
+    """One metric name with a child per label-value combination."""
+
+    def __init__(self, name, kind, help_text, labelnames, factory):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._factory = factory
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """Child for these label values; resolve once and keep it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._factory())
+        return child
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield from child.samples(self.name, dict(zip(self.labelnames, values)))
+
+
+class Registry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+
+    counter/gauge/histogram return the metric itself when it has no labels,
+    otherwise a MetricFamily to call .labels(...) on. Values owned by other
+    objects (cache hit counts, buffer sizes) are read at scrape time through
+    add_collector callbacks instead of being updated on the hot path.
+    """
+
+    def __init__(self):
+        self._families = OrderedDict()
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, name, kind, help_text, labelnames, factory):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = MetricFamily(name, kind, help_text, labelnames, factory)
+        return family if labelnames else family.labels()
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(name, 'counter', help_text, labelnames, Counter)
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(name, 'gauge', help_text, labelnames, Gauge)
+
+    def histogram(self, name, help_text, bounds=LATENCY_BUCKETS, labelnames=()):
+        return self._register(name, 'histogram', help_text, labelnames, lambda: Histogram(bounds))
+
+    def add_collector(self, fn):
+        """fn() -> iterable of (name, kind, help, [(labels dict, value), ...]), called per scrape."""
+        self._collectors.append(fn)
+
+    def render(self):
+        lines = []
+        for family in list(self._families.values()):
+            lines.append(f'# HELP {family.name} {family.help}')
+            lines.append(f'# TYPE {family.name} {family.kind}')
+            lines.extend(_sample_line(n, labels, v) for n, labels, v in family.samples())
+        for collect in self._collectors:
+            for name, kind, help_text, values in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(_sample_line(name, labels, v) for labels, v in values)
+        return '\n'.join(lines) + '\n'
+
+
+def _sample_line(name, labels, value):
+    if labels:
+        pairs = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+        return f'{name}{{{pairs}}} {_format_value(value)}'
+    return f'{name} {_format_value(value)}'
+
+
+def _format_value(value):
+    """Exact integers, shortest round-tripping floats (%g would cut counts to 6 digits)."""
+    if isinstance(value, numbers.Integral):
+        return str(int(value))
+    value = float(value)
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(
+    'asapp_stage_seconds', 'Time spent in each hot-path stage', labelnames=['stage']
+)
+
+
+class _StageTimer:
+    __slots__ = ('hist', 'start')
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.start)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NOOP = _NoopTimer()
+
+
+def timed(stage):
+    """`with timed('encode'): ...` records the block's wall time under asapp_stage_seconds{stage}."""
+    if not METRICS_ENABLED:
+        return _NOOP
+    return _StageTimer(STAGE_SECONDS.labels(stage))
+
+
+class SampledProfiler:
+    """
+    Runs a random fraction of requests under cProfile and accumulates the
+    stats. Only one request is profiled at a time (a sample is skipped while
+    another one is running), so overhead stays proportional to the rate.
+    """
+
+    def __init__(self, rate=PROFILE_SAMPLE_RATE):
+        self.rate = rate
+        self.samples = 0
+        self._stats = None
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Returns a running profiler for this request, or None if it isn't sampled."""
+        if self.rate <= 0 or random.random() >= self.rate or not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:  # another profiler (e.g. a debugger) is active
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler):
+        profiler.disable()
+        self._busy.release()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+            self.samples += 1
+
+    def report(self, sort='cumulative', limit=40):
+        with self._lock:
+            if self._stats is None:
+                return 'no profiled requests yet\n'
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+        return f'{self.samples} sampled requests, rate {self.rate}\n' + out.getvalue()
+
+    def reset(self):
+        with self._lock:
+            self._stats = None
+            self.samples = 0
@@ -1,11 +1,17 @@
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
 import os
+import zlib
 import numpy as np
+from bson import ObjectId
+from datetime import timedelta
+
+from compiled_model import compiled_path, export_pipeline
+from metrics import timed
 
 class IntentModel:
     def __init__(self, model_path='model.joblib'):
@@ -14,12 +20,14 @@ class IntentModel:
             ('tfidf', TfidfVectorizer(ngram_range=(1,2), max_features=20000)),
             ('clf', LogisticRegression(max_iter=1000))
         ])
+        self.check_texts = None  # held-out texts of the last train(), to verify the compiled export
 
     def train(self, texts, labels):
         X_train, X_test, y_train, y_test = train_test_split(
             texts, labels, test_size=0.2, random_state=42, stratify=labels
         )
         self.pipeline.fit(X_train, y_train)
+        self.check_texts = X_test
         preds = self.pipeline.predict(X_test)
         acc = accuracy_score(y_test, preds)
         report = classification_report(y_test, preds, output_dict=True)
@@ -35,24 +43,189 @@ class IntentModel:
             text = [text]
             single_input = True
 
-        preds = self.pipeline.predict(text)
-
-        # Get confidence if possible
-        if hasattr(self.pipeline.named_steps['clf'], 'predict_proba'):
-            proba = self.pipeline.predict_proba(text)
-            confidence = proba.max(axis=1)
+        # Get confidence if possible; labels come from the same predict_proba
+        # pass so the pipeline only runs once per call
+        clf = self.pipeline.named_steps['clf']
+        if hasattr(clf, 'predict_proba'):
+            classes, proba = self.predict_proba(text)
+            best = proba.argmax(axis=1)
+            preds = classes[best]
+            confidence = proba[np.arange(len(best)), best]
         else:
+            with timed('vectorize'):
+                features = self.pipeline[:-1].transform(text)
+            with timed('score'):
+                preds = clf.predict(features)
             confidence = np.array([1.0]*len(preds))
 
         if single_input:
             return preds[0], float(confidence[0])
         return list(zip(preds, confidence))
 
+    def predict_proba(self, texts):
+        """
+        texts: list of str
+        returns: (classes, probabilities of shape (len(texts), len(classes)))
+        """
+        clf = self.pipeline.named_steps['clf']
+        with timed('vectorize'):
+            features = self.pipeline[:-1].transform(texts)
+        with timed('score'):
+            return clf.classes_, clf.predict_proba(features)
+
+    def save(self, require_compiled=False):
+        # sklearn-free copy for serving (see compiled_model.CompiledIntentModel),
+        # prepared before anything is published. Best effort: a model that
+        # can't be exported is still saved, without a stale .compiled next to it,
+        # unless require_compiled (MODEL_RUNTIME=compiled) makes it fatal
+        compiled = compiled_path(self.model_path)
+        try:
+            export_pipeline(self.pipeline, compiled + '.new', self.check_texts)
+            exported = True
+        except Exception as exc:
+            if os.path.exists(compiled + '.new'):
+                os.remove(compiled + '.new')
+            if require_compiled:
+                raise RuntimeError(f'compiled export of {self.model_path} failed: {exc}') from exc
+            print(f"⚠ Compiled export of {self.model_path} skipped: {exc}")
+            exported = False
+
+        # Write then rename, so a concurrent load never sees a half-written file
+        tmp_path = self.model_path + '.tmp'
+        joblib.dump(self.pipeline, tmp_path)
+        os.replace(tmp_path, self.model_path)
+        if exported:
+            os.replace(compiled + '.new', compiled)
+        elif os.path.exists(compiled):
+            os.remove(compiled)
+
+    def load(self, mmap=False):
+        """
+        mmap=True maps the numpy arrays of the saved pipeline read-only from
+        the file instead of copying them, so processes serving the same file
+        share one copy in the page cache (don't train a model loaded this way).
+        """
+        if os.path.exists(self.model_path):
+            self.pipeline = joblib.load(self.model_path, mmap_mode='r' if mmap else None)
+            return True
+        return False
+
+
+class IncrementalIntentModel(IntentModel):
+    """
+    Out-of-core variant of IntentModel: a stateless HashingVectorizer (term
+    frequencies, no IDF) and a logistic-loss SGDClassifier updated with
+    partial_fit. Each training run streams only documents newer than the
+    checkpoint (last trained _id) from the data collection.
+
+    ObjectIds are only ordered to the second and are generated by each
+    client, so a document inserted by another process or a write-behind
+    worker can get an _id below the checkpoint. Each run therefore re-reads
+    the last `overlap` seconds before the checkpoint and skips the _ids it
+    already trained on there (kept in `recent`).
+    """
+
+    overlap = int(os.getenv('INCREMENTAL_OVERLAP_SECONDS', '300'))
+
+    def __init__(self, model_path='model_incremental.joblib', n_features=2**20):
+        self.model_path = model_path
+        self.pipeline = Pipeline([
+            ('hashing', HashingVectorizer(ngram_range=(1,2), n_features=n_features, alternate_sign=False)),
+            ('clf', SGDClassifier(loss='log_loss', alpha=1e-5, random_state=42))
+        ])
+        self.checkpoint = None  # _id of the newest document trained on
+        self.recent = set()  # _ids trained on within `overlap` of the checkpoint
+        self.classes = None
+
+    @staticmethod
+    def is_holdout(text, holdout=0.2):
+        """Deterministic split: a text is always on the same side across runs."""
+        return zlib.crc32(text.encode('utf-8')) % 100 < holdout * 100
+
+    def partial_train(self, texts, labels):
+        X = self.pipeline.named_steps['hashing'].transform(texts)
+        self.pipeline.named_steps['clf'].partial_fit(X, labels, classes=self.classes)
+
+    def train_from_collection(self, collection, batch_size=5000, holdout=0.2):
+        """
+        Update the model with documents added since the last checkpoint.
+        returns: (accuracy, classification_report dict, number of new documents);
+        accuracy/report are computed on the held-out part of the new documents
+        (None/{} when there is none).
+        """
+        labels = sorted(collection.distinct('label'))
+        if self.classes is not None and not set(labels) <= set(self.classes):
+            # SGDClassifier can't grow its classes: start over with the full label set
+            print(f"ℹ New intent labels {sorted(set(labels) - set(self.classes))}; retraining from scratch.")
+            self.__init__(self.model_path, self.pipeline.named_steps['hashing'].n_features)
+        if self.classes is None:
+            self.classes = labels
+
+        query = {}
+        if self.checkpoint is not None:
+            since = self.checkpoint.generation_time - timedelta(seconds=self.overlap)
+            query = {'_id': {'$gte': ObjectId.from_datetime(since)}}
+        newest = collection.find_one(query, {'_id': 1}, sort=[('_id', -1)])
+        if newest is None:
+            return None, {}, 0
+        query = {'_id': {'$lte': newest['_id'], **query.get('_id', {})}}
+        seen = self.recent
+
+        # Pass 1: partial_fit on the training part, one cursor batch at a time
+        n_docs = 0
+        trained = set()
+        for ids, texts, labels in self._stream(collection, query, batch_size, seen):
+            n_docs += len(texts)
+            trained.update(ids)
+            train_rows = [i for i, t in enumerate(texts) if not self.is_holdout(t, holdout)]
+            if train_rows:
+                self.partial_train([texts[i] for i in train_rows], [labels[i] for i in train_rows])
+        if n_docs == 0:
+            return None, {}, 0
+        self.checkpoint = newest['_id']
+        since = ObjectId.from_datetime(self.checkpoint.generation_time - timedelta(seconds=self.overlap))
+        self.recent = {i for i in seen | trained if i >= since}
+
+        # Pass 2: evaluate on the held-out part of the same documents
+        y_true, y_pred = [], []
+        for _, texts, labels in self._stream(collection, query, batch_size, seen):
+            test_rows = [i for i, t in enumerate(texts) if self.is_holdout(t, holdout)]
+            if test_rows:
+                y_true.extend(labels[i] for i in test_rows)
+                y_pred.extend(self.pipeline.predict([texts[i] for i in test_rows]))
+        if not y_true:
+            return None, {}, n_docs
+        acc = accuracy_score(y_true, y_pred)
+        report = classification_report(y_true, y_pred, output_dict=True)
+        return acc, report, n_docs
+
+    def _stream(self, collection, query, batch_size, skip=()):
+        cursor = collection.find(query, {'text': 1, 'label': 1}).sort('_id', 1).batch_size(batch_size)
+        ids, texts, labels = [], [], []
+        for doc in cursor:
+            if doc['_id'] in skip:
+                continue
+            ids.append(doc['_id'])
+            texts.append(doc['text'])
+            labels.append(doc['label'])
+            if len(texts) == batch_size:
+                yield ids, texts, labels
+                ids, texts, labels = [], [], []
+        if texts:
+            yield ids, texts, labels
+
     def save(self):
-        joblib.dump(self.pipeline, self.model_path)
+        tmp_path = self.model_path + '.tmp'
+        joblib.dump({'pipeline': self.pipeline, 'checkpoint': self.checkpoint, 'recent': self.recent,
+                     'classes': self.classes}, tmp_path)
+        os.replace(tmp_path, self.model_path)
 
-    def load(self):
+    def load(self, mmap=False):
         if os.path.exists(self.model_path):
-            self.pipeline = joblib.load(self.model_path)
+            state = joblib.load(self.model_path, mmap_mode='r' if mmap else None)
+            self.pipeline = state['pipeline']
+            self.checkpoint = state['checkpoint']
+            self.recent = state.get('recent', set())
+            self.classes = state['classes']
             return True
         return False
@@ -1,6 +1,15 @@
-from sentence_transformers import SentenceTransformer, util
-import torch
 from pymongo import MongoClient
+import numpy as np
+import os
+import threading
+
+from ann_index import create_intent_scorer
+from batch_encoder import BatchEncoder
+from embedding_store import EmbeddingStore
+from index_sync import IntentIndexSync, touch
+from metrics import timed
+from onnx_encoder import ENCODER_BACKEND, load_encoder
+from query_cache import QueryCache
 
 # =======================================================
 # 1️⃣ Initial intents
@@ -38,39 +47,89 @@ feedback_collection = db["feedback"]
 # =======================================================
 # 3️⃣ Insert initial intents if not present
 # =======================================================
+existing_intents = set(intents_collection.distinct("intent"))
 for intent, examples in intents_data.items():
-    if intents_collection.count_documents({"intent": intent}) == 0:
-        intents_collection.insert_one({"intent": intent, "examples": examples})
+    if intent not in existing_intents:
+        intents_collection.update_one({"intent": intent}, touch({"$setOnInsert": {"examples": examples}}), upsert=True)
 
 # =======================================================
 # 4️⃣ Load Sentence Transformer
 # =======================================================
-semantic_model = SentenceTransformer('all-MiniLM-L6-v2')
+MODEL_NAME = 'all-MiniLM-L6-v2'
+semantic_model = load_encoder(MODEL_NAME)  # PyTorch or int8 ONNX, see ENCODER_BACKEND
+
+# Coalesces single-text encode calls from concurrent callers into one batch
+batch_encoder = BatchEncoder(semantic_model)
+
+# Repeated utterances: query embeddings stay valid as long as the SBERT model,
+# intent lists are invalidated whenever the example index changes
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 10000))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 3600))
+query_embedding_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+intent_result_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
 
 # =======================================================
 # 5️⃣ Load examples and compute embeddings
 # =======================================================
+# The sync thread changes intent_scorer in place (add/remove/compact swap its
+# arrays) while request threads score: both hold index_lock
+index_lock = threading.Lock()
+# A rebuild holds index_update_lock from its snapshot until the new scorer is
+# in place, so no change seen after the snapshot reaches the old scorer;
+# index_generation is the IntentIndexSync snapshot intent_scorer was built from
+index_update_lock = threading.Lock()
+index_generation = 0
+
+def apply_index_changes(added, removed, generation):
+    """Apply examples added/removed on any replica (see IntentIndexSync) to the local index."""
+    pairs = added + removed
+    with index_update_lock:
+        if generation != index_generation:
+            print(f"ℹ Dropped {len(pairs)} intent index changes already part of a rebuild.")
+            return
+        # Encoded outside index_lock: scoring goes on meanwhile
+        embeddings = semantic_model.encode([text for _, text in pairs], convert_to_numpy=True)
+        with index_lock:
+            for (intent, text), emb in zip(added, embeddings):
+                intent_scorer.add(intent, emb)
+                example_texts.append(text)
+                example_labels.append(intent)
+            for (intent, text), emb in zip(removed, embeddings[len(added):]):
+                intent_scorer.remove(intent, emb)
+                for i, (t, l) in enumerate(zip(example_texts, example_labels)):
+                    if t == text and l == intent:
+                        del example_texts[i], example_labels[i]
+                        break
+    intent_result_cache.invalidate()
+    print(f"✅ Intent index updated: +{len(added)} / -{len(removed)} examples.")
+
+# Follows the intents collection, so feedback given on another replica
+# reaches this index within INDEX_SYNC_INTERVAL seconds
+index_sync = IntentIndexSync(intents_collection, apply_index_changes)
+
 def load_examples():
-    texts, labels = [], []
-    for doc in intents_collection.find():
-        for text in doc["examples"]:
-            texts.append(text)
-            labels.append(doc["intent"])
-    return texts, labels
+    return index_sync.load()
+
+# Example embeddings are kept in a memory-mapped store on disk, so a restart
+# (or another worker) maps the file and only encodes examples it doesn't have
+embedding_store = EmbeddingStore(
+    os.getenv('EMBEDDING_STORE_DIR', 'embedding_store'),
+    f"{MODEL_NAME}:{ENCODER_BACKEND}",
+    os.getenv('EMBEDDING_STORE_DTYPE', 'float16')
+)
+
+# All example embeddings in one index for multi-intent prediction
+# (exact or approximate, selected with INTENT_INDEX)
+def build_intent_scorer(texts, labels):
+    sorted_labels, embeddings, scales = embedding_store.sync(
+        texts, labels, lambda batch: semantic_model.encode(batch, convert_to_numpy=True)
+    )
+    return create_intent_scorer(sorted_labels, embeddings, normalized=True, scales=scales)
 
 example_texts, example_labels = load_examples()
-example_embeddings = semantic_model.encode(example_texts, convert_to_tensor=True)
-
-# Precompute intent-wise embeddings for multi-intent prediction
-def load_intent_embeddings():
-    embeddings = {}
-    for doc in intents_collection.find():
-        examples = doc["examples"]
-        if examples:
-            embeddings[doc["intent"]] = semantic_model.encode(examples, convert_to_tensor=True)
-    return embeddings
-
-intent_embeddings = load_intent_embeddings()
+index_generation = index_sync.generation
+intent_scorer = build_intent_scorer(example_texts, example_labels)
+index_sync.start()
 
 # =======================================================
 # 6️⃣ Multi-intent prediction
@@ -83,12 +142,14 @@ def update_embeddings_for_all_intents():
     """
     Recompute embeddings for all intents after feedback update
     """
-    global intent_embeddings
-    intent_embeddings = {}
-    for doc in intents_collection.find():
-        examples = doc["examples"]
-        if examples:
-            intent_embeddings[doc["intent"]] = semantic_model.encode(examples, convert_to_tensor=True)
+    global example_texts, example_labels, intent_scorer, index_generation
+    with index_update_lock:
+        texts, labels = load_examples()
+        scorer = build_intent_scorer(texts, labels)
+        with index_lock:
+            example_texts, example_labels, intent_scorer = texts, labels, scorer
+            index_generation = index_sync.generation
+    intent_result_cache.invalidate()
     print("✅ Recomputed embeddings for all intents.")
 
 
@@ -98,46 +159,79 @@ def predict_multiple_intents(user_text, similarity_threshold=0.6, top_k=3):
     Returns multiple relevant intents based on max similarity per intent.
     Automatically filters out weakly related intents.
     """
-    global intent_embeddings  # Make sure we use the updated embeddings
-    user_emb = semantic_model.encode(user_text, convert_to_tensor=True)
-    intent_scores = {}
+    version = intent_result_cache.version
+    cached = intent_result_cache.get(user_text, similarity_threshold, top_k)
+    if cached is not None:
+        return list(cached)
+
+    user_emb = query_embedding_cache.get(user_text)
+    if user_emb is None:
+        with timed('encode'):
+            user_emb = batch_encoder.encode(user_text)
+        query_embedding_cache.put(user_text, user_emb)
+
+    predicted_intents = rank_intents(user_emb[None, :], similarity_threshold, top_k)[0]
+    intent_result_cache.put(user_text, tuple(predicted_intents), similarity_threshold, top_k, version=version)
+    return predicted_intents
 
-    # Compute max similarity for each intent
-    for intent, example_embs in intent_embeddings.items():
-        scores = util.cos_sim(user_emb, example_embs)
-        intent_scores[intent] = torch.max(scores).item()
 
-    # ✅ Filter out low-confidence intents
-    relevant_intents = {
-        intent: score for intent, score in intent_scores.items() if score >= similarity_threshold
-    }
+def encode_queries(user_texts):
+    """(len(user_texts), dim) query embeddings; cache misses are encoded in one call."""
+    user_embs = [query_embedding_cache.get(text) for text in user_texts]
+    missing = [i for i, emb in enumerate(user_embs) if emb is None]
+    if missing:
+        with timed('encode'):
+            encoded = semantic_model.encode([user_texts[i] for i in missing], convert_to_numpy=True)
+        for i, emb in zip(missing, encoded):
+            user_embs[i] = emb
+            query_embedding_cache.put(user_texts[i], emb)
+    return np.stack(user_embs)
 
-    # ✅ Sort by score descending
-    sorted_intents = sorted(relevant_intents.items(), key=lambda x: x[1], reverse=True)
 
-    # ✅ Pick top_k results
-    predicted_intents = [intent for intent, _ in sorted_intents[:top_k]]
+def predict_multiple_intents_batch(user_texts, similarity_threshold=0.6, top_k=3):
+    """
+    Batched version of predict_multiple_intents: one encode call and one
+    matrix product for all texts. Returns one intent list per text.
+    """
+    user_texts = list(user_texts)
+    if not user_texts:
+        return []
+    return rank_intents(encode_queries(user_texts), similarity_threshold, top_k)
 
-    # ✅ Handle case where only one strong match exists
-    if len(predicted_intents) == 0:
-        predicted_intents = ["Irrelevant"]
 
-    return predicted_intents
+def score_multiple_intents_batch(user_texts, similarity_threshold=0.6, top_k=3):
+    """Like predict_multiple_intents_batch, but [(intent, similarity), ...] per text (empty if none clears the threshold)."""
+    user_texts = list(user_texts)
+    if not user_texts:
+        return []
+    user_embs = encode_queries(user_texts)
+    with timed('score'), index_lock:
+        return intent_scorer.top_intents(user_embs, similarity_threshold, top_k)
+
+
+def rank_intents(user_embs, similarity_threshold=0.6, top_k=3):
+    # ✅ Max similarity per intent, filtered by threshold and sorted descending
+    with timed('score'), index_lock:
+        ranked = intent_scorer.top_intents(user_embs, similarity_threshold, top_k)
+
+    # ✅ Handle case where no strong match exists
+    return [[intent for intent, _ in r] or ["Irrelevant"] for r in ranked]
 
 # =======================================================
 # 7️⃣ Update DB & embeddings after feedback
 # =======================================================
 def update_intent(user_text, correct_intent):
-    intents_collection.update_one(
+    # Encodes only the new example and appends it to the intent's segment;
+    # other replicas pick the change up through their index_sync
+    added, _ = index_sync.update(
         {"intent": correct_intent},
         {"$addToSet": {"examples": user_text}},
         upsert=True
     )
-    # Update all embeddings immediately
-    global example_texts, example_labels, example_embeddings, intent_embeddings
-    example_texts, example_labels = load_examples()
-    example_embeddings = semantic_model.encode(example_texts, convert_to_tensor=True)
-    intent_embeddings = load_intent_embeddings()
+    # $addToSet was a no-op: the example is already indexed
+    if not added:
+        print(f"ℹ '{user_text}' is already an example of '{correct_intent}'.")
+        return
     print(f"✅ Updated intent '{correct_intent}' and embeddings.")
 
 def store_feedback(user_text, predicted_intent, correct_intent):
@@ -210,13 +304,10 @@ def chat():
             if not valid_intents:
                 print("⚠ No valid intents provided. Skipping update.")
             else:
-                # Update DB for valid intents
+                # Update DB and append the new example embeddings
                 for correct in valid_intents:
                     update_intent(user_text, correct)
 
-                # Recompute embeddings
-                update_embeddings_for_all_intents()
-
                 # Store feedback
                 for predicted, correct in zip(predicted_intents, valid_intents):
                     store_feedback(user_text, predicted, correct)
@@ -0,0 +1,199 @@
+import inspect
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock
+    fcntl = None
+
+# "torch" = SentenceTransformer on eager PyTorch, "onnx" = int8 ONNX Runtime export
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', 'torch')
+ONNX_MODEL_DIR = os.getenv('ONNX_MODEL_DIR', 'onnx_models')
+ONNX_MIN_COSINE = float(os.getenv('ONNX_MIN_COSINE', 0.99))
+
+# Sentences used to check the export against the PyTorch model
+VERIFY_SENTENCES = [
+    "I want to cancel my flight",
+    "What is the check-in baggage limit?",
+    "Can I bring my guitar on the plane?",
+    "My bag didn’t arrive and the staff was rude",
+    "Find the square root of 64",
+    "hi",
+]
+
+
+def load_encoder(model_name, backend=None, device='cpu'):
+    """Return an object with a SentenceTransformer-compatible encode()."""
+    backend = backend or ENCODER_BACKEND
+    if backend == 'torch':
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name, device=device)
+    if backend == 'onnx':
+        return OnnxEncoder.load_or_export(model_name, os.path.join(ONNX_MODEL_DIR, model_name.replace('/', '_')))
+    raise ValueError(f"unknown encoder backend '{backend}' (expected 'torch' or 'onnx')")
+
+
+@contextmanager
+def export_lock(export_dir):
+    """Serializes exports and loads of export_dir across processes."""
+    parent = os.path.dirname(os.path.abspath(export_dir))
+    os.makedirs(parent, exist_ok=True)
+    with open(os.path.abspath(export_dir) + '.lock', 'w') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+class OnnxEncoder:
+    """
+    Sentence encoder running a dynamically int8-quantized ONNX export of a
+    SentenceTransformer on onnxruntime (CPU). Only the transformer runs in
+    ONNX; mean pooling and L2 normalisation are done in NumPy, matching the
+    all-MiniLM-L6-v2 pipeline.
+    """
+
+    def __init__(self, export_dir, threads=None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(export_dir, 'encoder.json')) as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            os.path.join(export_dir, 'model.int8.onnx'), options, providers=['CPUExecutionProvider']
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+    @classmethod
+    def load_or_export(cls, model_name, export_dir):
+        with export_lock(export_dir):
+            if not os.path.exists(os.path.join(export_dir, 'encoder.json')):
+                cls._export(model_name, export_dir)
+            return cls(export_dir)
+
+    @staticmethod
+    def export(model_name, export_dir, min_cosine=ONNX_MIN_COSINE):
+        """Export + quantize once, then refuse the export if it drifts from PyTorch."""
+        with export_lock(export_dir):
+            OnnxEncoder._export(model_name, export_dir, min_cosine)
+
+    @staticmethod
+    def _export(model_name, export_dir, min_cosine=ONNX_MIN_COSINE):
+        # Built and verified in a temporary directory that replaces export_dir
+        # only once it passed, so a failed or interrupted export is never loaded
+        tmp_dir = os.path.abspath(export_dir) + f'.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        try:
+            OnnxEncoder._build(model_name, tmp_dir, min_cosine)
+            shutil.rmtree(export_dir, ignore_errors=True)
+            os.replace(tmp_dir, export_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    @staticmethod
+    def _build(model_name, export_dir, min_cosine):
+        import torch
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        from sentence_transformers import SentenceTransformer
+
+        st_model = SentenceTransformer(model_name, device='cpu')
+        auto_model = st_model[0].auto_model.eval()
+
+        class Transformer(torch.nn.Module):
+            # Keyword call so the export doesn't depend on forward()'s positional order
+            def __init__(self):
+                super().__init__()
+                self.model = auto_model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(names, inputs)))[0]
+
+        os.makedirs(export_dir, exist_ok=True)
+        fp32_path = os.path.join(export_dir, 'model.onnx')
+
+        sample = st_model.tokenizer(["export sample"], return_tensors='pt')
+        names = [n for n in ('input_ids', 'attention_mask', 'token_type_ids') if n in sample]
+        dynamic_axes = {n: {0: 'batch', 1: 'sequence'} for n in names}
+        dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+        export_kwargs = dict(
+            input_names=names, output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes, opset_version=14, do_constant_folding=True
+        )
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs['dynamo'] = False  # TorchScript exporter, works with dynamic_axes
+        with torch.no_grad():
+            torch.onnx.export(Transformer().eval(), tuple(sample[n] for n in names), fp32_path, **export_kwargs)
+
+        quantize_dynamic(fp32_path, os.path.join(export_dir, 'model.int8.onnx'), weight_type=QuantType.QInt8)
+        os.remove(fp32_path)
+        st_model.tokenizer.save_pretrained(export_dir)
+
+        normalize = any(type(m).__name__ == 'Normalize' for m in st_model)
+        config = {
+            'model': model_name,
+            'max_seq_length': st_model.max_seq_length,
+            'normalize': normalize,
+        }
+        with open(os.path.join(export_dir, 'encoder.json'), 'w') as f:
+            json.dump(config, f)
+
+        cosine = OnnxEncoder(export_dir).compare(st_model)
+        if cosine < min_cosine:
+            raise RuntimeError(
+                f"ONNX export of {model_name} drifts from PyTorch: min cosine {cosine:.4f} < {min_cosine}"
+            )
+        config['verified_min_cosine'] = cosine
+        with open(os.path.join(export_dir, 'encoder.json'), 'w') as f:
+            json.dump(config, f)
+        print(f"✅ Exported {model_name} to int8 ONNX (min cosine vs PyTorch {cosine:.4f}).")
+
+    def compare(self, reference_model, sentences=VERIFY_SENTENCES):
+        """Minimum cosine similarity between this encoder and reference_model on sentences."""
+        ours = self.encode(sentences, normalize_embeddings=True)
+        theirs = reference_model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+        return float(np.min(np.sum(ours * theirs, axis=1)))
+
+    def get_sentence_embedding_dimension(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, convert_to_tensor=False,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Sort by length so each batch pads to a similar length
+        order = np.argsort([-len(s) for s in sentences], kind='stable')
+        out = np.zeros((len(sentences), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(sentences), batch_size):
+            rows = order[start:start + batch_size]
+            out[rows] = self._encode_batch([sentences[i] for i in rows])
+
+        if self.config['normalize'] or normalize_embeddings:
+            out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        if single:
+            out = out[0]
+        if convert_to_tensor:
+            import torch
+            return torch.from_numpy(out)
+        return out
+
+    def _encode_batch(self, sentences):
+        tokens = self.tokenizer(
+            sentences, padding=True, truncation=True,
+            max_length=self.config['max_seq_length'], return_tensors='np'
+        )
+        feeds = {k: v.astype(np.int64) for k, v in tokens.items() if k in self._input_names}
+        hidden = self.session.run(None, feeds)[0]
+
+        # Mean pooling over non-padding tokens
+        mask = tokens['attention_mask'][..., None].astype(np.float32)
+        return (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
@@ -0,0 +1,120 @@
+import base64
+import datetime
+import json
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+
+class BadQuery(ValueError):
+    """Invalid pagination/filter query parameter (maps to HTTP 400)."""
+
+
+def serialize_doc(doc):
+    """Make a Mongo document JSON-safe (ObjectId -> str, datetimes -> ISO 8601)."""
+    out = {}
+    for key, value in doc.items():
+        if isinstance(value, ObjectId):
+            value = str(value)
+        elif isinstance(value, datetime.datetime):
+            value = value.isoformat()
+        out[key] = value
+    return out
+
+
+def encode_cursor(doc):
+    ts = doc.get('ts')
+    raw = f"{ts.isoformat() if ts else ''}|{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    try:
+        ts, _id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return (datetime.datetime.fromisoformat(ts) if ts else None), ObjectId(_id)
+    except (ValueError, InvalidId) as exc:
+        raise BadQuery(f'invalid cursor: {cursor}') from exc
+
+
+def keyset_filter(cursor):
+    """
+    Documents strictly after the cursor in (ts desc, _id desc) order.
+    Documents without ts sort after all dated ones, as Mongo orders nulls last
+    in a descending sort.
+    """
+    ts, _id = decode_cursor(cursor)
+    if ts is None:
+        return {'ts': None, '_id': {'$lt': _id}}
+    return {'$or': [
+        {'ts': {'$lt': ts}},
+        {'ts': ts, '_id': {'$lt': _id}},
+        {'ts': None}
+    ]}
+
+
+def parse_time(value, name):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError as exc:
+        raise BadQuery(f'{name} must be an ISO 8601 timestamp') from exc
+
+
+def parse_bool(value, name):
+    if value.lower() in ('1', 'true', 'yes'):
+        return True
+    if value.lower() in ('0', 'false', 'no'):
+        return False
+    raise BadQuery(f'{name} must be true or false')
+
+
+def parse_limit(value, default, maximum):
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError as exc:
+        raise BadQuery('limit must be an integer') from exc
+    if not 1 <= limit <= maximum:
+        raise BadQuery(f'limit must be between 1 and {maximum}')
+    return limit
+
+
+def parse_projection(fields):
+    """'text,label' -> {'text': 1, 'label': 1, 'ts': 1}; ts/_id are kept for the cursor."""
+    if not fields:
+        return None
+    projection = {f.strip(): 1 for f in fields.split(',') if f.strip()}
+    projection['ts'] = 1
+    return projection
+
+
+def build_query(args, filter_fields):
+    """
+    Mongo filter from request args: equality filters on filter_fields
+    (name -> parser), since/until on ts and the keyset cursor.
+    """
+    clauses = []
+    for name, parse in filter_fields.items():
+        if args.get(name) is not None:
+            clauses.append({name: parse(args[name], name)})
+
+    ts_range = {}
+    if args.get('since'):
+        ts_range['$gte'] = parse_time(args['since'], 'since')
+    if args.get('until'):
+        ts_range['$lt'] = parse_time(args['until'], 'until')
+    if ts_range:
+        clauses.append({'ts': ts_range})
+
+    if args.get('cursor'):
+        clauses.append(keyset_filter(args['cursor']))
+
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+
+def stream_ndjson(cursor):
+    """Yield one JSON line per document as the Mongo cursor produces them."""
+    for doc in cursor:
+        yield json.dumps(serialize_doc(doc), default=str) + '\n'
@@ -0,0 +1,91 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import timed
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Fold case, punctuation and whitespace: ' Is my flight on-time?? ' -> 'is my flight on time'."""
+    text = _PUNCT_RE.sub(" ", text.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+class QueryCache:
+    """
+    Bounded LRU cache with a TTL, keyed on normalised query text.
+
+    Entries belong to the current version; invalidate() bumps the version and
+    drops everything (call it when the model or example index changes).
+    """
+
+    def __init__(self, max_size=10000, ttl=3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text, extra):
+        with timed('normalize'):
+            return (normalize_text(text),) + tuple(extra)
+
+    def get(self, text, *extra):
+        """Cached value for text (plus any extra key parts), or None."""
+        key = self._key(text, extra)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires = entry
+            if expires < now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, text, value, *extra, version=None):
+        """
+        Store value; pass the version read before computing it so results from
+        an index that has since been invalidated are not cached.
+        """
+        key = self._key(text, extra)
+        with self._lock:
+            if version is not None and version != self.version:
+                return
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'version': self.version,
+                'size': len(self._data),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,246 @@
+import numpy as np
+
+
+def normalize_rows(x):
+    """L2-normalise each row so a dot product is a cosine similarity."""
+    x = np.asarray(x, dtype=np.float32)
+    if x.ndim == 1:
+        x = x[None, :]
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.maximum(norms, 1e-8)
+
+
+def quantize_rows(x):
+    """Symmetric per-row int8 quantization: x ~= values * scales[:, None]."""
+    x = np.asarray(x, dtype=np.float32)
+    scales = np.abs(x).max(axis=1, initial=0.0) / 127
+    scales[scales == 0] = 1.0
+    return np.round(x / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def to_storage(x, dtype):
+    """float32 rows -> (rows in dtype, per-row scales or None); int8 is quantized."""
+    if np.dtype(dtype) == np.int8:
+        return quantize_rows(x)
+    return np.asarray(x, dtype=dtype), None
+
+
+class IntentScorer:
+    """
+    Multi-intent scoring engine.
+
+    All example embeddings live in one contiguous, pre-normalised (N, dim)
+    float32 matrix sorted by intent, so intent i owns the rows
+    offsets[i]:offsets[i + 1]. Scoring a batch of queries is one matrix
+    product followed by a segment-max reduction.
+
+    The matrix may be stored compactly: float16, or int8 with one float32
+    scale per row (see quantize_rows). Scoring upcasts a bounded chunk of
+    rows at a time and applies the row scales to the dot products, so the
+    full-precision matrix never exists in memory.
+
+    New examples are appended to a small unsorted float32 tail (no
+    re-encoding of the corpus); the tail is converted to the matrix's dtype
+    and merged into it once it grows past compact_ratio of the main matrix.
+    Removed rows of the sorted matrix are masked out of scoring and dropped
+    at the next compaction.
+    """
+
+    compact_min = 1024
+    compact_ratio = 0.05
+    chunk_rows = 16384  # rows upcast at a time when the matrix is not float32
+
+    def __init__(self, labels, embeddings, normalized=False, scales=None, dtype=None):
+        """
+        labels: list of intent names, one per example
+        embeddings: array-like of shape (len(labels), dim)
+        normalized: rows are already unit length; together with labels already
+            grouped by intent the matrix is used as-is (e.g. a shared memmap)
+        scales: per-row scales when embeddings are int8 quantized rows
+        dtype: storage dtype to convert float rows to ("float32", "float16"
+            or "int8"); default keeps the dtype of embeddings
+        """
+        if scales is not None:
+            self.dtype = np.dtype(np.int8)
+        elif dtype is not None:
+            self.dtype = np.dtype(dtype)
+        elif getattr(embeddings, 'dtype', None) == np.float16:
+            self.dtype = np.dtype(np.float16)
+        else:
+            self.dtype = np.dtype(np.float32)
+        if not len(labels):
+            embeddings, scales = np.zeros((0, 0), dtype=self.dtype), None
+        elif scales is None:
+            if not normalized:
+                embeddings = normalize_rows(embeddings)
+            if embeddings.dtype != self.dtype:
+                embeddings, scales = to_storage(embeddings, self.dtype)
+
+        # Keep intents in first-seen order (same order as the Mongo documents)
+        self.intents = list(dict.fromkeys(labels))
+        intent_ids = {intent: i for i, intent in enumerate(self.intents)}
+        self.segment_ids = np.array([intent_ids[l] for l in labels], dtype=np.int32)
+
+        if np.all(self.segment_ids[1:] >= self.segment_ids[:-1]):
+            self.matrix, self.scales = embeddings, scales
+        else:
+            order = np.argsort(self.segment_ids, kind="stable")
+            self.matrix = np.ascontiguousarray(embeddings[order])
+            self.scales = scales[order] if scales is not None else None
+            self.segment_ids = self.segment_ids[order]
+        counts = np.bincount(self.segment_ids, minlength=len(self.intents))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        self._intent_ids = intent_ids
+        self._tail = np.zeros((0, self.matrix.shape[1]), dtype=np.float32)
+        self._tail_ids = np.zeros(0, dtype=np.int32)
+        self._tail_len = 0
+        self._dead = np.zeros(0, dtype=np.int64)  # removed rows of the sorted matrix
+
+    def __len__(self):
+        return self.matrix.shape[0] - len(self._dead) + self._tail_len
+
+    def add(self, label, embedding):
+        """Append one example embedding to an intent (creating the intent if new)."""
+        vec = normalize_rows(embedding)[0]
+        if label not in self._intent_ids:
+            self._intent_ids[label] = len(self.intents)
+            self.intents.append(label)
+        if self.matrix.shape[1] == 0:
+            self.matrix, self.scales = to_storage(np.zeros((0, vec.shape[0]), dtype=np.float32), self.dtype)
+            self._tail = np.zeros((0, vec.shape[0]), dtype=np.float32)
+
+        if self._tail_len == self._tail.shape[0]:
+            capacity = max(16, 2 * self._tail.shape[0])
+            tail = np.zeros((capacity, vec.shape[0]), dtype=np.float32)
+            tail[:self._tail_len] = self._tail[:self._tail_len]
+            tail_ids = np.zeros(capacity, dtype=np.int32)
+            tail_ids[:self._tail_len] = self._tail_ids[:self._tail_len]
+            self._tail, self._tail_ids = tail, tail_ids
+
+        self._tail[self._tail_len] = vec
+        self._tail_ids[self._tail_len] = self._intent_ids[label]
+        self._tail_len += 1
+
+        if self._tail_len >= max(self.compact_min, self.compact_ratio * self.matrix.shape[0]):
+            self.compact()
+
+    def remove(self, label, embedding):
+        """
+        Remove the example of `label` closest to `embedding` (its own
+        embedding, re-encoded). Returns False if the intent has no examples.
+        """
+        i = self._intent_ids.get(label)
+        if i is None:
+            return False
+        vec = normalize_rows(embedding)[0]
+
+        tail_rows = np.flatnonzero(self._tail_ids[:self._tail_len] == i)
+        best_tail = tail_rows[np.argmax(self._tail[tail_rows] @ vec)] if len(tail_rows) else None
+        main_rows = np.arange(self.offsets[i], self.offsets[i + 1]) if i + 1 < len(self.offsets) else np.zeros(0, int)
+        main_rows = np.setdiff1d(main_rows, self._dead)
+        best_main = None
+        if len(main_rows):
+            sims = np.asarray(self.matrix[main_rows], dtype=np.float32) @ vec
+            if self.scales is not None:
+                sims *= self.scales[main_rows]
+            best_main = main_rows[np.argmax(sims)]
+            if best_tail is not None and self._tail[best_tail] @ vec > sims.max():
+                best_main = None
+        if best_main is None and best_tail is None:
+            return False
+
+        if best_main is not None:
+            self._dead = np.union1d(self._dead, [best_main])
+        else:
+            # Move the last tail row into the freed slot
+            last = self._tail_len - 1
+            self._tail[best_tail] = self._tail[last]
+            self._tail_ids[best_tail] = self._tail_ids[last]
+            self._tail_len = last
+
+        if len(self._dead) >= max(self.compact_min, self.compact_ratio * self.matrix.shape[0]):
+            self.compact()
+        return True
+
+    def compact(self):
+        """Merge the appended tail into the sorted main matrix and drop removed rows."""
+        if not self._tail_len and not len(self._dead):
+            return
+        keep = np.setdiff1d(np.arange(self.matrix.shape[0]), self._dead)
+        ids = np.concatenate([self.segment_ids[keep], self._tail_ids[:self._tail_len]])
+        tail, tail_scales = to_storage(self._tail[:self._tail_len], self.dtype)
+        rows = np.concatenate([self.matrix[keep], tail])
+        order = np.argsort(ids, kind="stable")
+        self.matrix = np.ascontiguousarray(rows[order])
+        if self.scales is not None:
+            self.scales = np.concatenate([self.scales[keep], tail_scales])[order]
+        self.segment_ids = ids[order]
+        counts = np.bincount(self.segment_ids, minlength=len(self.intents))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._tail = np.zeros((0, self.matrix.shape[1]), dtype=np.float32)
+        self._tail_ids = np.zeros(0, dtype=np.int32)
+        self._tail_len = 0
+        self._dead = np.zeros(0, dtype=np.int64)
+
+    def score(self, query_embeddings):
+        """
+        query_embeddings: (dim,) or (B, dim)
+        returns: (B, n_intents) array with the max cosine similarity per intent
+        """
+        queries = normalize_rows(query_embeddings)
+        scores = np.full((queries.shape[0], len(self.intents)), -np.inf, dtype=np.float32)
+
+        # Intents that have rows in the sorted matrix (offsets may end in empty
+        # segments for intents that so far only exist in the tail)
+        n_main = int(np.searchsorted(self.offsets, self.matrix.shape[0], side="left"))
+        if n_main:
+            sims = self._similarities(queries)
+            sims[:, self._dead] = -np.inf
+            scores[:, :n_main] = np.maximum.reduceat(sims, self.offsets[:n_main], axis=1)
+            # reduceat yields the next segment's first row for an empty segment
+            # (an intent whose rows were all compacted away)
+            scores[:, :n_main][:, self.offsets[1:n_main + 1] == self.offsets[:n_main]] = -np.inf
+
+        if self._tail_len:
+            tail_sims = queries @ self._tail[:self._tail_len].T
+            rows = np.arange(queries.shape[0])[:, None]
+            np.maximum.at(scores, (rows, self._tail_ids[None, :self._tail_len]), tail_sims)
+        return scores
+
+    def _similarities(self, queries):
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        # Compact (float16 / int8, possibly a memmap) storage: upcast a bounded
+        # chunk at a time; int8 dot products are rescaled per row afterwards
+        sims = np.empty((queries.shape[0], self.matrix.shape[0]), dtype=np.float32)
+        for start in range(0, self.matrix.shape[0], self.chunk_rows):
+            chunk = np.asarray(self.matrix[start:start + self.chunk_rows], dtype=np.float32)
+            block = sims[:, start:start + len(chunk)]
+            np.matmul(queries, chunk.T, out=block)
+            if self.scales is not None:
+                block *= self.scales[start:start + len(chunk)]
+        return sims
+
+    def nbytes(self):
+        """Memory held by the example vectors (matrix, row scales and tail)."""
+        scales = self.scales.nbytes if self.scales is not None else 0
+        return self.matrix.nbytes + scales + self._tail.nbytes
+
+    def top_intents(self, query_embeddings, similarity_threshold=0.6, top_k=3):
+        """
+        returns: one list of (intent, score) per query, best first, keeping at
+        most top_k intents whose score clears similarity_threshold
+        """
+        return rank_scores(self.intents, self.score(query_embeddings), similarity_threshold, top_k)
+
+
+def rank_scores(intents, scores, similarity_threshold=0.6, top_k=3):
+    """Turn a (B, n_intents) score matrix into per-query [(intent, score), ...] lists."""
+    results = []
+    for row in scores:
+        ranked = np.argsort(-row, kind="stable")[:top_k]
+        results.append([
+            (intents[i], float(row[i])) for i in ranked if row[i] >= similarity_threshold
+        ])
+    return results
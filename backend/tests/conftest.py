@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are flat scripts imported by name (python app.py, etc.)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
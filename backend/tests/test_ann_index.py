@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from ann_index import IVFIntentScorer, PrototypeIntentScorer, create_intent_scorer
+from scoring import IntentScorer
+
+
+def corpus(n=400, dim=16, n_intents=5, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_intents, dim))
+    labels = [f"intent{i % n_intents}" for i in range(n)]
+    embeddings = centers[np.arange(n) % n_intents] + 0.5 * rng.normal(size=(n, dim))
+    return labels, embeddings.astype(np.float32), rng.normal(size=(20, dim)).astype(np.float32)
+
+
+def test_ivf_probing_every_cell_is_exact():
+    labels, embeddings, queries = corpus()
+    ivf = IVFIntentScorer(labels, embeddings, nlist=8, nprobe=8)
+    exact = IntentScorer(labels, embeddings)
+    np.testing.assert_allclose(ivf.score(queries), exact.score(queries), atol=1e-5)
+
+
+def test_ivf_add_and_remove_match_exact():
+    labels, embeddings, queries = corpus()
+    ivf = IVFIntentScorer(labels[:300], embeddings[:300], nlist=6, nprobe=6)
+    exact = IntentScorer(labels[:300], embeddings[:300])
+    for scorer in (ivf, exact):
+        for label, emb in zip(labels[300:], embeddings[300:]):
+            scorer.add(label, emb)
+        for label, emb in zip(labels[:50], embeddings[:50]):
+            assert scorer.remove(label, emb)
+        assert not scorer.remove('unknown', embeddings[0])
+    assert len(ivf) == len(exact) == 350
+    np.testing.assert_allclose(ivf.score(queries), exact.score(queries), atol=1e-5)
+
+
+def test_ivf_starts_empty():
+    labels, embeddings, queries = corpus(n=10)
+    ivf = IVFIntentScorer([], np.zeros((0, 16)))
+    assert ivf.score(queries).shape == (20, 0)
+    ivf.add(labels[0], embeddings[0])
+    assert ivf.top_intents(embeddings[0], 0.99)[0][0][0] == labels[0]
+
+
+def test_create_intent_scorer_modes():
+    labels, embeddings, _ = corpus(n=50)
+    assert isinstance(create_intent_scorer(labels, embeddings, mode='exact'), IntentScorer)
+    assert isinstance(create_intent_scorer(labels, embeddings, mode='ivf'), IVFIntentScorer)
+    assert isinstance(create_intent_scorer(labels, embeddings, mode='prototype'), PrototypeIntentScorer)
+    with pytest.raises(ValueError):
+        create_intent_scorer(labels, embeddings, mode='hnsw')
+
+
+@pytest.mark.parametrize('method', ['medoid', 'centroid'])
+def test_prototypes_are_exact_for_small_intents(method):
+    labels, embeddings, queries = corpus(n=40)
+    scorer = PrototypeIntentScorer(labels, embeddings, k=8, method=method)
+    np.testing.assert_allclose(scorer.score(queries), IntentScorer(labels, embeddings).score(queries), atol=1e-5)
+
+
+def test_prototypes_stay_bounded():
+    labels, embeddings, queries = corpus()
+    scorer = PrototypeIntentScorer(labels[:300], embeddings[:300], k=4, novelty=0.9)
+    for label, emb in zip(labels[300:], embeddings[300:]):
+        scorer.add(label, emb)
+    new = np.random.default_rng(2).normal(size=16)
+    scorer.add('new intent', new)
+    assert scorer.prototypes.shape[:2] == (6, 4)
+    assert len(scorer) == 401 and scorer.counts.sum() == 401
+    exact = IntentScorer(labels + ['new intent'], np.vstack([embeddings, new]))
+    near = embeddings[::10] + 0.3 * np.random.default_rng(1).normal(size=embeddings[::10].shape)
+    top1 = np.argmax(scorer.score(near), axis=1)
+    assert np.mean(top1 == np.argmax(exact.score(near), axis=1)) >= 0.8
+
+    for label, emb in zip(labels[:100], embeddings[:100]):
+        assert scorer.remove(label, emb)
+    assert len(scorer) == 301 and scorer.counts.sum() == 301
+    assert scorer.remove('new intent', new)
+    assert not scorer.remove('new intent', new)
+    assert np.all(scorer.score(queries)[:, 5] == -np.inf)
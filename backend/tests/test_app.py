@@ -0,0 +1,119 @@
+import importlib
+import sys
+
+import pytest
+
+from model import IntentModel
+
+TEXTS = [f"{verb} my {thing} {n}" for n in range(8)
+         for verb, thing in (('cancel', 'flight'), ('change', 'seat'), ('check', 'bag'), ('find', 'pet'))]
+LABELS = [label for _ in range(8) for label in ('Cancel Trip', 'Change Flight', 'Check In Luggage Faq', 'Pet Travel')]
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, request):
+    mongomock = pytest.importorskip('mongomock')
+    pytest.importorskip('flask')
+    import pymongo
+
+    shared = mongomock.MongoClient()
+    monkeypatch.setattr(pymongo, 'MongoClient', lambda *args, **kwargs: shared)
+    monkeypatch.chdir(tmp_path)  # model.joblib is written here
+    for var in ('TRAIN_MODE', 'MODEL_RUNTIME', 'CASCADE'):
+        monkeypatch.delenv(var, raising=False)
+    for var, value in getattr(request, 'param', {}).items():
+        monkeypatch.setenv(var, value)
+    model = IntentModel()
+    model.train(TEXTS, LABELS)
+    model.save()
+    sys.modules.pop('app', None)
+    module = importlib.import_module('app')
+    yield module
+    module.DATA_WRITER.close()
+    module.FEEDBACK_WRITER.close()
+    sys.modules.pop('app', None)
+
+
+def test_batch_matches_single_classify(app):
+    client = app.app.test_client()
+    texts = ['cancel my flight please', 'check my bag', 'cancel my flight please']
+    response = client.post('/api/classify/batch', json={'texts': texts})
+    assert response.status_code == 200 and response.json['count'] == 3
+    results = response.json['results']
+    assert [r['text'] for r in results] == texts
+    for r in results:
+        single = client.post('/api/classify', json={'text': r['text']}).json
+        assert (single['intent'], single['confidence']) == (r['intent'], r['confidence'])
+    assert results[0]['intent'] == 'Cancel Trip' and results[1]['intent'] == 'Check In Luggage Faq'
+
+    app.DATA_WRITER.flush()
+    assert app.DATA_COLL.count_documents({'synthetic': False}) == 6
+
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'asapp_requests_total{route="/api/classify/batch",status="200"}' in metrics
+    assert 'asapp_stage_seconds_count{stage="vectorize"}' in metrics
+
+
+def test_batch_rejects_invalid_input(app, monkeypatch):
+    client = app.app.test_client()
+    assert client.post('/api/classify/batch', json={'texts': []}).status_code == 400
+    response = client.post('/api/classify/batch', json={'texts': ['ok', '  ', 3]})
+    assert response.status_code == 400 and response.json['invalid_indices'] == [1, 2]
+    monkeypatch.setattr(app, 'MAX_BATCH_SIZE', 2)
+    assert client.post('/api/classify/batch', json={'texts': ['a', 'b', 'c']}).status_code == 413
+
+
+def test_training_swaps_in_the_new_model(app):
+    client = app.app.test_client()
+    before = client.post('/api/classify', json={'text': 'lost my luggage'}).json
+    assert before['intent'] != 'Missing Bag'
+
+    app.DATA_COLL.insert_many([{'text': t, 'label': l, 'synthetic': True} for t, l in zip(TEXTS, LABELS)])
+    for n in range(8):
+        app.DATA_WRITER.put({'text': f"lost my luggage {n}", 'label': 'Missing Bag', 'synthetic': False})
+    response = client.post('/api/train', json={'wait': True})
+    assert response.status_code == 200 and response.json['status'] == 'trained'
+
+    # The cached prediction of the old model is not served any more
+    assert client.post('/api/classify', json={'text': 'lost my luggage'}).json['intent'] == 'Missing Bag'
+    assert app.MODEL_VERSION.value == 2
+    job = client.get(f"/api/train/{response.json['job_id']}").json
+    assert job['status'] == 'done'
+    assert client.get('/api/train/unknown').status_code == 404
+
+
+@pytest.mark.parametrize('app', [{'MODEL_RUNTIME': 'compiled'}], indirect=True)
+def test_failed_compiled_export_keeps_serving(app, monkeypatch):
+    import model
+
+    def export_pipeline(*args, **kwargs):
+        raise ValueError('unsupported vectorizer')
+
+    monkeypatch.setattr(model, 'export_pipeline', export_pipeline)
+    client = app.app.test_client()
+    before = client.post('/api/classify', json={'text': 'cancel my flight'}).json
+    app.DATA_COLL.insert_many([{'text': t, 'label': l, 'synthetic': True} for t, l in zip(TEXTS, LABELS)])
+
+    response = client.post('/api/train', json={'wait': True})
+    assert response.status_code == 400 and 'compiled export' in response.json['error']
+    assert client.get(f"/api/train/{response.json['job_id']}").json['status'] == 'failed'
+    after = client.post('/api/classify', json={'text': 'cancel my flight now'})  # not cached
+    assert after.status_code == 200 and after.json['intent'] == before['intent']
+    assert app.MODEL_VERSION.value == 1
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 1000])
+def test_synthetic_evaluation_in_chunks(app, chunk_size):
+    client = app.app.test_client()
+    docs = [{'text': t, 'label': l, 'synthetic': True} for t, l in zip(TEXTS[:8], LABELS[:8])]
+    docs.append({'text': 'cancel my flight 0', 'label': 'Pet Travel', 'synthetic': True})  # mislabelled
+    docs.append({'text': 'not synthetic', 'label': 'Pet Travel', 'synthetic': False})
+    app.DATA_COLL.insert_many(docs)
+
+    body = client.get(f'/api/synthetic/correct?chunk_size={chunk_size}').json
+    assert body['total'] == 9 and len(body['correct_synthetic_data']) == 8
+    assert body['accuracy'] == 8 / 9
+    assert body['per_intent_accuracy']['Pet Travel'] == 2 / 3
+    assert body['confusion'] == {'Pet Travel': {'Cancel Trip': 1}}
+    assert all(isinstance(d['_id'], str) and d['pred'] == d['label'] for d in body['correct_synthetic_data'])
+    assert client.get('/api/synthetic/correct?chunk_size=0').status_code == 400
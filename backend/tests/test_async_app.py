@@ -0,0 +1,155 @@
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+async_app = pytest.importorskip('async_app')
+from fastapi.testclient import TestClient
+
+from model import IncrementalIntentModel, IntentModel
+
+TEXTS = [f"{verb} my {thing} {n}" for n in range(8)
+         for verb, thing in (('cancel', 'flight'), ('change', 'seat'), ('check', 'bag'), ('find', 'pet'))]
+LABELS = [label for _ in range(8) for label in ('Cancel Trip', 'Change Flight', 'Check In Luggage Faq', 'Pet Travel')]
+
+
+def client_for(tmp_path, monkeypatch):
+    shared = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(async_app, 'AsyncIOMotorClient', lambda *args, **kwargs: shared)
+    monkeypatch.setattr(async_app, 'INFERENCE_WORKERS', 1)
+    monkeypatch.chdir(tmp_path)  # model.joblib is written here
+    model = IntentModel()
+    model.train(TEXTS, LABELS)
+    model.save()
+    async_app.PREDICTION_CACHE.invalidate()
+    return TestClient(async_app.app)
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    with client_for(tmp_path, monkeypatch) as client:
+        yield client
+
+
+def test_classify_and_batch(client):
+    texts = ['cancel my flight please', 'check my bag']
+    response = client.post('/api/classify/batch', json={'texts': texts})
+    assert response.status_code == 200 and response.json()['count'] == 2
+    for result in response.json()['results']:
+        single = client.post('/api/classify', json={'text': result['text']}).json()
+        assert (single['intent'], single['confidence']) == (result['intent'], result['confidence'])
+    assert response.json()['results'][0]['intent'] == 'Cancel Trip'
+
+    assert client.post('/api/classify', json={'text': '  '}).status_code == 400
+    assert client.post('/api/classify/batch', json={'texts': ['ok', 3]}).json()['invalid_indices'] == [1]
+
+
+def test_batch_over_the_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(async_app, 'MAX_BATCH_SIZE', 2)
+    assert client.post('/api/classify/batch', json={'texts': ['a', 'b', 'c']}).status_code == 413
+
+
+def test_feedback_logs_corrections(client):
+    assert client.post('/api/feedback', json={'text': 'hi'}).status_code == 400
+    body = {'text': 'bring my cat', 'pred': 'Cancel Trip', 'correct': False, 'true_label': 'Pet Travel'}
+    assert client.post('/api/feedback', json=body).json() == {'status': 'ok'}
+    confirmed = {'text': 'cancel my flight', 'pred': 'Cancel Trip', 'correct': True}
+    assert client.post('/api/feedback', json=confirmed).json() == {'status': 'ok'}
+    # Only the correction becomes training data
+    rows = client.get('/api/classified').json()['classified_data']
+    assert [(r['text'], r['label']) for r in rows] == [('bring my cat', 'Pet Travel')]
+
+
+def test_train_and_job_status(client):
+    client.post('/api/classify/batch', json={'texts': TEXTS})
+    response = client.post('/api/train', json={'wait': True})
+    assert response.status_code == 200 and response.json()['status'] == 'trained'
+    job = client.get(f"/api/train/{response.json()['job_id']}").json()
+    assert job['status'] == 'done' and 'accuracy' in job
+    assert client.get('/api/train/unknown').status_code == 404
+    assert client.get('/api/metrics').json()['metrics'][0]['type'] == 'train'
+
+
+def test_background_train_job_can_be_polled(client):
+    client.post('/api/classify/batch', json={'texts': TEXTS})
+    response = client.post('/api/train', json={})
+    assert response.status_code == 202
+    job_id = response.json()['job_id']
+    deadline = time.monotonic() + 30
+    while (job := client.get(f'/api/train/{job_id}').json())['status'] not in ('done', 'failed'):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    assert job['status'] == 'done'
+    assert client.post('/api/classify', json={'text': 'find my pet'}).json()['intent'] == 'Pet Travel'
+
+
+def test_failed_compiled_export_keeps_serving(tmp_path, monkeypatch):
+    import model
+    from compiled_model import CompiledIntentModel
+
+    def export_pipeline(*args, **kwargs):
+        raise ValueError('unsupported vectorizer')
+
+    monkeypatch.setattr(async_app, 'MODEL_RUNTIME', 'compiled')
+    monkeypatch.setattr(async_app, 'MODEL_CLASS', CompiledIntentModel)
+    with client_for(tmp_path, monkeypatch) as client:
+        monkeypatch.setattr(model, 'export_pipeline', export_pipeline)
+        client.post('/api/classify/batch', json={'texts': TEXTS})
+        response = client.post('/api/train', json={'wait': True})
+        assert response.status_code == 400 and 'compiled export' in response.json()['error']
+        after = client.post('/api/classify', json={'text': 'cancel my flight now'})
+        assert after.status_code == 200 and after.json()['intent'] == 'Cancel Trip'
+
+
+def test_classified_pages_and_ndjson(client):
+    client.post('/api/classify/batch', json={'texts': TEXTS[:5]})
+    first = client.get('/api/classified', params={'limit': 3}).json()
+    assert len(first['classified_data']) == 3 and first['next_cursor']
+    rest = client.get('/api/classified', params={'limit': 3, 'cursor': first['next_cursor']}).json()
+    assert len(rest['classified_data']) == 2 and rest['next_cursor'] is None
+    seen = {r['_id'] for r in first['classified_data'] + rest['classified_data']}
+    assert len(seen) == 5
+
+    response = client.get('/api/classified', params={'format': 'ndjson', 'fields': 'text'})
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line['text'] for line in lines) == sorted(TEXTS[:5])
+    assert client.get('/api/classified', params={'limit': 'x'}).status_code == 400
+
+
+def test_metrics(client):
+    client.post('/api/classify', json={'text': 'cancel my flight'})
+    body = client.get('/metrics').text
+    assert 'asapp_requests_total{route="/api/classify",status="200"}' in body
+    assert 'asapp_classify_batch_size_bucket' in body
+    assert 'prediction_cache' in client.get('/api/metrics').json()
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    async_app.state.loop = loop
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+    loop.close()
+
+
+def test_sync_collection_streams_in_batches(loop):
+    coll = mongomock_motor.AsyncMongoMockClient()['test']['data']
+    docs = [{'text': f'{word} my flight {i}', 'label': label}
+            for i in range(60) for word, label in (('cancel', 'Cancel Trip'), ('change', 'Change Flight'))]
+    async_app.run_on_loop(coll.insert_many(docs))
+
+    sync = async_app._SyncCollection(coll)
+    cursor = sync.find({}, {'text': 1, '_id': 0}).sort('_id', 1).batch_size(7)
+    assert [d['text'] for d in cursor] == [d['text'] for d in docs]
+
+    model = IncrementalIntentModel('unused.joblib', n_features=2**10)
+    _, _, n_docs = model.train_from_collection(sync, batch_size=7)
+    assert n_docs == len(docs)
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from batch_encoder import BatchEncoder
+from metrics import REGISTRY
+
+
+class SlowModel:
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        self.release.wait(5)
+        if 'boom' in texts:
+            raise ValueError('boom')
+        return np.array([[len(t), 1.0] for t in texts])
+
+
+def wait_for_calls(model, n):
+    while len(model.calls) < n:
+        time.sleep(0.001)
+
+
+def test_lone_text_is_encoded_without_waiting():
+    model = SlowModel()
+    model.release.set()
+    encoder = BatchEncoder(model, max_wait_ms=10_000, name='test-lone')
+    start = time.perf_counter()
+    assert list(encoder.encode('a', timeout=5)) == [1, 1.0]
+    assert time.perf_counter() - start < 1
+    encoder.close()
+
+
+def test_texts_queued_behind_an_encode_share_one_batch():
+    model = SlowModel()
+    encoder = BatchEncoder(model, max_batch_size=3, max_wait_ms=200, name='test-batch')
+    first = encoder.submit('a')
+    wait_for_calls(model, 1)  # the worker is busy encoding 'a' alone
+    futures = [first] + [encoder.submit(text) for text in ('bb', 'ccc', 'dddd', 'eeeee')]
+    model.release.set()
+    assert [list(f.result(5)) for f in futures] == [[1, 1.0], [2, 1.0], [3, 1.0], [4, 1.0], [5, 1.0]]
+    encoder.close()
+    assert model.calls == [['a'], ['bb', 'ccc', 'dddd'], ['eeeee']]
+    assert encoder.stats()['batch_size']['count'] == 3
+    text = REGISTRY.render()
+    assert 'asapp_encoder_batch_size_count{encoder="test-batch"} 3' in text
+    assert 'asapp_encoder_queue_wait_seconds_count{encoder="test-batch"} 5' in text
+
+
+def test_cancelled_future_does_not_kill_the_worker():
+    model = SlowModel()
+    encoder = BatchEncoder(model, max_batch_size=4, max_wait_ms=50)
+    busy = encoder.submit('busy')
+    wait_for_calls(model, 1)
+    cancelled = encoder.submit('gone')
+    kept = encoder.submit('kept')
+    assert cancelled.cancel()  # e.g. the caller timed out while queued
+    model.release.set()
+    assert list(kept.result(5)) == [4, 1.0] and list(busy.result(5)) == [4, 1.0]
+    assert model.calls == [['busy'], ['kept']]
+    assert list(encoder.encode('later', timeout=5)) == [5, 1.0]
+    encoder.close()
+
+
+def test_failed_batch_reaches_callers_and_worker_continues():
+    model = SlowModel()
+    model.release.set()
+    encoder = BatchEncoder(model, max_batch_size=4, max_wait_ms=1)
+    with pytest.raises(ValueError):
+        encoder.encode('boom', timeout=5)
+    assert list(encoder.encode('ok', timeout=5)) == [2, 1.0]
+    encoder.close()
@@ -0,0 +1,35 @@
+import numpy as np
+
+from bench_suite import HashingEncoder, compare, make_corpus, summarize
+
+
+def test_corpus_is_deterministic():
+    texts, labels = make_corpus(50, seed=1)
+    assert (texts, labels) == make_corpus(50, seed=1)
+    assert texts != make_corpus(50, seed=2)[0]
+    assert len(set(labels)) > 1
+
+
+def test_hashing_encoder():
+    encoder = HashingEncoder(dim=64)
+    batch = encoder.encode(['Cancel my flight', 'cancel my flight', 'lost bag'])
+    assert batch.shape == (3, 64) and encoder.encode('lost bag').shape == (64,)
+    np.testing.assert_allclose(np.linalg.norm(batch, axis=1), 1.0, atol=1e-6)
+    np.testing.assert_array_equal(batch[0], batch[1])
+
+
+def run(p95, qps):
+    return {'results': {'1000': {'components': {'flask /api/classify': {'p95_ms': p95, 'qps': qps}}}}}
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    assert compare(run(10.5, 95), run(10.0, 100), threshold=0.1) == 0
+    assert compare(run(12.0, 100), run(10.0, 100), threshold=0.1) == 1  # p95 up 20%
+    assert compare(run(10.0, 80), run(10.0, 100), threshold=0.1) == 1  # qps down 20%
+    assert compare(run(12.0, 100), {'results': {}}, threshold=0.1) == 0  # size not in the baseline
+
+
+def test_summarize():
+    stats = summarize([1.0, 2.0, 3.0, 4.0], items_per_call=2)
+    assert stats['calls'] == 4 and stats['p50_ms'] == 2.5
+    assert stats['qps'] == 8 / 0.01
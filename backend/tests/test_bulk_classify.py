@@ -0,0 +1,135 @@
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+import pytest
+
+import bulk_classify
+from model import IntentModel
+
+TEXTS = [f"{verb} my {thing} {n}" for n in range(8)
+         for verb, thing in (('cancel', 'flight'), ('change', 'seat'), ('check', 'bag'), ('find', 'pet'))]
+LABELS = [label for _ in range(8) for label in ('Cancel Trip', 'Change Flight', 'Check In Luggage Faq', 'Pet Travel')]
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    monkeypatch.delenv('TRAIN_MODE', raising=False)
+    monkeypatch.delenv('MODEL_RUNTIME', raising=False)
+    model = IntentModel(str(tmp_path / 'model.joblib'))
+    model.train(TEXTS, LABELS)
+    model.save()
+    return model.model_path
+
+
+def make_args(input, output, model_path, **kwargs):
+    args = dict(input=str(input), output=str(output), engine='intent_model', text_field='text', query='{}',
+                workers=0, chunk_size=5, batch_size=2, model_path=model_path, similarity_threshold=0.6,
+                top_k=3, resume=False, overwrite=False)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def write_input(path, n=23):
+    if str(path).endswith('.csv'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, ['id', 'text'])
+            writer.writeheader()
+            writer.writerows({'id': i, 'text': f"please {TEXTS[i % len(TEXTS)]}, thanks"} for i in range(n))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            for i in range(n):
+                f.write(json.dumps({'id': i, 'text': TEXTS[i % len(TEXTS)]}) + '\n')
+                if i == 10:
+                    f.write('\n')  # blank lines are skipped
+
+
+@pytest.mark.parametrize('ext', ['jsonl', 'csv'])
+def test_resume_after_crash_matches_uninterrupted_run(tmp_path, model_path, monkeypatch, ext):
+    source = tmp_path / f'input.{ext}'
+    write_input(source)
+    bulk_classify.run(make_args(source, tmp_path / f'full.{ext}', model_path))
+
+    output = tmp_path / f'out.{ext}'
+    classify = bulk_classify.classify_batch
+    calls = []
+
+    def crash_on_third_chunk(texts):
+        calls.append(texts)
+        if len(calls) == 7:  # 3 batches per chunk: dies inside the third chunk
+            raise KeyboardInterrupt
+        return classify(texts)
+
+    monkeypatch.setattr(bulk_classify, 'classify_batch', crash_on_third_chunk)
+    with pytest.raises(KeyboardInterrupt):
+        bulk_classify.run(make_args(source, output, model_path))
+    monkeypatch.setattr(bulk_classify, 'classify_batch', classify)
+    checkpoint = json.loads((tmp_path / f'out.{ext}.checkpoint').read_text())
+    assert checkpoint['records'] == 5 and not checkpoint['complete']
+
+    with pytest.raises(SystemExit):
+        bulk_classify.run(make_args(source, output, model_path))
+    with open(output, 'a', encoding='utf-8') as f:
+        f.write('{"partial": ')  # written after the checkpoint, dropped on resume
+    bulk_classify.run(make_args(source, output, model_path, resume=True))
+    assert output.read_text() == (tmp_path / f'full.{ext}').read_text()
+    assert json.loads((tmp_path / f'out.{ext}.checkpoint').read_text())['complete']
+
+
+def test_output_keeps_input_order_and_records(tmp_path, model_path):
+    source = tmp_path / 'input.jsonl'
+    write_input(source)
+    bulk_classify.run(make_args(source, tmp_path / 'out.jsonl', model_path))
+    rows = [json.loads(line) for line in (tmp_path / 'out.jsonl').read_text().splitlines()]
+    assert [r['id'] for r in rows] == list(range(23))
+    assert all(r['intent'] in LABELS and 0 <= r['confidence'] <= 1 for r in rows)
+
+
+def test_checkpoint_of_another_run_is_rejected(tmp_path, model_path):
+    source = tmp_path / 'input.jsonl'
+    write_input(source)
+    bulk_classify.run(make_args(source, tmp_path / 'out.jsonl', model_path))
+    with pytest.raises(SystemExit):
+        bulk_classify.run(make_args(source, tmp_path / 'out.jsonl', model_path, engine='sbert', resume=True))
+
+
+def test_resume_without_checkpoint_keeps_the_output(tmp_path, model_path):
+    source = tmp_path / 'input.jsonl'
+    write_input(source)
+    output = tmp_path / 'out.jsonl'
+    output.write_text('{"id": "from another tool"}\n')
+    with pytest.raises(SystemExit):
+        bulk_classify.run(make_args(source, output, model_path, resume=True))
+    assert output.read_text() == '{"id": "from another tool"}\n'
+
+
+class KeywordEncoder:
+    """One dimension per word of VOCAB, so examples and queries sharing words are similar."""
+    VOCAB = ['cancel', 'flight', 'bag', 'lost', 'pet']
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.array([[float(w in t.split()) for w in self.VOCAB] + [0.1] for t in texts])
+
+
+def test_sbert_engine_maps_the_store_without_model1(tmp_path, monkeypatch):
+    encoder = KeywordEncoder()
+    examples = (['cancel my flight', 'lost my bag', 'my pet'], ['Cancel Trip', 'Missing Bag', 'Pet Travel'])
+    monkeypatch.setattr(bulk_classify, 'load_intent_examples', lambda: examples)
+    monkeypatch.setattr(bulk_classify, 'load_sbert_encoder', lambda: encoder)
+    monkeypatch.setenv('EMBEDDING_STORE_DIR', str(tmp_path / 'store'))
+    monkeypatch.delitem(sys.modules, 'model1', raising=False)  # imported by other tests
+    source = tmp_path / 'input.jsonl'
+    source.write_text('\n'.join(json.dumps({'text': t}) for t in ['cancel flight', 'bag lost', 'hello']) + '\n')
+
+    bulk_classify.run(make_args(source, tmp_path / 'out.jsonl', None, engine='sbert', similarity_threshold=0.5))
+    rows = [json.loads(line) for line in (tmp_path / 'out.jsonl').read_text().splitlines()]
+    assert [r['intents'] for r in rows] == [['Cancel Trip'], ['Missing Bag'], ['Irrelevant']]
+    # Examples encoded once, before the workers start; workers only encode queries
+    assert encoder.calls == [examples[0], ['cancel flight', 'bag lost'], ['hello']]
+    assert 'model1' not in sys.modules
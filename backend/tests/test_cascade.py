@@ -0,0 +1,53 @@
+import numpy as np
+
+from cascade import CascadeClassifier, calibrate_threshold
+
+
+class FixedModel:
+    """predict_proba from a text -> probabilities table."""
+
+    def __init__(self, classes, table):
+        self.classes = np.array(classes)
+        self.table = table
+
+    def predict_proba(self, texts):
+        return self.classes, np.array([self.table[t] for t in texts])
+
+
+MODEL = FixedModel(['Cancel Trip', 'Missing Bag', 'Pet Travel'], {
+    'cancel': [0.9, 0.05, 0.05],
+    'unsure': [0.3, 0.3, 0.4],
+    'two intents': [0.5, 0.4, 0.1],
+    'nothing': [0.34, 0.33, 0.33],
+})
+
+
+def test_escalates_low_confidence_and_multi_intent_texts():
+    calls = []
+
+    def semantic(texts):
+        calls.append(texts)
+        return [[('Cancel Trip', 0.8), ('Missing Bag', 0.7)] if t == 'two intents' else
+                [('Pet Travel', 0.65)] if t == 'unsure' else [] for t in texts]
+
+    cascade = CascadeClassifier(MODEL, semantic, threshold=0.6, multi_intent_p=0.25)
+    results = cascade.predict(['cancel', 'unsure', 'two intents', 'nothing'])
+    assert calls == [['unsure', 'two intents', 'nothing']]  # one batched SBERT call
+    assert results[0] == {'intent': 'Cancel Trip', 'confidence': 0.9, 'intents': ['Cancel Trip'], 'tier': 'tfidf'}
+    assert results[1]['intent'] == 'Pet Travel' and results[1]['tier'] == 'sbert'
+    assert results[2]['intents'] == ['Cancel Trip', 'Missing Bag']
+    assert results[3] == {'intent': 'Irrelevant', 'confidence': 0.0, 'intents': ['Irrelevant'], 'tier': 'sbert'}
+    assert cascade.stats()['requests'] == {'tfidf': 1, 'sbert': 3}
+
+
+def test_fast_model_callable_and_no_escalation():
+    cascade = CascadeClassifier(lambda: MODEL, lambda texts: 1 / 0, threshold=0.6)
+    assert [r['tier'] for r in cascade.predict(['cancel', 'cancel'])] == ['tfidf', 'tfidf']
+
+
+def test_calibrate_threshold():
+    model = FixedModel(['a', 'b'], {'1': [0.9, 0.1], '2': [0.8, 0.2], '3': [0.3, 0.7], '4': [0.6, 0.4]})
+    # Sorted by confidence: 1 ok (0.9), 2 ok (0.8), 3 wrong (0.7), 4 ok (0.6)
+    assert calibrate_threshold(model, ['1', '2', '3', '4'], ['a', 'a', 'a', 'a'], 0.75) == (0.6, 1.0)
+    assert calibrate_threshold(model, ['1', '2', '3', '4'], ['a', 'a', 'a', 'a'], 0.9) == (0.8, 0.5)
+    assert calibrate_threshold(model, ['3'], ['a'], 0.9) == (None, 0.0)
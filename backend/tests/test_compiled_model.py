@@ -0,0 +1,45 @@
+import os
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from compiled_model import CompiledIntentModel, compiled_path
+from model import IntentModel
+
+TEXTS = [f"{verb} my {thing} {n}" for n in range(8)
+         for verb, thing in (('cancel', 'flight'), ('change', 'seat'), ('check', 'bag'), ('find', 'pet'))]
+LABELS = [label for _ in range(8) for label in ('Cancel Trip', 'Change Flight', 'Check In Luggage Faq', 'Pet Travel')]
+QUERIES = ['cancel my flight please', 'can I change seat', 'my bag', 'unknown words only', '']
+
+
+def test_export_matches_pipeline(tmp_path):
+    model = IntentModel(str(tmp_path / 'model.joblib'))
+    model.train(TEXTS, LABELS)
+    model.save()
+
+    compiled = CompiledIntentModel(model.model_path)
+    assert compiled.load(mmap=True)
+    classes_a, proba_a = model.predict_proba(QUERIES)
+    classes_b, proba_b = compiled.predict_proba(QUERIES)
+    assert list(classes_a) == list(classes_b)
+    np.testing.assert_allclose(proba_b, proba_a, rtol=0, atol=1e-12)
+    assert compiled.predict(QUERIES[0])[0] == model.predict(QUERIES[0])[0]
+
+
+def test_failed_export_does_not_fail_save(tmp_path):
+    model = IntentModel(str(tmp_path / 'model.joblib'))
+    model.train(TEXTS, LABELS)
+    model.save()
+    assert os.path.exists(compiled_path(model.model_path))
+
+    # Not exportable: the joblib is still saved and the old .compiled removed
+    retrained = IntentModel(model.model_path)
+    retrained.pipeline.steps[0] = ('tfidf', TfidfVectorizer(stop_words='english'))
+    retrained.train(TEXTS, LABELS)
+    retrained.save()
+
+    reloaded = IntentModel(model.model_path)
+    assert reloaded.load()
+    assert reloaded.pipeline[0].stop_words == 'english'
+    assert not os.path.exists(compiled_path(model.model_path))
+    assert not [f for f in os.listdir(tmp_path) if f.endswith(('.new', '.tmp'))]
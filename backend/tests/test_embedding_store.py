@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore
+from scoring import IntentScorer, normalize_rows
+
+
+class CountingEncoder:
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.stack([np.random.default_rng(sum(map(ord, t))).normal(size=self.dim) for t in texts])
+
+
+def test_sync_encodes_only_new_rows(tmp_path):
+    texts = ['cancel my flight', 'lost bag', 'change my seat', 'cancel trip']
+    labels = ['Cancel Trip', 'Missing Bag', 'Change Flight', 'Cancel Trip']
+    encode = CountingEncoder()
+    store = EmbeddingStore(str(tmp_path), 'test-model', dtype='float32')
+
+    sorted_labels, embeddings, scales = store.sync(texts, labels, encode)
+    assert sorted_labels == ['Cancel Trip', 'Cancel Trip', 'Missing Bag', 'Change Flight']
+    assert isinstance(embeddings, np.memmap) and scales is None
+    np.testing.assert_allclose(embeddings, normalize_rows(encode(texts))[[0, 3, 1, 2]], atol=1e-6)
+
+    encode.calls.clear()
+    store.sync(texts, labels, encode)
+    assert encode.calls == []  # same corpus: mapped as-is
+
+    sorted_labels, embeddings, _ = store.sync(texts[1:] + ['where is my bag'], labels[1:] + ['Missing Bag'], encode)
+    assert encode.calls == [['where is my bag']]
+    assert sorted_labels == ['Missing Bag', 'Missing Bag', 'Change Flight', 'Cancel Trip']
+    scorer = IntentScorer(sorted_labels, embeddings, normalized=True)
+    assert scorer.top_intents(encode(['lost bag'])[0], 0.99)[0][0][0] == 'Missing Bag'
+
+
+def test_model_change_reencodes(tmp_path):
+    texts, labels = ['cancel my flight', 'lost bag'], ['Cancel Trip', 'Missing Bag']
+    encode = CountingEncoder()
+    EmbeddingStore(str(tmp_path), 'model-a').sync(texts, labels, encode)
+    EmbeddingStore(str(tmp_path), 'model-b').sync(texts, labels, encode)
+    assert encode.calls == [texts, texts]
+    assert EmbeddingStore(str(tmp_path), 'model-b').manifest()['model'] == 'model-b'
+
+
+def test_crashed_rebuild_keeps_the_previous_version(tmp_path, monkeypatch):
+    texts, labels = ['cancel my flight', 'lost bag'], ['Cancel Trip', 'Missing Bag']
+    encode = CountingEncoder()
+    store = EmbeddingStore(str(tmp_path), 'test-model', dtype='float32')
+    store.sync(texts, labels, encode)
+    write = store._write
+
+    def crash_on_keys(name, manifest, array):
+        if name == 'keys.npy':
+            raise OSError('disk full')
+        write(name, manifest, array)
+
+    monkeypatch.setattr(store, '_write', crash_on_keys)
+    with pytest.raises(OSError):
+        store.sync(texts + ['change my seat'], labels + ['Change Flight'], encode)
+    monkeypatch.undo()
+
+    encode.calls.clear()
+    sorted_labels, embeddings, _ = store.sync(texts, labels, encode)
+    assert encode.calls == [] and sorted_labels == labels and len(embeddings) == 2
+    store.sync(texts + ['change my seat'], labels + ['Change Flight'], encode)
+    assert encode.calls == [['change my seat']]
+    assert sorted(os.listdir(tmp_path)) == ['.lock', 'manifest.json', store.manifest()['version']]
+
+
+def test_arrays_not_matching_the_manifest_are_rebuilt(tmp_path):
+    texts, labels = ['cancel my flight', 'lost bag', 'cancel trip'], ['Cancel Trip', 'Missing Bag', 'Cancel Trip']
+    encode = CountingEncoder()
+    store = EmbeddingStore(str(tmp_path), 'test-model', dtype='float32')
+    store.sync(texts, labels, encode)
+    keys_file = os.path.join(str(tmp_path), store.manifest()['version'], 'keys.npy')
+    np.save(keys_file, np.load(keys_file)[:2])  # e.g. a copy interrupted half way
+
+    encode.calls.clear()
+    sorted_labels, embeddings, _ = store.sync(texts, labels, encode)
+    assert [sorted(call) for call in encode.calls] == [sorted(texts)]  # nothing reused
+    assert sorted_labels == ['Cancel Trip', 'Cancel Trip', 'Missing Bag'] and len(embeddings) == 3
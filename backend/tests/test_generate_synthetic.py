@@ -0,0 +1,78 @@
+from types import SimpleNamespace
+
+import pytest
+
+import generate_synthetic
+from generate_synthetic import ensure_unique_index, generate_task, make_tasks, variant_key, write_batch
+
+
+def test_task_output_is_seeded_and_deduplicated():
+    task = (0, 0, 'Cancel Trip', 'I want to cancel my flight', 200, 42, {})
+    pairs = generate_task(task)
+    assert pairs == generate_task(task)
+    assert len({variant_key(t, l) for t, l in pairs}) == len(pairs) < 200
+    assert all(label == 'Cancel Trip' for _, label in pairs)
+    assert generate_task((0, 0, 'Cancel Trip', 'I want to cancel my flight', 200, 7, {})) != pairs
+
+
+def test_tasks_are_split_into_chunks(monkeypatch):
+    monkeypatch.setattr(generate_synthetic, 'TASK_VARIANTS', 30)
+    tasks = make_tasks(70, 42, {})
+    n_examples = sum(len(examples) for examples in generate_synthetic.intents.values())
+    assert len(tasks) == 3 * n_examples
+    assert [t[4] for t in tasks[:3]] == [30, 30, 10]
+    assert [t[1] for t in tasks[:3]] == [0, 1, 2]
+
+
+def test_duplicates_from_older_runs_are_removed_before_indexing(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    coll = mongomock.MongoClient()['test']['data']
+    coll.insert_many([
+        {'text': 'cancel my flight', 'label': 'Cancel Trip', 'synthetic': True},
+        {'text': 'cancel my flight', 'label': 'Cancel Trip', 'synthetic': True},
+        {'text': 'cancel my flight', 'label': 'Cancel Trip', 'synthetic': True},
+        {'text': 'cancel my flight', 'label': 'Change Flight', 'synthetic': True},
+        # Logged classifications are left alone (mongomock ignores the
+        # partial filter of the index, so no repeated ones here)
+        {'text': 'my bag is lost', 'label': 'Missing Bag'},
+    ])
+    first = coll.find_one({'synthetic': True})['_id']
+
+    ensure_unique_index(coll)
+    assert coll.count_documents({'synthetic': True}) == 2
+    assert coll.count_documents({'synthetic': {'$ne': True}}) == 1
+    assert coll.find_one({'label': 'Cancel Trip', 'synthetic': True})['_id'] == first
+    assert 'synthetic_text_label_unique' in coll.index_information()
+
+    # Once the index exists, later runs don't scan for duplicates again
+    def dedupe_synthetic(coll):
+        raise AssertionError('dedupe_synthetic ran with the index in place')
+
+    monkeypatch.setattr(generate_synthetic, 'dedupe_synthetic', dedupe_synthetic)
+    ensure_unique_index(coll)
+    assert coll.count_documents({'synthetic': True}) == 2
+
+
+class UpsertCollection:
+    """mongomock's bulk_write doesn't take this pymongo's UpdateOne; apply them one by one."""
+
+    def __init__(self, coll):
+        self.coll = coll
+
+    def bulk_write(self, ops, ordered=True):
+        results = [self.coll.update_one(op._filter, op._doc, upsert=op._upsert) for op in ops]
+        return SimpleNamespace(upserted_count=sum(r.upserted_id is not None for r in results))
+
+
+def test_variants_repeating_any_document_are_skipped():
+    mongomock = pytest.importorskip('mongomock')
+    coll = mongomock.MongoClient()['test']['data']
+    coll.insert_many([
+        {'text': 'cancel my flight', 'label': 'Cancel Trip'},  # logged classification
+        {'text': 'cancel my flight now', 'label': 'Cancel Trip', 'synthetic': True},
+    ])
+    batch = [('cancel my flight', 'Cancel Trip'), ('cancel my flight now', 'Cancel Trip'),
+             ('cancel my flight please', 'Cancel Trip'), ('cancel my flight', 'Change Flight')]
+    assert write_batch(UpsertCollection(coll), batch) == 2
+    assert coll.count_documents({'synthetic': True}) == 3
+    assert coll.count_documents({'text': 'cancel my flight', 'label': 'Cancel Trip'}) == 1
@@ -0,0 +1,105 @@
+import time
+
+import joblib
+import mongomock
+from bson import ObjectId
+
+from model import IncrementalIntentModel
+
+DOCS = [(f"{verb} my {thing} {n}", label) for n in range(6)
+        for verb, thing, label in (('cancel', 'flight', 'Cancel Trip'), ('check', 'bag', 'Check In Luggage Faq'))]
+
+
+def oid(ts, n):
+    """ObjectId with timestamp `ts` and `n` in the machine/counter bytes."""
+    return ObjectId(f"{ts:08x}{n:016x}")
+
+
+def insert(coll, ts, n, text, label):
+    coll.insert_one({'_id': oid(ts, n), 'text': text, 'label': label})
+
+
+def test_only_new_documents_are_trained(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    coll.insert_many([{'text': t, 'label': l} for t, l in DOCS])
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    acc, report, n_docs = model.train_from_collection(coll, batch_size=5)
+    assert n_docs == len(DOCS) and model.checkpoint is not None
+    assert model.train_from_collection(coll) == (None, {}, 0)
+
+    model.save()
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert model.load()
+    coll.insert_one({'text': 'cancel my trip now', 'label': 'Cancel Trip'})
+    assert model.train_from_collection(coll)[2] == 1
+    assert model.predict('cancel my flight')[0] == 'Cancel Trip'
+
+
+def test_new_label_retrains_from_scratch(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    coll.insert_many([{'text': t, 'label': l} for t, l in DOCS])
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    model.train_from_collection(coll)
+    coll.insert_many([{'text': f"my pet {n}", 'label': 'Pet Travel'} for n in range(4)])
+    assert model.train_from_collection(coll)[2] == len(DOCS) + 4
+    assert model.classes == ['Cancel Trip', 'Check In Luggage Faq', 'Pet Travel']
+
+
+def test_mmap_load_matches_in_memory_model(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    coll.insert_many([{'text': t, 'label': l} for t, l in DOCS])
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    model.train_from_collection(coll)
+    model.save()
+    mapped = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert mapped.load(mmap=True)
+    assert mapped.predict('cancel my flight') == model.predict('cancel my flight')
+
+
+def test_late_id_below_checkpoint_is_trained(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    now = int(time.time())
+    for n, (text, label) in enumerate(DOCS):
+        insert(coll, now, 100 + n, text, label)
+
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert model.train_from_collection(coll)[2] == len(DOCS)
+    assert model.train_from_collection(coll)[2] == 0
+
+    # Written by another process in the same second, sorts below the checkpoint
+    insert(coll, now, 1, 'cancel my trip late', 'Cancel Trip')
+    model.save()
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert model.load()
+    assert model.train_from_collection(coll)[2] == 1
+    assert model.train_from_collection(coll)[2] == 0
+
+
+def test_recent_ids_outside_overlap_are_dropped(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    now = int(time.time())
+    old = now - IncrementalIntentModel.overlap - 60
+    for n, (text, label) in enumerate(DOCS):
+        insert(coll, old if n % 2 else now, n, text, label)
+
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert model.train_from_collection(coll)[2] == len(DOCS)
+    assert model.recent == {doc['_id'] for doc in coll.find({'_id': {'$gte': oid(now, 0)}})}
+
+
+def test_load_state_without_recent(tmp_path):
+    coll = mongomock.MongoClient().db.data
+    now = int(time.time())
+    for n, (text, label) in enumerate(DOCS):
+        insert(coll, now, n, text, label)
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    model.train_from_collection(coll)
+    joblib.dump({'pipeline': model.pipeline, 'checkpoint': model.checkpoint, 'classes': model.classes},
+                model.model_path)
+
+    model = IncrementalIntentModel(str(tmp_path / 'inc.joblib'), n_features=2**10)
+    assert model.load()
+    assert model.recent == set()
+    # The overlap window is re-read once, then skipped
+    assert model.train_from_collection(coll)[2] == len(DOCS)
+    assert model.train_from_collection(coll)[2] == 0
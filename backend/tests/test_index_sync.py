@@ -0,0 +1,112 @@
+import datetime
+import threading
+import time
+
+import pytest
+
+from index_sync import IntentIndexSync
+
+
+class Recorder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, added, removed, generation):
+        self.calls.append((sorted(added), sorted(removed)))
+
+
+def doc(_id, intent, examples, version=1):
+    return {'_id': _id, 'intent': intent, 'examples': examples, 'version': version,
+            'updated_at': datetime.datetime(2024, 1, 1, 0, 0, version)}
+
+
+def make_sync(docs):
+    apply = Recorder()
+    sync = IntentIndexSync(None, apply, mode='off')
+    sync.refresh(docs)
+    apply.calls.clear()
+    return sync, apply
+
+
+def test_refresh_applies_only_the_difference():
+    sync, apply = make_sync([doc(1, 'A', ['a1', 'a2']), doc(2, 'B', ['b1'])])
+
+    assert sync.refresh([doc(1, 'A', ['a2', 'a3'], version=2)]) == ([('A', 'a3')], [('A', 'a1')])
+    assert apply.calls == [([('A', 'a3')], [('A', 'a1')])]
+    assert sync.indexed() == {('A', 'a2'), ('A', 'a3'), ('B', 'b1')}
+    assert sync.version == 2
+
+    # Same content again and stale versions change nothing
+    assert sync.refresh([doc(1, 'A', ['a2', 'a3'], version=3)]) == ([], [])
+    assert sync.refresh([doc(1, 'A', ['zzz'], version=1)]) == ([], [])
+    assert len(apply.calls) == 1
+
+    sync.refresh([], deleted_ids=[2])
+    assert apply.calls[-1] == ([], [('B', 'b1')])
+    assert sync.indexed() == {('A', 'a2'), ('A', 'a3')}
+
+
+def test_pair_held_by_two_documents_is_removed_with_the_last_one():
+    sync, apply = make_sync([doc(1, 'A', ['x']), doc(2, 'A', ['x', 'y'])])
+    sync.refresh([], deleted_ids=[1])
+    assert apply.calls == []  # ('A', 'x') is still in document 2
+    sync.refresh([doc(2, 'A', ['y'], version=2)])
+    assert apply.calls == [([], [('A', 'x')])]
+    assert sync.indexed() == {('A', 'y')}
+
+
+def test_update_through_collection():
+    mongomock = pytest.importorskip('mongomock')
+    coll = mongomock.MongoClient()['test']['intents']
+    apply = Recorder()
+    sync = IntentIndexSync(coll, apply, mode='off')
+    sync.update({'intent': 'A'}, {'$addToSet': {'examples': 'a1'}}, upsert=True)
+    sync.update({'intent': 'A'}, {'$addToSet': {'examples': 'a1'}})
+    sync.update({'intent': 'A'}, {'$pull': {'examples': 'a1'}})
+    assert apply.calls == [([('A', 'a1')], []), ([], [('A', 'a1')])]
+    assert coll.find_one({'intent': 'A'})['version'] == 3
+
+
+def test_changes_are_applied_outside_the_lock_and_tagged_with_the_snapshot():
+    mongomock = pytest.importorskip('mongomock')
+    coll = mongomock.MongoClient()['test']['intents']
+    seen = []
+
+    def apply(added, removed, generation):
+        assert not sync.lock.locked()  # stats() and other refreshes aren't held up by the encode
+        seen.append((added, generation))
+
+    sync = IntentIndexSync(coll, apply, mode='off')
+    sync.load()
+    sync.update({'intent': 'A'}, {'$addToSet': {'examples': 'a1'}}, upsert=True)
+    assert sync.load() == (['a1'], ['A'])
+    sync.update({'intent': 'A'}, {'$addToSet': {'examples': 'a2'}})
+    assert seen == [([('A', 'a1')], 1), ([('A', 'a2')], 2)]
+
+
+def test_changes_queued_before_a_snapshot_are_dropped():
+    mongomock = pytest.importorskip('mongomock')
+    coll = mongomock.MongoClient()['test']['intents']
+    coll.insert_one(doc(1, 'A', ['a1']))
+    release = threading.Event()
+    calls = []
+
+    def apply(added, removed, generation):
+        calls.append(added)
+        release.wait(5)
+
+    sync = IntentIndexSync(coll, apply, mode='off')
+    sync.load()
+    first = threading.Thread(target=sync.refresh, args=([doc(1, 'A', ['a1', 'a2'], version=2)],))
+    first.start()
+    while not calls:
+        time.sleep(0.001)
+    second = threading.Thread(target=sync.refresh, args=([doc(1, 'A', ['a1', 'a2', 'a3'], version=3)],))
+    second.start()
+    while not sync._pending:  # queued behind the slow apply
+        time.sleep(0.001)
+    sync.load()  # the rebuild's snapshot
+    release.set()
+    first.join()
+    second.join()
+    assert calls == [[('A', 'a2')]]
@@ -0,0 +1,62 @@
+import importlib
+import sys
+
+import pytest
+
+from metrics import Registry
+
+
+def test_render_families_and_collectors():
+    registry = Registry()
+    counter = registry.counter('requests', 'Requests', ['route'])
+    counter.labels('/api/classify').inc()
+    counter.labels('/api/classify').inc(2)
+    registry.gauge('model_version', 'Model version').set(3)
+    histogram = registry.histogram('latency_seconds', 'Latency', [0.1, 1.0])
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value)
+    registry.add_collector(lambda: [('pending', 'gauge', 'Pending', [({'buffer': 'a"b'}, 4)])])
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests counter' in lines
+    assert 'requests_total{route="/api/classify"} 3.0' in lines
+    assert 'model_version 3' in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'latency_seconds_count 3' in lines
+    assert 'pending{buffer="a\\"b"} 4' in lines
+
+
+def test_large_counts_are_rendered_exactly():
+    registry = Registry()
+    counter = registry.counter('requests', 'Requests', ['route'])
+    counter.labels('/api/classify').inc(1234567)
+    histogram = registry.histogram('latency_seconds', 'Latency', [0.1])
+    for _ in range(3):
+        histogram.observe(0.05)
+    text = registry.render()
+    assert 'requests_total{route="/api/classify"} 1234567.0' in text
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in text
+    assert 'e+06' not in text
+
+
+@pytest.fixture
+def client(monkeypatch):
+    mongomock = pytest.importorskip('mongomock')
+    pytest.importorskip('flask')
+    import pymongo
+
+    shared = mongomock.MongoClient()
+    monkeypatch.setattr(pymongo, 'MongoClient', lambda *args, **kwargs: shared)
+    monkeypatch.setenv('ADMIN_TOKEN', 'secret')
+    sys.modules.pop('app', None)
+    app = importlib.import_module('app')
+    yield app.app.test_client()
+    sys.modules.pop('app', None)
+
+
+def test_profile_requires_the_admin_token(client):
+    assert client.post('/api/profile', json={'rate': 1.0}).status_code == 403
+    assert client.get('/api/profile').status_code == 403
+    response = client.post('/api/profile', json={'rate': 0.5}, headers={'X-Admin-Token': 'secret'})
+    assert response.status_code == 200 and response.json['rate'] == 0.5
@@ -0,0 +1,73 @@
+import importlib
+import sys
+import threading
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+
+@pytest.fixture(scope='module')
+def model1(tmp_path_factory):
+    """model1 on an in-memory Mongo and the hashing stand-in encoder (no SBERT download)."""
+    import pymongo
+
+    import onnx_encoder
+    from bench_suite import HashingEncoder
+
+    patch = pytest.MonkeyPatch()
+    patch.setenv('INDEX_SYNC', 'off')
+    patch.setenv('QUERY_CACHE_SIZE', '0')
+    patch.setenv('EMBEDDING_STORE_DIR', str(tmp_path_factory.mktemp('store')))
+    client = mongomock.MongoClient()
+    patch.setattr(pymongo, 'MongoClient', lambda *args, **kwargs: client)
+    patch.setattr(onnx_encoder, 'load_encoder', lambda *args, **kwargs: HashingEncoder())
+    sys.modules.pop('index_sync', None)  # re-read INDEX_SYNC
+    sys.modules.pop('model1', None)
+    module = importlib.import_module('model1')
+    yield module
+    module.batch_encoder.close()
+    patch.undo()
+    sys.modules.pop('model1', None)
+    sys.modules.pop('index_sync', None)
+
+
+def test_scoring_while_the_index_changes(model1):
+    model1.intent_scorer.compact_min = 8  # compact often
+    errors = []
+    stop = threading.Event()
+
+    def writer():
+        try:
+            for i in range(300):
+                pair = ('Pet Travel', f'can my dog number {i} fly')
+                model1.apply_index_changes([pair], [], model1.index_generation)
+                if i % 2:
+                    model1.apply_index_changes([], [pair], model1.index_generation)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            stop.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    while not stop.is_set():
+        try:
+            ranked = model1.score_multiple_intents_batch(['Can I travel with my pet?', 'cancel my flight'], 0.0)
+            assert ranked[0][0][0] == 'Pet Travel'
+        except Exception as exc:
+            errors.append(exc)
+            break
+    thread.join()
+    assert not errors
+    assert len(model1.intent_scorer) == len(model1.example_texts)
+
+
+def test_changes_from_before_a_rebuild_are_dropped(model1):
+    generation = model1.index_generation
+    model1.update_embeddings_for_all_intents()
+    size = len(model1.intent_scorer)
+    model1.apply_index_changes([('Pet Travel', 'can my parrot fly')], [], generation)
+    assert len(model1.intent_scorer) == size
+    model1.apply_index_changes([('Pet Travel', 'can my parrot fly')], [], model1.index_generation)
+    assert len(model1.intent_scorer) == size + 1
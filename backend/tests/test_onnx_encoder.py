@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pytest
+
+from onnx_encoder import VERIFY_SENTENCES, OnnxEncoder, load_encoder
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('sentence_transformers')
+
+
+@pytest.fixture(scope='module')
+def model_dir(tmp_path_factory):
+    """Tiny randomly initialised BERT SentenceTransformer, built offline."""
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    root = tmp_path_factory.mktemp('tiny_st')
+    words = sorted({w for s in VERIFY_SENTENCES + ['export sample'] for w in s.lower().replace('?', ' ').split()})
+    vocab = root / 'vocab.txt'
+    vocab.write_text('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + words))
+    hf_dir = str(root / 'hf')
+    BertTokenizerFast(str(vocab)).save_pretrained(hf_dir)
+    config = BertConfig(vocab_size=len(words) + 5, hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    BertModel(config).save_pretrained(hf_dir)
+    modules = [models.Transformer(hf_dir, max_seq_length=32), models.Pooling(32, 'mean'), models.Normalize()]
+    SentenceTransformer(modules=modules).save(str(root / 'st'))
+    return str(root / 'st')
+
+
+@pytest.fixture(scope='module')
+def export_dir(model_dir, tmp_path_factory):
+    export_dir = str(tmp_path_factory.mktemp('export'))
+    OnnxEncoder.export(model_dir, export_dir)
+    return export_dir
+
+
+@pytest.fixture(scope='module')
+def encoder(export_dir):
+    return OnnxEncoder(export_dir)
+
+
+def test_export_matches_pytorch(encoder, model_dir):
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_dir, device='cpu')
+    assert encoder.config['normalize'] and encoder.config['verified_min_cosine'] >= 0.99
+    assert encoder.compare(reference) >= 0.99
+    assert encoder.get_sentence_embedding_dimension() == 32
+
+
+def test_batches_keep_input_order(encoder):
+    sentences = ['hi', 'I want to cancel my flight', 'hi', 'Can I bring my guitar on the plane?']
+    batched = encoder.encode(sentences, batch_size=3)
+    singles = np.stack([encoder.encode(s) for s in sentences])
+    assert batched.shape == (4, 32)
+    # Activations are quantized per batch, so only close, not identical
+    assert np.min(np.sum(batched * singles, axis=1)) >= 0.99
+    np.testing.assert_allclose(batched[0], batched[2], atol=1e-3)
+    np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, atol=1e-5)
+
+
+def test_existing_export_is_reused(export_dir, model_dir, monkeypatch):
+    calls = []
+    monkeypatch.setattr(OnnxEncoder, '_export', staticmethod(lambda *args, **kwargs: calls.append(args)))
+    OnnxEncoder.load_or_export(model_dir, export_dir)
+    assert calls == []
+    with pytest.raises(ValueError):
+        load_encoder(model_dir, backend='tensorrt')
+
+
+def test_drifting_export_is_refused(model_dir, tmp_path):
+    export_dir = str(tmp_path / 'export')
+    with pytest.raises(RuntimeError, match='drifts'):
+        OnnxEncoder.export(model_dir, export_dir, min_cosine=1.01)
+    # Nothing half-written is left where load_or_export would find it
+    assert sorted(os.listdir(tmp_path)) == ['export.lock']
+
+
+def test_failed_reexport_keeps_the_previous_export(model_dir, export_dir):
+    with pytest.raises(RuntimeError, match='drifts'):
+        OnnxEncoder.export(model_dir, export_dir, min_cosine=1.01)
+    assert OnnxEncoder(export_dir).config['verified_min_cosine'] >= 0.99
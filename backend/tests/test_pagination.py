@@ -0,0 +1,61 @@
+import datetime
+
+import mongomock
+import pytest
+from bson import ObjectId
+
+from pagination import BadQuery, build_query, decode_cursor, encode_cursor, parse_limit, parse_projection
+
+T0 = datetime.datetime(2024, 5, 1, 12, 0)
+
+
+def page_through(coll, limit, args=None):
+    """Follow next cursors the way /api/classified does; returns every _id seen."""
+    args = dict(args or {})
+    seen = []
+    while True:
+        query = build_query(args, {'label': lambda v, _: v})
+        docs = list(coll.find(query).sort([('ts', -1), ('_id', -1)]).limit(limit + 1))
+        seen.extend(doc['_id'] for doc in docs[:limit])
+        if len(docs) <= limit:
+            return seen
+        args['cursor'] = encode_cursor(docs[limit - 1])
+
+
+@pytest.fixture
+def coll():
+    coll = mongomock.MongoClient().db.logs
+    docs = []
+    for i in range(12):
+        # Runs of equal timestamps must be split on _id across pages
+        docs.append({'_id': ObjectId(), 'ts': T0 + datetime.timedelta(seconds=i // 4), 'label': 'a' if i % 2 else 'b'})
+    docs += [{'_id': ObjectId(), 'label': 'a'} for _ in range(3)]  # no ts: sorted last
+    coll.insert_many(docs)
+    return coll
+
+
+@pytest.mark.parametrize('limit', [1, 3, 4, 5, 20])
+def test_keyset_pages_cover_every_document_once(coll, limit):
+    expected = [doc['_id'] for doc in coll.find().sort([('ts', -1), ('_id', -1)])]
+    assert page_through(coll, limit) == expected
+
+
+def test_keyset_pages_with_filters(coll):
+    since = (T0 + datetime.timedelta(seconds=1)).isoformat()
+    query = {'label': 'a', 'ts': {'$gte': T0 + datetime.timedelta(seconds=1)}}
+    expected = [doc['_id'] for doc in coll.find(query).sort([('ts', -1), ('_id', -1)])]
+    assert page_through(coll, 2, {'label': 'a', 'since': since}) == expected
+
+
+def test_cursor_round_trip_and_errors():
+    _id = ObjectId()
+    assert decode_cursor(encode_cursor({'_id': _id, 'ts': T0})) == (T0, _id)
+    assert decode_cursor(encode_cursor({'_id': _id})) == (None, _id)
+    with pytest.raises(BadQuery):
+        decode_cursor('not-a-cursor')
+    with pytest.raises(BadQuery):
+        build_query({'since': 'yesterday'}, {})
+    with pytest.raises(BadQuery):
+        parse_limit('0', 50, 500)
+    assert parse_limit(None, 50, 500) == 50
+    assert parse_projection('text, label') == {'text': 1, 'label': 1, 'ts': 1}
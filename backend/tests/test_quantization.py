@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from embedding_store import EmbeddingStore
+from scoring import IntentScorer, normalize_rows, quantize_rows
+
+
+def corpus(n=300, dim=32, n_intents=6, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = [f"intent{i}" for i in rng.integers(0, n_intents, size=n)]
+    return labels, rng.normal(size=(n, dim)).astype(np.float32), rng.normal(size=(10, dim)).astype(np.float32)
+
+
+def test_quantize_rows_round_trip():
+    x = normalize_rows(np.random.default_rng(0).normal(size=(50, 32)))
+    x[3] = 0
+    values, scales = quantize_rows(x)
+    assert values.dtype == np.int8 and scales.dtype == np.float32
+    assert np.abs(values).max() == 127
+    assert scales[3] == 1.0 and not values[3].any()
+    # Rounding error is at most half a quantization step per element
+    assert np.all(np.abs(values * scales[:, None] - x) <= scales[:, None] / 2 + 1e-7)
+
+
+@pytest.mark.parametrize('dtype, atol', [('float16', 2e-3), ('int8', 2e-2)])
+def test_compact_storage_scores_close_to_float32(dtype, atol):
+    labels, embeddings, queries = corpus()
+    reference = IntentScorer(labels, embeddings).score(queries)
+    scorer = IntentScorer(labels, embeddings, dtype=dtype)
+    scorer.chunk_rows = 64  # several upcast chunks
+    assert scorer.matrix.dtype == np.dtype(dtype)
+    assert scorer.nbytes() < IntentScorer(labels, embeddings).nbytes()
+    np.testing.assert_allclose(scorer.score(queries), reference, atol=atol)
+
+
+def test_int8_compaction_keeps_row_scales_aligned():
+    labels, embeddings, queries = corpus()
+    scorer = IntentScorer(labels[:200], embeddings[:200], dtype='int8')
+    scorer.compact_min = 10**9
+    for label, emb in zip(labels[200:], embeddings[200:]):
+        scorer.add(label, emb)
+    for i in range(0, 300, 4):
+        assert scorer.remove(labels[i], embeddings[i])
+    keep = [i for i in range(300) if i % 4]
+    reference = IntentScorer([labels[i] for i in keep], embeddings[keep])
+    order = [scorer.intents.index(intent) for intent in reference.intents]
+
+    scorer.compact()
+    assert scorer.matrix.dtype == np.int8 and len(scorer.scales) == len(scorer.matrix) == len(keep)
+    np.testing.assert_allclose(scorer.score(queries)[:, order], reference.score(queries), atol=2e-2)
+
+
+def test_store_converts_dtype_without_reencoding(tmp_path):
+    labels, embeddings, queries = corpus()
+    texts = [f"example {i}" for i in range(len(labels))]
+    rows = dict(zip(texts, embeddings))
+    calls = []
+
+    def encode(batch):
+        calls.append(len(batch))
+        return np.stack([rows[t] for t in batch])
+
+    reference = IntentScorer(labels, embeddings).score(queries)
+    EmbeddingStore(str(tmp_path), 'test-model', dtype='float32').sync(texts, labels, encode)
+    sorted_labels, stored, scales = EmbeddingStore(str(tmp_path), 'test-model', dtype='int8').sync(texts, labels, encode)
+    assert calls == [len(texts)]
+    assert stored.dtype == np.int8 and scales is not None
+    scorer = IntentScorer(sorted_labels, stored, normalized=True, scales=scales)
+    np.testing.assert_allclose(scorer.score(queries), reference, atol=2e-2)
@@ -0,0 +1,44 @@
+import query_cache
+from query_cache import QueryCache, normalize_text
+
+
+def test_normalize_text():
+    assert normalize_text(' Is my flight  on-time?? ') == 'is my flight on time'
+
+
+def test_lru_eviction_and_extra_key_parts():
+    cache = QueryCache(max_size=2)
+    cache.put('Cancel my flight', 'a')
+    cache.put('cancel my flight', 'b', 0.5)
+    assert cache.get('CANCEL my flight!') == 'a'  # now most recently used
+    assert cache.get('cancel my flight', 0.5) == 'b'
+    assert cache.get('cancel my flight', 0.7) is None
+    cache.put('lost bag', 'c')  # evicts the least recently used entry
+    assert cache.get('cancel my flight') is None
+    assert cache.get('lost bag') == 'c'
+    stats = cache.stats()
+    assert (stats['size'], stats['hits'], stats['misses'], stats['evictions']) == (2, 3, 2, 1)
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    cache = QueryCache(ttl=10)
+    cache.put('lost bag', 'c')
+    now[0] += 5
+    assert cache.get('lost bag') == 'c'
+    now[0] += 6
+    assert cache.get('lost bag') is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_invalidate_drops_entries_and_stale_puts():
+    cache = QueryCache()
+    cache.put('lost bag', 'c')
+    version = cache.version
+    cache.invalidate()
+    assert cache.get('lost bag') is None
+    cache.put('lost bag', 'computed before the invalidation', version=version)
+    assert cache.get('lost bag') is None
+    cache.put('lost bag', 'fresh', version=cache.version)
+    assert cache.get('lost bag') == 'fresh'
@@ -0,0 +1,104 @@
+import numpy as np
+
+from scoring import IntentScorer, normalize_rows
+
+
+def corpus(n=200, dim=16, n_intents=6, seed=0):
+    rng = np.random.default_rng(seed)
+    labels = [f"intent{i}" for i in rng.integers(0, n_intents, size=n)]  # not grouped by intent
+    return labels, rng.normal(size=(n, dim)).astype(np.float32), rng.normal(size=(10, dim)).astype(np.float32)
+
+
+def brute_force(labels, embeddings, queries):
+    """Max cosine similarity per intent, one intent at a time."""
+    intents = list(dict.fromkeys(labels))
+    sims = normalize_rows(queries) @ normalize_rows(embeddings).T
+    label_array = np.array(labels)
+    return intents, np.stack([sims[:, label_array == intent].max(axis=1) for intent in intents], axis=1)
+
+
+def test_segment_max_matches_brute_force():
+    labels, embeddings, queries = corpus()
+    scorer = IntentScorer(labels, embeddings)
+    intents, expected = brute_force(labels, embeddings, queries)
+    assert scorer.intents == intents
+    np.testing.assert_allclose(scorer.score(queries), expected, atol=1e-5)
+    np.testing.assert_allclose(scorer.score(queries[0]), expected[:1], atol=1e-5)
+
+
+def test_top_intents_threshold_and_top_k():
+    scorer = IntentScorer(['a', 'b', 'c', 'd'], np.eye(4))
+    query = np.array([0.9, 0.2, 0.7, 0.65])
+    top = scorer.top_intents(query, 0.4, 2)[0]
+    assert [intent for intent, _ in top] == ['a', 'c']
+    assert scorer.top_intents(query, 0.99, 2) == [[]]
+
+
+def test_added_examples_score_before_and_after_compaction():
+    labels, embeddings, queries = corpus()
+    scorer = IntentScorer(labels[:150], embeddings[:150])
+    scorer.compact_min = 10**9  # keep the additions in the tail
+    for label, emb in zip(labels[150:], embeddings[150:]):
+        scorer.add(label, emb)
+    scorer.add('new intent', embeddings[0])
+    all_labels = labels + ['new intent']
+    all_embeddings = np.vstack([embeddings, embeddings[:1]])
+    intents, expected = brute_force(all_labels, all_embeddings, queries)
+    assert len(scorer) == len(all_labels)
+    order = [scorer.intents.index(intent) for intent in intents]
+    np.testing.assert_allclose(scorer.score(queries)[:, order], expected, atol=1e-5)
+
+    scorer.compact()
+    assert scorer._tail_len == 0 and len(scorer) == len(all_labels)
+    np.testing.assert_allclose(scorer.score(queries)[:, order], expected, atol=1e-5)
+
+
+def test_empty_scorer_grows_with_add():
+    labels, embeddings, queries = corpus(n=20)
+    scorer = IntentScorer([], [])
+    assert scorer.score(queries).shape == (10, 0)
+    for label, emb in zip(labels, embeddings):
+        scorer.add(label, emb)
+    intents, expected = brute_force(labels, embeddings, queries)
+    order = [scorer.intents.index(intent) for intent in intents]
+    np.testing.assert_allclose(scorer.score(queries)[:, order], expected, atol=1e-5)
+
+
+def test_removed_examples_are_masked_then_compacted():
+    labels, embeddings, queries = corpus()
+    scorer = IntentScorer(labels[:150], embeddings[:150])
+    scorer.compact_min = 10**9
+    for label, emb in zip(labels[150:], embeddings[150:]):
+        scorer.add(label, emb)
+    removed = list(range(0, 200, 3))  # rows of the sorted matrix and of the tail
+    for i in removed:
+        assert scorer.remove(labels[i], embeddings[i])
+    assert not scorer.remove('unknown', embeddings[0])
+    keep = [i for i in range(200) if i not in removed]
+    intents, expected = brute_force([labels[i] for i in keep], embeddings[keep], queries)
+    order = [scorer.intents.index(intent) for intent in intents]
+    assert len(scorer) == len(keep) and len(scorer._dead)
+    np.testing.assert_allclose(scorer.score(queries)[:, order], expected, atol=1e-5)
+
+    scorer.compact()
+    assert not len(scorer._dead) and len(scorer) == len(keep)
+    np.testing.assert_allclose(scorer.score(queries)[:, order], expected, atol=1e-5)
+
+
+def test_intent_with_every_example_removed_scores_minus_inf():
+    labels, embeddings, queries = corpus()
+    scorer = IntentScorer(labels, embeddings)
+    middle = scorer.intents[2]
+    for i, label in enumerate(labels):
+        if label == middle:
+            assert scorer.remove(label, embeddings[i])
+    assert not scorer.remove(middle, embeddings[0])
+    intents, expected = brute_force(*zip(*[(l, e) for l, e in zip(labels, embeddings) if l != middle]), queries)
+    for compact in (False, True):
+        if compact:
+            scorer.compact()  # leaves an empty segment in the middle of the matrix
+        scores = scorer.score(queries)
+        assert np.all(scores[:, 2] == -np.inf)
+        order = [scorer.intents.index(intent) for intent in intents]
+        np.testing.assert_allclose(scores[:, order], expected, atol=1e-5)
+        assert all(middle not in dict(top) for top in scorer.top_intents(queries, -1.0, 10))
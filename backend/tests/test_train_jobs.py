@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+from train_jobs import SharedTrainingJobs
+
+
+@pytest.fixture
+def jobs_collection():
+    return mongomock.MongoClient()['test']['training_jobs']
+
+
+def test_jobs_are_visible_and_coalesced_across_workers(jobs_collection, tmp_path):
+    release = threading.Event()
+    runs = []
+
+    def train():
+        runs.append(1)
+        release.wait(5)
+        return {'accuracy': 0.9}
+
+    lock = str(tmp_path / 'model.joblib.lock')
+    worker_a = SharedTrainingJobs(jobs_collection, train, lock, poll_interval=0.05)
+    worker_b = SharedTrainingJobs(jobs_collection, train, lock, poll_interval=0.05)
+
+    first = worker_a.submit()
+    # Submitted to worker A, reported by worker B
+    assert worker_b.get(first['job_id'])['job_id'] == first['job_id']
+    assert worker_b.get('unknown') is None
+
+    while worker_b.get(first['job_id'])['status'] != 'running':
+        threading.Event().wait(0.01)
+    # While it runs, requests on either worker join one follow-up job
+    follow_up = worker_b.submit()
+    assert worker_a.submit()['job_id'] == follow_up['job_id'] != first['job_id']
+
+    release.set()
+    assert worker_b.wait(first['job_id'], timeout=5)['status'] == 'done'
+    done = worker_a.wait(follow_up['job_id'], timeout=5)
+    assert done['status'] == 'done' and done['accuracy'] == 0.9
+    assert len(runs) == 2
+
+
+def test_failed_and_orphaned_jobs(jobs_collection, tmp_path):
+    jobs_collection.insert_one({'job_id': 'dead', 'status': 'running'})
+
+    def train():
+        raise ValueError('need at least 10 training examples')
+
+    jobs = SharedTrainingJobs(jobs_collection, train, str(tmp_path / 'lock'), poll_interval=0.05)
+    job = jobs.wait(jobs.submit()['job_id'], timeout=5)
+    assert job['status'] == 'failed' and 'at least 10' in job['error']
+    # Left "running" by a worker that died: failed once the lock is free
+    assert jobs.get('dead')['status'] == 'failed'
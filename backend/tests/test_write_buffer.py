@@ -0,0 +1,144 @@
+import asyncio
+import threading
+
+from pymongo.errors import BulkWriteError, OperationFailure, ServerSelectionTimeoutError
+
+from write_buffer import WriteBehindBuffer, bulk_write_counts
+
+
+class FakeCollection:
+    name = 'fake'
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)  # raised by the next insert_many calls, in order
+        self.docs = []
+        self.batches = []
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        self.batches.append(len(docs))
+        self.docs.extend(docs)
+
+
+def make_buffer(collection, **kwargs):
+    buffer = WriteBehindBuffer(collection, max_batch=10, flush_interval=60, **kwargs)
+    buffer.retry_backoff = 0
+    return buffer
+
+
+def test_documents_are_written_in_batches():
+    coll = FakeCollection()
+    buffer = WriteBehindBuffer(coll, max_batch=4, flush_interval=60)
+    buffer.put_many([{'i': i} for i in range(10)])
+    assert buffer.flush(timeout=5)
+    assert [d['i'] for d in coll.docs] == list(range(10))
+    assert max(coll.batches) <= 4 and buffer.pending() == 0
+    assert buffer.written == 10
+    buffer.close()
+
+
+def test_close_drains_the_queue():
+    coll = FakeCollection()
+    buffer = WriteBehindBuffer(coll, max_batch=100, flush_interval=60)
+    buffer.put({'i': 0})
+    buffer.close()
+    assert [d['i'] for d in coll.docs] == [0]
+
+
+def test_transient_errors_are_retried():
+    coll = FakeCollection([ServerSelectionTimeoutError('down'), OperationFailure('not primary')])
+    buffer = make_buffer(coll)
+    buffer.put_many([{'i': i} for i in range(3)])
+    assert buffer.flush(timeout=5)
+    assert [d['i'] for d in coll.docs] == [0, 1, 2]
+    assert (buffer.written, buffer.failed) == (3, 0)
+    buffer.close()
+
+
+def test_worker_survives_giving_up():
+    coll = FakeCollection([OperationFailure('boom')] * (WriteBehindBuffer.max_retries + 1))
+    buffer = make_buffer(coll)
+    buffer.put({'i': 0})
+    assert buffer.flush(timeout=5)
+    assert (buffer.written, buffer.failed) == (0, 1)
+
+    # The worker is still alive and writes the next documents
+    buffer.put({'i': 1})
+    assert buffer.flush(timeout=5)
+    assert [d['i'] for d in coll.docs] == [1]
+    assert buffer._worker.is_alive()
+    buffer.close()
+
+
+def test_put_does_not_block_forever_after_failures():
+    coll = FakeCollection([ServerSelectionTimeoutError('down')] * 50)
+    buffer = WriteBehindBuffer(coll, max_batch=2, flush_interval=60, max_pending=2)
+    buffer.retry_backoff = 0
+    done = threading.Event()
+
+    def producer():
+        buffer.put_many([{'i': i} for i in range(20)], timeout=5)
+        done.set()
+
+    threading.Thread(target=producer, daemon=True).start()
+    assert done.wait(10)
+    assert buffer.flush(timeout=5)
+    assert buffer.written + buffer.failed == 20
+    buffer.close()
+
+
+def test_bulk_write_error_counts():
+    exc = BulkWriteError({'nInserted': 7, 'writeErrors': [
+        {'index': 1, 'code': 11000, 'keyPattern': {'text': 1, 'label': 1}, 'errmsg': 'dup'},
+        {'index': 4, 'code': 11000, 'keyPattern': {'_id': 1}, 'errmsg': 'dup'},
+        {'index': 6, 'code': 121, 'errmsg': 'Document failed validation'}
+    ]})
+    # The duplicate _id was stored by an earlier attempt
+    assert bulk_write_counts(exc, 10) == (8, 2)
+
+    coll = FakeCollection([exc])
+    buffer = make_buffer(coll)
+    buffer.put_many([{'i': i} for i in range(10)])
+    assert buffer.flush(timeout=5)
+    assert (buffer.written, buffer.failed, coll.calls) == (8, 2, 1)
+    buffer.close()
+
+
+class FakeAsyncCollection(FakeCollection):
+    async def insert_many(self, docs, ordered=True):
+        FakeCollection.insert_many(self, docs, ordered)
+
+
+def test_async_flush_under_steady_traffic():
+    from write_buffer import AsyncWriteBehindBuffer
+
+    async def scenario():
+        coll = FakeAsyncCollection([OperationFailure('boom')])
+        buffer = AsyncWriteBehindBuffer(coll, max_batch=5, flush_interval=0.05)
+        buffer.retry_backoff = 0
+        buffer.start()
+        stop = asyncio.Event()
+
+        async def traffic():
+            i = 0
+            while not stop.is_set():
+                await buffer.put({'i': i})
+                i += 1
+                await asyncio.sleep(0)
+
+        producer = asyncio.ensure_future(traffic())
+        await asyncio.sleep(0.05)
+        await buffer.put({'marker': True})
+        # Returns once the marker is written, although the queue never drains
+        await asyncio.wait_for(buffer.flush(), 2)
+        assert any(d.get('marker') for d in coll.docs)
+        stop.set()
+        await producer
+        await buffer.close()
+        return buffer
+
+    buffer = asyncio.run(scenario())
+    assert buffer.failed == 0 and buffer.written > 0
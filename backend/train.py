@@ -2,8 +2,9 @@
 
 from pymongo import MongoClient
 from dotenv import load_dotenv
+import argparse
 import os
-from model import IntentModel
+from model import IntentModel, IncrementalIntentModel
 
 # Load environment variables
 load_dotenv()
@@ -16,7 +17,32 @@ client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 DATA_COLL = db['data']
 
+def train_incremental(batch_size):
+    # Stream only documents added since the last checkpoint
+    model = IncrementalIntentModel()
+    model.load()
+    acc, report, n_docs = model.train_from_collection(DATA_COLL, batch_size=batch_size)
+    if n_docs == 0:
+        print("ℹ No new documents since the last checkpoint.")
+        return
+    model.save()
+
+    print(f"✅ Model updated with {n_docs} new documents!")
+    print("Held-out accuracy:", acc)
+    print("Report:", report)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true',
+                        help='update the hashing/SGD model with new documents only')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    if args.incremental:
+        train_incremental(args.batch_size)
+        exit(0)
+
     # Fetch training data from MongoDB
     docs = list(DATA_COLL.find())
 
@@ -0,0 +1,202 @@
+import datetime
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock (single-process serving)
+    fcntl = None
+
+
+class TrainingJobs:
+    """
+    Runs training jobs one at a time on a background thread.
+
+    Requests are coalesced: while a job is queued, new requests join it; while
+    a job is running, at most one follow-up job is queued (so data logged
+    during the run is still picked up) and later requests join that one.
+    """
+
+    def __init__(self, train_fn, max_history=100):
+        """train_fn() -> dict of results stored on the job; raise to fail the job."""
+        self.train_fn = train_fn
+        self.max_history = max_history
+        self._jobs = OrderedDict()
+        self._pending = None
+        self._running = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._worker = threading.Thread(target=self._run, name='training-jobs', daemon=True)
+        self._worker.start()
+
+    def submit(self):
+        """Returns the job (a dict snapshot) that will cover this request."""
+        with self._lock:
+            if self._pending is None:
+                job_id = uuid.uuid4().hex
+                self._jobs[job_id] = {
+                    'job_id': job_id,
+                    'status': 'queued',
+                    'submitted': datetime.datetime.utcnow(),
+                    '_done': threading.Event()
+                }
+                self._pending = job_id
+                while len(self._jobs) > self.max_history:
+                    oldest = next(iter(self._jobs))
+                    if oldest in (self._pending, self._running):
+                        break
+                    self._jobs.pop(oldest)
+                self._wakeup.notify()
+            return self._public(self._jobs[self._pending])
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job) if job else None
+
+    def wait(self, job_id, timeout=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job['_done'].wait(timeout)
+        return self.get(job_id)
+
+    def _public(self, job):
+        return {k: v for k, v in job.items() if not k.startswith('_')}
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while self._pending is None:
+                    self._wakeup.wait()
+                job_id, self._pending = self._pending, None
+                self._running = job_id
+                job = self._jobs[job_id]
+                job['status'] = 'running'
+                job['started'] = datetime.datetime.utcnow()
+
+            try:
+                result = self.train_fn()
+                update = {'status': 'done', **result}
+            except Exception as exc:
+                update = {'status': 'failed', 'error': str(exc)}
+
+            with self._lock:
+                job.update(update)
+                job['finished'] = datetime.datetime.utcnow()
+                self._running = None
+            job['_done'].set()
+
+
+class SharedTrainingJobs:
+    """
+    TrainingJobs for several processes (pre-forked workers) sharing one Mongo
+    collection of jobs, so any worker can report or wait for any job and
+    requests coalesce the same way across all of them.
+
+    A process starts a thread picking up queued jobs on its first submit (so
+    a pre-fork master that never serves requests stays idle). A job is only
+    claimed while holding an exclusive lock on lock_path, so runs never
+    overlap and the queued job stays joinable until a run actually starts.
+    A job still "running" when the lock is taken belonged to a worker that
+    died mid-run and is marked failed.
+    """
+
+    def __init__(self, collection, train_fn, lock_path, max_history=100, poll_interval=1.0):
+        """train_fn() -> dict of results stored on the job; raise to fail the job."""
+        self.collection = collection
+        self.train_fn = train_fn
+        self.lock_path = lock_path
+        self.max_history = max_history
+        self.poll_interval = poll_interval
+        # At most one queued job: concurrent submits upsert into the same one
+        collection.create_index('job_id', unique=True)
+        collection.create_index('status', unique=True, partialFilterExpression={'status': 'queued'})
+        self._wakeup = threading.Event()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name='training-jobs', daemon=True)
+                self._worker.start()
+
+    def submit(self):
+        """Returns the job (a dict snapshot) that will cover this request."""
+        self._start()
+        while True:
+            try:
+                job = self.collection.find_one_and_update(
+                    {'status': 'queued'},
+                    {'$setOnInsert': {'job_id': uuid.uuid4().hex, 'submitted': datetime.datetime.utcnow()}},
+                    upsert=True, return_document=ReturnDocument.AFTER, projection={'_id': 0}
+                )
+                break
+            except DuplicateKeyError:
+                continue  # another worker queued one at the same moment: join it
+        self._wakeup.set()
+        return job
+
+    def get(self, job_id):
+        return self.collection.find_one({'job_id': job_id}, {'_id': 0})
+
+    def wait(self, job_id, timeout=None, interval=0.2):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in ('done', 'failed'):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(interval)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            try:
+                if self.collection.find_one({'status': 'queued'}, {'_id': 1}) is not None:
+                    self._run_next()
+            except PyMongoError as exc:
+                print(f"⚠ Training jobs: {exc}")
+
+    def _run_next(self):
+        with open(self.lock_path, 'w') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            now = datetime.datetime.utcnow()
+            # Holding the lock, nothing else can be running
+            self.collection.update_many(
+                {'status': 'running'},
+                {'$set': {'status': 'failed', 'error': 'worker exited during training', 'finished': now}}
+            )
+            job = self.collection.find_one_and_update(
+                {'status': 'queued'}, {'$set': {'status': 'running', 'started': now}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                return  # run by another worker while we waited for the lock
+
+            try:
+                result = self.train_fn()
+                update = {'status': 'done', **result}
+            except Exception as exc:
+                update = {'status': 'failed', 'error': str(exc)}
+            update['finished'] = datetime.datetime.utcnow()
+            self.collection.update_one({'_id': job['_id']}, {'$set': update})
+        self._trim()
+
+    def _trim(self):
+        old = self.collection.find(
+            {'status': {'$in': ['done', 'failed']}}, {'_id': 1}
+        ).sort('submitted', -1).skip(self.max_history)
+        ids = [d['_id'] for d in old]
+        if ids:
+            self.collection.delete_many({'_id': {'$in': ids}})
@@ -0,0 +1,243 @@
+import asyncio
+import queue
+import threading
+import time
+
+from pymongo.errors import BulkWriteError
+
+from metrics import timed
+
+
+def bulk_write_counts(exc, n):
+    """
+    (written, failed) documents of an unordered insert_many of n documents
+    that raised BulkWriteError. A duplicate _id means the document is already
+    stored (typically written by an earlier attempt that lost its reply).
+    """
+    details = exc.details or {}
+    errors = details.get('writeErrors', [])
+    stored = sum(1 for e in errors if e.get('code') == 11000 and (
+        e.get('keyPattern') == {'_id': 1} or 'index: _id_ ' in e.get('errmsg', '')))
+    written = details.get('nInserted', 0) + stored
+    return written, n - written
+
+
+class WriteBehindBuffer:
+    """
+    Buffers documents in memory and writes them to a Mongo collection from a
+    background thread with unordered insert_many.
+
+    A batch is flushed when max_batch documents are pending or flush_interval
+    seconds have passed since the first one arrived. At most max_pending
+    documents are held; put() blocks (backpressure) while the buffer is full.
+
+    Per-document errors of a batch (duplicates, validation) are counted as
+    failed. Any other error (server unreachable, not primary, ...) retries
+    the whole batch with exponential backoff, up to max_retries times, before
+    its documents are counted as failed; new documents queue up meanwhile.
+    """
+
+    max_retries = 5
+    retry_backoff = 0.5  # seconds before the first retry, doubled each time
+
+    def __init__(self, collection, max_batch=500, flush_interval=1.0, max_pending=10000):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._closed = False
+        self._worker = threading.Thread(
+            target=self._run, name=f'write-behind-{collection.name}', daemon=True
+        )
+        self._worker.start()
+
+    def put(self, doc, timeout=None):
+        """Queue one document; blocks while the buffer is full (raises queue.Full on timeout)."""
+        if self._closed:
+            raise RuntimeError('WriteBehindBuffer is closed')
+        self._queue.put(('doc', doc), timeout=timeout)
+
+    def put_many(self, docs, timeout=None):
+        for doc in docs:
+            self.put(doc, timeout)
+
+    def flush(self, timeout=None):
+        """Block until everything queued before this call has been written."""
+        if self._closed:
+            return True
+        done = threading.Event()
+        self._queue.put(('flush', done))
+        return done.wait(timeout)
+
+    def close(self):
+        """Write out pending documents and stop the worker."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(('stop', None))
+            self._worker.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        batch = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write(batch)
+                batch, deadline = [], None
+                continue
+
+            if kind == 'doc':
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.max_batch:
+                    self._write(batch)
+                    batch, deadline = [], None
+                continue
+
+            # flush / stop markers: write what we have first
+            try:
+                self._write(batch)
+            finally:
+                batch, deadline = [], None
+                if kind == 'flush':
+                    item.set()
+            if kind == 'stop':
+                return
+
+    def _write(self, batch):
+        """Write one batch; never raises, so the worker thread survives any error."""
+        if not batch:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed('mongo_write'):
+                    self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+                return
+            except BulkWriteError as exc:
+                # Unordered writes: whatever succeeded is kept, the rest won't succeed on a retry
+                written, failed = bulk_write_counts(exc, len(batch))
+                self.written += written
+                self.failed += failed
+                if failed:
+                    print(f"⚠ write-behind insert into '{self.collection.name}': {failed} documents rejected: {exc}")
+                return
+            except Exception as exc:
+                error = exc
+                if attempt < self.max_retries:
+                    delay = self.retry_backoff * 2 ** attempt
+                    print(f"⚠ write-behind insert into '{self.collection.name}' failed ({exc}); "
+                          f"retrying in {delay:g}s.")
+                    time.sleep(delay)
+        self.failed += len(batch)
+        print(f"❌ write-behind gave up on {len(batch)} documents for '{self.collection.name}' "
+              f"after {self.max_retries + 1} attempts: {error}")
+
+
+class AsyncWriteBehindBuffer:
+    """
+    asyncio counterpart of WriteBehindBuffer for an async (Motor) collection:
+    one consumer task batches queued documents into unordered insert_many
+    calls. put() waits (backpressure) while max_pending documents are queued.
+    Errors are handled as in WriteBehindBuffer. Call start() from the running
+    event loop.
+    """
+
+    max_retries = WriteBehindBuffer.max_retries
+    retry_backoff = WriteBehindBuffer.retry_backoff
+
+    def __init__(self, collection, max_batch=500, flush_interval=1.0, max_pending=10000):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.written = 0
+        self.failed = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def put(self, doc):
+        await self._queue.put(('doc', doc))
+
+    async def put_many(self, docs):
+        for doc in docs:
+            await self._queue.put(('doc', doc))
+
+    async def flush(self):
+        """Wait until everything queued before this call has been written."""
+        if self._task is None:
+            return
+        done = asyncio.Event()
+        await self._queue.put(('flush', done))
+        await done.wait()
+
+    async def close(self):
+        if self._task is not None:
+            await self.flush()
+            self._task.cancel()
+            self._task = None
+
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            kind, item = await self._queue.get()
+            batch = []
+            deadline = loop.time() + self.flush_interval
+            while kind == 'doc':
+                batch.append(item)
+                remaining = deadline - loop.time()
+                if len(batch) >= self.max_batch or remaining <= 0:
+                    break
+                try:
+                    kind, item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._write(batch)
+            finally:
+                # A flush marker ends the batch: everything before it is written
+                if kind == 'flush':
+                    item.set()
+
+    async def _write(self, batch):
+        """Write one batch; never raises, so the consumer task survives any error."""
+        if not batch:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                with timed('mongo_write'):
+                    await self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+                return
+            except BulkWriteError as exc:
+                written, failed = bulk_write_counts(exc, len(batch))
+                self.written += written
+                self.failed += failed
+                if failed:
+                    print(f"⚠ write-behind insert into '{self.collection.name}': {failed} documents rejected: {exc}")
+                return
+            except Exception as exc:
+                error = exc
+                if attempt < self.max_retries:
+                    delay = self.retry_backoff * 2 ** attempt
+                    print(f"⚠ write-behind insert into '{self.collection.name}' failed ({exc}); "
+                          f"retrying in {delay:g}s.")
+                    await asyncio.sleep(delay)
+        self.failed += len(batch)
+        print(f"❌ write-behind gave up on {len(batch)} documents for '{self.collection.name}' "
+              f"after {self.max_retries + 1} attempts: {error}")
@@ -1,9 +1,19 @@
 import streamlit as st
 st.set_page_config(page_title="Airline Chatbot", page_icon="✈️", layout="centered")
 
-from sentence_transformers import SentenceTransformer, util
-import torch
 from pymongo import MongoClient
+import os
+import sys
+import threading
+
+from embedding_cache import EmbeddingCache
+
+# Shared helpers live in backend/
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from ann_index import create_intent_scorer
+from batch_encoder import BatchEncoder
+from index_sync import IntentIndexSync, touch
+from onnx_encoder import ENCODER_BACKEND, load_encoder
 
 # =======================================================
 # 1️⃣ MongoDB Connection
@@ -40,32 +50,70 @@ intents_data = {
 
 for intent, examples in intents_data.items():
     if intents_collection.count_documents({"intent": intent}) == 0:
-        intents_collection.insert_one({"intent": intent, "examples": examples})
+        intents_collection.update_one({"intent": intent}, touch({"$setOnInsert": {"examples": examples}}), upsert=True)
 
 # =======================================================
 # 3️⃣ Load Model
 # =======================================================
-model = SentenceTransformer('all-MiniLM-L6-v2', device="cpu")
+MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "embedding_cache.npz")
+EMBEDDING_CACHE_MAX = int(os.getenv("EMBEDDING_CACHE_MAX", 100000))  # vectors kept, least recently used dropped
+EMBEDDING_CACHE_SAVE_EVERY = int(os.getenv("EMBEDDING_CACHE_SAVE_EVERY", 256))  # new vectors per file rewrite
+
+@st.cache_resource
+def load_model():
+    return load_encoder(MODEL_NAME, device="cpu")  # PyTorch or int8 ONNX, see ENCODER_BACKEND
+
+@st.cache_resource
+def load_embedding_cache():
+    # Shared by every session and rerun; only new/changed examples get encoded
+    return EmbeddingCache(load_model(), f"{MODEL_NAME}:{ENCODER_BACKEND}", EMBEDDING_CACHE_PATH,
+                          max_entries=EMBEDDING_CACHE_MAX, save_every=EMBEDDING_CACHE_SAVE_EVERY)
+
+@st.cache_resource
+def load_batch_encoder():
+    # Every session runs in its own thread; concurrent queries share one encode call
+    return BatchEncoder(load_model())
+
+@st.cache_resource
+def load_intent_index(_cache):
+    # Exact or approximate index (INTENT_INDEX), kept in sync with the intents
+    # collection by IntentIndexSync: examples added or removed by any replica
+    # are applied here within INDEX_SYNC_INTERVAL seconds, without a rebuild
+    index = {"scorer": None, "lock": threading.Lock()}
+
+    def apply(added, removed, generation):  # this index is never rebuilt
+        embeddings = _cache.get_many(added + removed)
+        with index["lock"]:
+            for (intent, _), emb in zip(added, embeddings):
+                index["scorer"].add(intent, emb)
+            for (intent, _), emb in zip(removed, embeddings[len(added):]):
+                index["scorer"].remove(intent, emb)
+
+    sync = IntentIndexSync(intents_collection, apply)
+    texts, labels = sync.load()
+    index["scorer"] = create_intent_scorer(labels, _cache.get_many(list(zip(labels, texts))))
+    index["sync"] = sync
+    sync.start()
+    return index
+
+model = load_model()
+embedding_cache = load_embedding_cache()
+batch_encoder = load_batch_encoder()
+intent_index = load_intent_index(embedding_cache)
 
 # =======================================================
 # 4️⃣ Predict Intent Function
 # =======================================================
 def predict_intents(user_text, threshold=0.6, top_k=2):
-    user_emb = model.encode(user_text, convert_to_tensor=True)
-    intent_scores = {}
-
-    for doc in intents_collection.find():
-        intent = doc["intent"]
-        examples = doc["examples"]
-        if not examples:
-            continue
-        ex_emb = model.encode(examples, convert_to_tensor=True)
-        score = torch.max(util.cos_sim(user_emb, ex_emb)).item()
-        intent_scores[intent] = score
-
-    relevant = {i: s for i, s in intent_scores.items() if s >= threshold}
-    sorted_intents = sorted(relevant.items(), key=lambda x: x[1], reverse=True)
-    return [i for i, _ in sorted_intents[:top_k]] if sorted_intents else ["Irrelevant"]
+    user_emb = batch_encoder.encode(user_text)
+
+    with intent_index["lock"]:
+        scorer = intent_index["scorer"]
+        if not len(scorer):
+            return ["Irrelevant"]
+        sorted_intents = scorer.top_intents(user_emb, threshold, top_k)[0]
+    return [i for i, _ in sorted_intents] if sorted_intents else ["Irrelevant"]
 
 # =======================================================
 # 5️⃣ Responses
@@ -103,7 +151,8 @@ def store_feedback(user_text, predicted, correct):
     })
 
 def update_intent_db(user_text, intent):
-    intents_collection.update_one(
+    # Applied to this replica's index at once, the others follow via their sync
+    intent_index["sync"].update(
         {"intent": intent},
         {"$addToSet": {"examples": user_text}},
         upsert=True
@@ -0,0 +1,96 @@
+import atexit
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """
+    Example-embedding cache keyed by a hash of (model name, intent, example text).
+    Lives in process (share one instance across Streamlit sessions) and is
+    persisted to an .npz file so restarts don't re-encode the corpus.
+
+    The file is rewritten once save_every new vectors are pending (and at
+    exit), not on every miss. At most max_entries vectors are kept; the least
+    recently used ones are dropped first.
+    """
+
+    def __init__(self, model, model_name, path="embedding_cache.npz", max_entries=100000, save_every=256):
+        self.model = model
+        self.model_name = model_name
+        self.path = path
+        self.max_entries = max_entries
+        self.save_every = save_every
+        self._vectors = OrderedDict()
+        self._unsaved = 0
+        self._lock = threading.Lock()
+        self._load()
+        atexit.register(self.flush)
+
+    def key(self, intent, text):
+        raw = f"{self.model_name}\x1f{intent}\x1f{text}".encode("utf-8")
+        return hashlib.sha1(raw).hexdigest()
+
+    def get_many(self, pairs):
+        """
+        pairs: list of (intent, example_text)
+        returns: float32 array of shape (len(pairs), dim), encoding only the
+        pairs that are not cached yet (in a single batch).
+        """
+        keys = [self.key(intent, text) for intent, text in pairs]
+        with self._lock:
+            missing = {}
+            for k, (_, text) in zip(keys, pairs):
+                if k in self._vectors:
+                    self._vectors.move_to_end(k)
+                elif k not in missing:
+                    missing[k] = text
+            found = {}
+            if missing:
+                vectors = self.model.encode(list(missing.values()), convert_to_numpy=True)
+                for k, vec in zip(missing.keys(), vectors):
+                    found[k] = self._vectors[k] = np.asarray(vec, dtype=np.float32)
+                while len(self._vectors) > self.max_entries:
+                    self._vectors.popitem(last=False)
+                self._unsaved += len(missing)
+                if self._unsaved >= self.save_every:
+                    self._save()
+            if not keys:
+                return np.zeros((0, 0), dtype=np.float32)
+            # Rows evicted by this call's own inserts are still returned
+            return np.stack([found[k] if k in found else self._vectors[k] for k in keys])
+
+    def flush(self):
+        """Write vectors added since the last save to disk."""
+        with self._lock:
+            if self._unsaved:
+                self._save()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                # Saved least recently used first
+                for k, vec in zip(data["keys"][-self.max_entries:], data["vectors"][-self.max_entries:]):
+                    self._vectors[str(k)] = vec
+        except (OSError, KeyError, ValueError):
+            # Corrupt or incompatible cache file: start empty, it will be rewritten
+            self._vectors = OrderedDict()
+
+    def _save(self):
+        self._unsaved = 0
+        if not self._vectors:
+            return
+        keys = np.array(list(self._vectors.keys()))
+        vectors = np.stack(list(self._vectors.values())).astype(np.float32)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=keys, vectors=vectors)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The frontend modules are flat scripts imported by name (streamlit run app.py)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,70 @@
+import numpy as np
+
+from embedding_cache import EmbeddingCache
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.calls.append(list(texts))
+        return np.array([[len(t), t.count(' '), 1.0] for t in texts], dtype=np.float32)
+
+
+def test_only_missing_pairs_are_encoded_and_persisted(tmp_path):
+    path = str(tmp_path / 'cache.npz')
+    model = CountingModel()
+    cache = EmbeddingCache(model, 'model-a', path)
+    pairs = [('Cancel Trip', 'cancel my flight'), ('Missing Bag', 'lost bag'), ('Cancel Trip', 'cancel my flight')]
+    first = cache.get_many(pairs)
+    assert model.calls == [['cancel my flight', 'lost bag']] and len(cache) == 2
+    np.testing.assert_array_equal(first[0], first[2])
+
+    cache.get_many(pairs[:2] + [('Missing Bag', 'bag is lost')])
+    assert model.calls[1:] == [['bag is lost']]
+
+    cache.flush()
+    reloaded = EmbeddingCache(model, 'model-a', path)
+    np.testing.assert_array_equal(reloaded.get_many(pairs), first)
+    assert len(model.calls) == 2
+    EmbeddingCache(model, 'model-b', path).get_many(pairs[:1])  # another model never hits
+    assert model.calls[2:] == [['cancel my flight']]
+
+
+def test_corrupt_cache_file_starts_empty(tmp_path):
+    path = tmp_path / 'cache.npz'
+    path.write_bytes(b'not a zip file')
+    cache = EmbeddingCache(CountingModel(), 'model-a', str(path))
+    assert len(cache) == 0
+    assert cache.get_many([]).shape == (0, 0)
+
+
+def test_saves_are_batched(tmp_path):
+    path = tmp_path / 'cache.npz'
+    cache = EmbeddingCache(CountingModel(), 'model-a', str(path), save_every=3)
+    cache.get_many([('A', 'one'), ('A', 'two')])
+    assert not path.exists()
+    cache.get_many([('A', 'one'), ('A', 'three')])
+    assert len(EmbeddingCache(CountingModel(), 'model-a', str(path))) == 3
+    cache.get_many([('A', 'four')])
+    cache.flush()
+    assert len(EmbeddingCache(CountingModel(), 'model-a', str(path))) == 4
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    model = CountingModel()
+    cache = EmbeddingCache(model, 'model-a', str(tmp_path / 'cache.npz'), max_entries=2)
+    assert cache.get_many([('A', 'one'), ('A', 'two'), ('A', 'three')]).shape == (3, 3)
+    assert len(cache) == 2
+    cache.get_many([('A', 'two')])  # most recently used now
+    cache.get_many([('A', 'four')])
+    model.calls.clear()
+    cache.get_many([('A', 'two'), ('A', 'four')])
+    assert model.calls == []
+    cache.get_many([('A', 'three')])
+    assert model.calls == [['three']]
+
+    cache.flush()
+    reloaded = EmbeddingCache(model, 'model-a', str(tmp_path / 'cache.npz'), max_entries=1)
+    assert len(reloaded) == 1